@@ -0,0 +1,236 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import String, cast, func, select
+from sqlalchemy.orm import Session
+
+from app.cache import LRUCache
+from app.config import settings
+from app.http_cache import stable_version
+from app.models import Perfume, Purchase
+
+# upper edges of the price-per-ml bands, in currency per ml
+PRICE_PER_ML_EDGES = (0.5, 1.0, 2.0, 3.0, 5.0)
+
+class TooManyPoints(ValueError):
+    pass
+
+def price_per_ml_labels() -> List[str]:
+    lower = (0.0,) + PRICE_PER_ML_EDGES
+    return [f"{lo:g}-{hi:g}" for lo, hi in zip(lower, PRICE_PER_ML_EDGES)] + [f"{PRICE_PER_ML_EDGES[-1]:g}+"]
+
+def factorize(
+        values: Sequence[Hashable]
+        ) -> Tuple[np.ndarray, List]:
+    # integer codes plus their labels; a dict pass beats np.unique's sort on object arrays
+    labels: Dict = {}
+    codes = np.fromiter((labels.setdefault(value, len(labels)) for value in values), dtype=np.int64, count=len(values))
+    return codes, list(labels)
+
+@dataclass
+class PurchaseFrame:
+    # one user's purchases as columns; perfume attributes are coded per purchase
+    days: np.ndarray
+    price: np.ndarray
+    ml: np.ndarray
+    store: np.ndarray
+    brand: np.ndarray
+    concentration: np.ndarray
+    season: np.ndarray
+    labels: Dict[str, List]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in
+                   ("days", "price", "ml", "store", "brand", "concentration", "season"))
+
+def purchase_columns_query(
+        user_id: int
+        ):
+    # dates come back as ISO text, which numpy parses in bulk far faster than date objects
+    return select(
+        cast(Purchase.date, String), Purchase.price, func.coalesce(Purchase.ml, 0), Purchase.perfume_id, Purchase.store
+        ).where(Purchase.user_id == user_id)
+
+def perfume_attributes_query(
+        user_id: int
+        ):
+    return select(Perfume.id, Perfume.brand, Perfume.concentration, Perfume.season).\
+        where(Perfume.user_id == user_id).order_by(Perfume.id)
+
+def fetch_frame(
+        db: Session,
+        user_id: int
+        ) -> PurchaseFrame:
+    # plain column reads need none of the ORM's result processing, which costs more than sqlite here
+    conn = db.connection()
+    rows = conn.execute(purchase_columns_query(user_id)).all()
+    perfumes = conn.execute(perfume_attributes_query(user_id)).all()
+
+    days, price, ml, perfume_ids, stores = zip(*rows) if rows else ((), (), (), (), ())
+    perfume_columns = list(zip(*perfumes)) if perfumes else [(), (), (), ()]
+    known_ids = np.asarray(perfume_columns[0], dtype=np.int64)
+    perfume_ids = np.asarray(perfume_ids, dtype=np.int64)
+    # position of each purchase's perfume; purchases are validated against the owner's perfumes,
+    # so a miss only happens if the rows change between the two reads
+    position = np.searchsorted(known_ids, perfume_ids).clip(0, max(len(known_ids) - 1, 0))
+    found = known_ids[position] == perfume_ids if len(known_ids) else np.zeros(len(perfume_ids), dtype=bool)
+
+    labels = {}
+    coded = {}
+    for name, values in zip(("brand", "concentration", "season"), perfume_columns[1:]):
+        per_perfume, labels[name] = factorize([getattr(value, "value", value) for value in values])
+        coded[name] = np.where(found, per_perfume[position] if len(per_perfume) else -1, -1)
+    store_codes, labels["store"] = factorize(stores)
+
+    return PurchaseFrame(
+        days=np.array(days, dtype="datetime64[D]"),
+        price=np.asarray(price, dtype=np.float64),
+        ml=np.asarray(ml, dtype=np.float64),
+        store=store_codes,
+        labels=labels,
+        **coded
+    )
+
+frame_cache = LRUCache(
+    maxsize=settings.ANALYTICS_CACHE_SIZE,
+    maxbytes=settings.ANALYTICS_CACHE_MAX_BYTES,
+    weigh=lambda frame: frame.nbytes
+)
+
+def load_frame(
+        db: Session,
+        user_id: int
+        ) -> PurchaseFrame:
+    # the version is read before the fetch, so a write racing the fetch can only make
+    # the cached frame newer than its key, never older
+    version = stable_version(user_id)
+    if version is not None:
+        frame = frame_cache.get((user_id, version))
+        if frame is not None:
+            return frame
+    frame = fetch_frame(db, user_id)
+    if version is not None:
+        frame_cache.set((user_id, version), frame)
+    return frame
+
+def date_mask(
+        frame: PurchaseFrame,
+        start_date: Optional[date],
+        end_date: Optional[date]
+        ) -> Optional[np.ndarray]:
+    mask = None
+    if start_date is not None:
+        mask = frame.days >= np.datetime64(start_date, "D")
+    if end_date is not None:
+        upper = frame.days <= np.datetime64(end_date, "D")
+        mask = upper if mask is None else mask & upper
+    return mask
+
+def bucket_ordinals(
+        days: np.ndarray,
+        bucket: str
+        ) -> np.ndarray:
+    # consecutive integers for consecutive buckets; weeks start on Monday
+    if bucket == "month":
+        return days.astype("datetime64[M]").astype(np.int64)
+    ordinals = days.astype(np.int64)
+    if bucket == "week":
+        # 1970-01-01 was a Thursday, so shifting by 3 puts Mondays on multiples of 7
+        return (ordinals + 3) // 7
+    return ordinals
+
+def bucket_start(
+        ordinal: np.ndarray,
+        bucket: str
+        ) -> np.ndarray:
+    if bucket == "month":
+        return ordinal.astype("datetime64[M]").astype("datetime64[D]")
+    if bucket == "week":
+        return (ordinal * 7 - 3).astype("datetime64[D]")
+    return ordinal.astype("datetime64[D]")
+
+def timeseries(
+        frame: PurchaseFrame,
+        bucket: str,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+        ) -> List[dict]:
+    days, price = frame.days, frame.price
+    mask = date_mask(frame, start_date, end_date)
+    if mask is not None:
+        days, price = days[mask], price[mask]
+    if not len(days):
+        return []
+
+    ordinals = bucket_ordinals(days, bucket)
+    first = ordinals.min()
+    # purchase dates are whatever users typed, so the span is bounded before anything is allocated
+    span = int(ordinals.max() - first) + 1
+    if span > settings.TIMESERIES_MAX_POINTS:
+        raise TooManyPoints(
+            f"{span} {bucket} buckets requested, at most {settings.TIMESERIES_MAX_POINTS}; "
+            "narrow start_date/end_date or use a coarser bucket"
+        )
+    index = ordinals - first
+    # dense bins from the first to the last bucket, so quiet periods come back as zeros
+    counts = np.bincount(index)
+    spent = np.bincount(index, weights=price)
+    starts = bucket_start(np.arange(first, first + len(counts)), bucket)
+    return [
+        {"period": period, "purchases": count, "total_spent": round(total, 2)}
+        for period, count, total in zip(starts.tolist(), counts.tolist(), spent.tolist())
+    ]
+
+def group_totals(
+        codes: np.ndarray,
+        labels: List,
+        price: np.ndarray,
+        ml: np.ndarray,
+        by_spend: bool = True
+        ) -> List[dict]:
+    size = len(labels)
+    counts = np.bincount(codes, minlength=size)
+    spent = np.bincount(codes, weights=price, minlength=size)
+    # price per ml only over purchases that recorded a volume
+    sized = ml > 0
+    sized_spent = np.bincount(codes[sized], weights=price[sized], minlength=size)
+    total_ml = np.bincount(codes[sized], weights=ml[sized], minlength=size)
+    order = np.argsort(-spent, kind="stable") if by_spend else np.arange(size)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_ml = sized_spent / total_ml
+    return [
+        {
+            "key": labels[i],
+            "purchases": int(counts[i]),
+            "total_spent": round(float(spent[i]), 2),
+            "average_price": round(float(spent[i] / counts[i]), 2),
+            "total_ml": int(total_ml[i]),
+            "price_per_ml": round(float(per_ml[i]), 4) if total_ml[i] else None,
+        }
+        for i in order.tolist() if counts[i]
+    ]
+
+def breakdowns(
+        frame: PurchaseFrame,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+        ) -> Dict[str, List[dict]]:
+    mask = date_mask(frame, start_date, end_date)
+    price, ml = frame.price, frame.ml
+    if mask is not None:
+        price, ml = price[mask], ml[mask]
+
+    result = {}
+    for name in ("brand", "store", "concentration", "season"):
+        codes = getattr(frame, name) if mask is None else getattr(frame, name)[mask]
+        # -1 marks a purchase whose perfume disappeared mid-read
+        known = codes >= 0
+        result[name] = group_totals(codes[known], frame.labels[name], price[known], ml[known])
+
+    sized = ml > 0
+    bands = np.digitize(price[sized] / ml[sized], PRICE_PER_ML_EDGES)
+    result["price_per_ml"] = group_totals(bands, price_per_ml_labels(), price[sized], ml[sized], by_spend=False)
+    return result
@@ -1,41 +1,141 @@
+import hashlib
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Dict, Optional, Tuple
+from jose import JWTError, jwk, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from pydantic_settings import BaseSettings
 
-from app.database import get_db
+from app.cache import LRUCache
+from app.config import Settings, settings
+from app.database import get_async_read_db, get_read_db
+from app.hashing import (
+    HashingPool,
+    HashingPoolSaturated,
+    crypt_context,
+    hash_password,
+    verify_and_update
+)
 from app.models import Role, User
-import os
-
-class Settings(BaseSettings):
-    SECRET_KEY: str
-    ALGORITHM: str
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
-
-    class Config:
-        env_file = ".env"
-
-settings = Settings()
+from app.revocation import token_denylist
+from app.shared_cache import SharedVersions
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+REFRESH_TOKEN_EXPIRE_DAYS = settings.REFRESH_TOKEN_EXPIRE_DAYS
+pwd_context = crypt_context(settings.BCRYPT_ROUNDS)
+
+hash_pool = HashingPool(
+    kind=settings.HASH_POOL_KIND,
+    workers=settings.HASH_POOL_WORKERS,
+    max_pending=settings.HASH_POOL_MAX_PENDING
+)
+
+def _hashing_unavailable() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent logins, try again shortly",
+        headers={"Retry-After": str(settings.HASH_POOL_RETRY_AFTER_SECONDS)},
+    )
 
 def get_password_hash(
         password: str
         ) -> str:
-    return pwd_context.hash(password)
+    try:
+        return hash_pool.run(hash_password, password, settings.BCRYPT_ROUNDS)
+    except HashingPoolSaturated:
+        raise _hashing_unavailable()
+
+def verify_and_update_password(
+        plain_password: str,
+        hashed_password: str
+        ) -> Tuple[bool, Optional[str]]:
+    try:
+        return hash_pool.run(verify_and_update, plain_password, hashed_password, settings.BCRYPT_ROUNDS)
+    except HashingPoolSaturated:
+        raise _hashing_unavailable()
 
 def verify_password(
         plain_password: str,
         hashed_password: str
         ) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return verify_and_update_password(plain_password, hashed_password)[0]
+
+async def get_password_hash_async(
+        password: str
+        ) -> str:
+    try:
+        return await hash_pool.run_async(hash_password, password, settings.BCRYPT_ROUNDS)
+    except HashingPoolSaturated:
+        raise _hashing_unavailable()
+
+async def verify_and_update_password_async(
+        plain_password: str,
+        hashed_password: str
+        ) -> Tuple[bool, Optional[str]]:
+    try:
+        return await hash_pool.run_async(verify_and_update, plain_password, hashed_password, settings.BCRYPT_ROUNDS)
+    except HashingPoolSaturated:
+        raise _hashing_unavailable()
+
+class KeySet:
+    # keys are parsed once, not per token; with verification keys by kid, a token's kid header
+    # picks its key, so tokens signed before a rotation stay valid while their kid is listed
+    def __init__(
+            self,
+            algorithm: str,
+            signing_key: str,
+            signing_kid: Optional[str] = None,
+            verification_keys: Optional[Dict[str, str]] = None
+            ):
+        self.algorithm = algorithm
+        self.signing_kid = signing_kid
+        self.signing_key = jwk.construct(signing_key, algorithm)
+        self.verification_keys = {kid: jwk.construct(key, algorithm) for kid, key in (verification_keys or {}).items()}
+        if self.verification_keys and signing_kid not in self.verification_keys:
+            raise ValueError(f"JWT_SIGNING_KID {signing_kid!r} is not one of JWT_KEYS")
+
+    def sign(
+            self,
+            claims: dict
+            ) -> str:
+        headers = {"kid": self.signing_kid} if self.signing_kid else None
+        return jwt.encode(claims, self.signing_key, algorithm=self.algorithm, headers=headers)
+
+    def verify(
+            self,
+            token: str
+            ) -> dict:
+        key = self.signing_key
+        if self.verification_keys:
+            key = self.verification_keys.get(jwt.get_unverified_header(token).get("kid"))
+            if key is None:
+                raise JWTError("Unknown signing key")
+        return jwt.decode(token, key, algorithms=[self.algorithm])
+
+def key_set_from_settings(
+        config: Settings
+        ) -> KeySet:
+    signing_key = config.JWT_SIGNING_KEY or config.JWT_KEYS.get(config.JWT_SIGNING_KID) or config.SECRET_KEY
+    return KeySet(config.ALGORITHM, signing_key, config.JWT_SIGNING_KID, config.JWT_KEYS)
+
+key_set = key_set_from_settings(settings)
+
+# verified claims by token digest, each entry dropped when its token expires
+token_cache = LRUCache(maxsize=settings.TOKEN_CACHE_SIZE)
+
+def load_keys(
+        config: Settings = settings
+        ) -> None:
+    global key_set
+    key_set = key_set_from_settings(config)
+    # a token verified with a key that is no longer listed must not outlive it in the cache
+    token_cache.clear()
 
 def create_access_token(
         data: dict,
@@ -47,43 +147,225 @@ def create_access_token(
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = key_set.sign(to_encode)
     return encoded_jwt
 
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+def create_refresh_token(
+        data: dict,
+        sid: str
+        ) -> str:
+    # sid names the session every token from it carries; jti names this one refresh token, so a
+    # refresh can retire it without ending the session
+    expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    return key_set.sign({**data, "typ": "refresh", "jti": uuid.uuid4().hex, "sid": sid, "exp": expire})
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_current_user(
-        token: str = Depends(oauth2_scheme),
-        db: Session = Depends(get_db)
-        ) -> User:
-    credentials_exception = HTTPException(
+PRINCIPAL_FIELDS = ("id", "username", "email", "is_active", "created_at")
+
+# entries are (version, principal fields): with a shared cache backend, a user changed by another
+# worker has a newer version there, so the entry is dropped instead of living out its TTL
+user_cache = LRUCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+user_versions = SharedVersions("principal")
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def verify_access_token(
+        token: str
+        ) -> dict:
+    credentials_exception = _credentials_exception()
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        role_str: str = payload.get("role")
-
-        if username is None:
-            raise credentials_exception
-        try:
-            token_role = Role(role_str) if role_str else Role.USER
-        except ValueError:
-            token_role = Role.USER
+        payload = key_set.verify(token)
     except JWTError:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+    if payload.get("sub") is None or payload.get("typ", "access") != "access":
         raise credentials_exception
-    user.role = token_role
-    
-    return user
+    return payload
 
-def get_current_active_user(
-        current_user: User = Depends(get_current_user)
+def decode_access_token(
+        token: str
+        ) -> dict:
+    # the middleware and the route dependency all decode the same token, on every request
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    now = time.time()
+    if payload is None:
+        payload = verify_access_token(token)
+        if "exp" in payload:
+            token_cache.set(digest, payload, ttl=payload["exp"] - now)
+    elif payload.get("exp", now + 1) <= now:
+        token_cache.invalidate(digest)
+        raise _credentials_exception()
+    # checked on every use, cached or not, so a logout or deactivation takes effect on the next request
+    if token_denylist.session_revoked(payload.get("sid")) or token_denylist.user_revoked(payload.get("uid")):
+        raise _credentials_exception()
+    return payload
+
+def decode_refresh_token(
+        token: str
+        ) -> dict:
+    credentials_exception = _credentials_exception()
+    try:
+        payload = key_set.verify(token)
+    except JWTError:
+        raise credentials_exception
+    if payload.get("typ") != "refresh" or None in (payload.get("uid"), payload.get("sid"), payload.get("jti")):
+        raise credentials_exception
+    if token_denylist.session_revoked(payload["sid"]) or token_denylist.session_revoked(payload["jti"]) \
+            or token_denylist.user_revoked(payload["uid"]):
+        raise credentials_exception
+    return payload
+
+def get_token_payload(
+        token: str = Depends(oauth2_scheme)
+        ) -> dict:
+    return decode_access_token(token)
+
+def bearer_payload(
+        authorization: Optional[str]
+        ) -> Optional[dict]:
+    # for middleware that reads claims before routing; invalid tokens are left to the route's 401
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    try:
+        return decode_access_token(authorization[7:])
+    except HTTPException:
+        return None
+
+def token_role(
+        payload: dict
+        ) -> Role:
+    role_str: str = payload.get("role")
+    try:
+        return Role(role_str) if role_str else Role.USER
+    except ValueError:
+        return Role.USER
+
+def _principal(
+        data: dict,
+        role: Role
+        ) -> User:
+    # a fresh transient User per request, never attached to a session
+    return User(**data, role=role)
+
+def _cached_user(
+        username: str
+        ) -> Tuple[Optional[int], Optional[dict]]:
+    # the version is read before any query, so a change committed after it can't be cached under it
+    version = user_versions.get(username)
+    entry = user_cache.get(username)
+    if entry is None or entry[0] != version:
+        return version, None
+    return version, entry[1]
+
+def _cache_user(
+        user: User,
+        version: Optional[int]
+        ) -> dict:
+    data = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+    user_cache.set(user.username, (version, data))
+    return data
+
+def _claims_principal(
+        payload: dict
+        ) -> Optional[User]:
+    if not settings.AUTH_TRUST_CLAIMS or "uid" not in payload:
+        return None
+    return User(
+        id=payload["uid"],
+        username=payload["sub"],
+        # the denylist learns about deactivations as they commit, the claim only at the next login
+        is_active=payload.get("active", True) and not token_denylist.user_revoked(payload["uid"]),
+        role=token_role(payload)
+    )
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    user_cache.invalidate(target.username)
+
+@event.listens_for(Session, "after_flush")
+def _collect_user_changes(session: Session, flush_context) -> None:
+    usernames = {
+        obj.username for obj in session.dirty | session.deleted
+        if isinstance(obj, User) and (obj in session.deleted or session.is_modified(obj))
+    }
+    if usernames:
+        session.info.setdefault("changed_usernames", set()).update(usernames)
+
+@event.listens_for(Session, "after_commit")
+def _bump_user_versions(session: Session) -> None:
+    # after the commit, so another worker can't re-read the old row under the new version
+    for username in session.info.pop("changed_usernames", ()):
+        user_versions.bump(username)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_user_changes(session: Session, previous_transaction) -> None:
+    session.info.pop("changed_usernames", None)
+
+def _lookup_principal(
+        payload: dict,
+        db: Session
+        ) -> User:
+    username = payload["sub"]
+    version, data = _cached_user(username)
+    if data is None:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            raise _credentials_exception()
+        data = _cache_user(user, version)
+    return _principal(data, token_role(payload))
+
+async def _lookup_principal_async(
+        payload: dict,
+        db: AsyncSession
+        ) -> User:
+    username = payload["sub"]
+    version, data = _cached_user(username)
+    if data is None:
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalars().first()
+        if user is None:
+            raise _credentials_exception()
+        data = _cache_user(user, version)
+    return _principal(data, token_role(payload))
+
+def get_current_user(
+        token: str = Depends(oauth2_scheme),
+        db: Session = Depends(get_read_db)
+        ) -> User:
+    return _lookup_principal(decode_access_token(token), db)
+
+async def get_current_user_async(
+        token: str = Depends(oauth2_scheme),
+        db: AsyncSession = Depends(get_async_read_db)
+        ) -> User:
+    return await _lookup_principal_async(decode_access_token(token), db)
+
+def get_token_user(
+        token: str = Depends(oauth2_scheme),
+        db: Session = Depends(get_read_db)
+        ) -> User:
+    payload = decode_access_token(token)
+    return _claims_principal(payload) or _lookup_principal(payload, db)
+
+async def get_token_user_async(
+        token: str = Depends(oauth2_scheme),
+        db: AsyncSession = Depends(get_async_read_db)
+        ) -> User:
+    payload = decode_access_token(token)
+    return _claims_principal(payload) or await _lookup_principal_async(payload, db)
+
+def _require_active_user(
+        current_user: User
         ) -> User:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -91,9 +373,29 @@ def get_current_active_user(
         raise HTTPException(status_code=403, detail="Not authorized to access this resource.")
     return current_user
 
-def get_current_admin_user(
-        current_user: User = Depends(get_current_user)
+def _require_admin_user(
+        current_user: User
         ) -> User:
     if current_user.role != Role.ADMIN or not current_user.is_active:
         raise HTTPException(status_code=403, detail="Admin access required.")
     return current_user
+
+def get_current_active_user(
+        current_user: User = Depends(get_token_user)
+        ) -> User:
+    return _require_active_user(current_user)
+
+def get_current_admin_user(
+        current_user: User = Depends(get_current_user)
+        ) -> User:
+    return _require_admin_user(current_user)
+
+async def get_current_active_user_async(
+        current_user: User = Depends(get_token_user_async)
+        ) -> User:
+    return _require_active_user(current_user)
+
+async def get_current_admin_user_async(
+        current_user: User = Depends(get_current_user_async)
+        ) -> User:
+    return _require_admin_user(current_user)
@@ -0,0 +1,452 @@
+from dataclasses import dataclass
+from datetime import date
+from itertools import groupby
+from typing import Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from app.bulk import validation_message
+from app.config import settings
+from app.fast_json import read_columns
+from app.http_cache import invalidate_users
+from app.leaderboards import leaderboards
+from app.models import Perfume, Purchase
+from app.rollups import record_purchases
+from app.routers.admin import dashboard_snapshot
+from app.schemas import (
+    BatchOperation,
+    BatchOperationError,
+    BatchOperationResult,
+    PerfumeCreate,
+    PerfumeRead,
+    PerfumeUpdate,
+    PurchaseCreate,
+    PurchaseRead,
+    PurchaseUpdate
+)
+
+PERFUME_COLUMNS = read_columns(Perfume, PerfumeRead)
+PURCHASE_COLUMNS = read_columns(Purchase, PurchaseRead)
+# fills the required perfume_id while validating a purchase whose perfume comes from a ref
+PENDING_PERFUME = 0
+
+SCHEMAS = {
+    ("create", "perfume"): PerfumeCreate,
+    ("create", "purchase"): PurchaseCreate,
+    ("update", "perfume"): PerfumeUpdate,
+    ("update", "purchase"): PurchaseUpdate,
+}
+
+class OperationError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+class StatementFailed(Exception):
+    # the database rejected a statement the plan let through
+    def __init__(self, steps: List["Step"], error: Exception):
+        super().__init__(str(error))
+        self.steps = steps
+        self.error = error
+
+@dataclass
+class Step:
+    # one validated operation, ready to apply
+    index: int
+    op: str
+    type: str
+    id: Optional[int] = None
+    values: Optional[dict] = None
+    ref: Optional[str] = None
+    perfume_ref: Optional[str] = None
+    # (date, price) of an updated purchase before this step, for the spending rollups
+    previous: Optional[Tuple[date, float]] = None
+
+def validate_operation(
+        index: int,
+        operation: BatchOperation
+        ) -> Step:
+    key = (operation.op, operation.type)
+    if operation.op == "create" and operation.id is not None:
+        raise OperationError(422, "id: not allowed on create")
+    if operation.op != "create" and operation.id is None:
+        raise OperationError(422, f"id: required on {operation.op}")
+    if operation.ref is not None and key != ("create", "perfume"):
+        raise OperationError(422, "ref: only perfume creates can be referenced")
+    if operation.perfume_ref is not None:
+        if operation.type != "purchase" or operation.op == "delete":
+            raise OperationError(422, "perfume_ref: only purchase creates and updates take a perfume_ref")
+        if "perfume_id" in operation.data:
+            raise OperationError(422, "perfume_ref: give either perfume_id or perfume_ref")
+
+    step = Step(index, operation.op, operation.type, operation.id, ref=operation.ref, perfume_ref=operation.perfume_ref)
+    if operation.op == "delete":
+        return step
+    data = operation.data
+    if key == ("create", "purchase") and operation.perfume_ref is not None:
+        data = {**data, "perfume_id": PENDING_PERFUME}
+    try:
+        model = SCHEMAS[key].model_validate(data)
+    except ValidationError as e:
+        raise OperationError(422, validation_message(e))
+    if operation.op == "create":
+        step.values = model.model_dump()
+    else:
+        # null means "leave as is"; every updatable column is NOT NULL
+        step.values = model.model_dump(by_alias=True, exclude_unset=True, exclude_none=True)
+        if not step.values and operation.perfume_ref is None:
+            raise OperationError(422, "data: nothing to update")
+    return step
+
+class BatchState:
+    # ownership as it will be after each step, so later operations see earlier ones
+    def __init__(
+            self,
+            user_id: int,
+            perfumes: Dict[int, int],
+            purchases: Dict[int, tuple]
+            ):
+        self.user_id = user_id
+        self.perfumes = perfumes
+        self.purchases = purchases
+        self.refs: Set[str] = set()
+        self.deleted_perfumes: Set[int] = set()
+
+    def check_perfume(
+            self,
+            perfume_id: int
+            ) -> None:
+        if perfume_id not in self.perfumes or perfume_id in self.deleted_perfumes:
+            raise OperationError(404, f"Perfume {perfume_id} not found")
+        if self.perfumes[perfume_id] != self.user_id:
+            raise OperationError(403, "Not authorized to access this perfume")
+
+    def check_purchase(
+            self,
+            purchase_id: int,
+            action: str
+            ) -> tuple:
+        purchase = self.purchases.get(purchase_id)
+        # deleting a perfume takes its purchases with it
+        if purchase is None or purchase[1] in self.deleted_perfumes:
+            raise OperationError(404, f"Purchase {purchase_id} not found")
+        if purchase[0] != self.user_id:
+            raise OperationError(403, f"Not authorized to {action} this purchase")
+        return purchase
+
+    def check_perfume_ref(
+            self,
+            step: Step
+            ) -> None:
+        if step.perfume_ref is not None:
+            if step.perfume_ref not in self.refs:
+                raise OperationError(422, f"perfume_ref: {step.perfume_ref!r} is not created earlier in the batch")
+        elif step.values.get("perfume_id") is not None:
+            self.check_perfume(step.values["perfume_id"])
+
+    def apply(
+            self,
+            step: Step
+            ) -> None:
+        if step.type == "perfume":
+            if step.op == "create":
+                if step.ref is not None:
+                    if step.ref in self.refs:
+                        raise OperationError(422, f"ref: {step.ref!r} is already used in this batch")
+                    self.refs.add(step.ref)
+                return
+            self.check_perfume(step.id)
+            if step.op == "delete":
+                self.deleted_perfumes.add(step.id)
+            return
+
+        if step.op == "create":
+            self.check_perfume_ref(step)
+            return
+        user_id, perfume_id, purchase_date, price = self.check_purchase(step.id, step.op)
+        if step.op == "delete":
+            self.purchases.pop(step.id)
+            return
+        self.check_perfume_ref(step)
+        step.previous = (purchase_date, price)
+        # a perfume created in this batch has no id the batch could delete it by, so no cascade reaches it
+        perfume_id = None if step.perfume_ref is not None else step.values.get("perfume_id", perfume_id)
+        self.purchases[step.id] = (
+            user_id,
+            perfume_id,
+            step.values.get("date", purchase_date),
+            step.values.get("price", price),
+        )
+
+def plan_batch(
+        db: Session,
+        user_id: int,
+        operations: List[BatchOperation]
+        ) -> List[Step]:
+    # every operation is checked before anything is written, so a batch applies whole or not at all
+    if len(operations) > settings.BATCH_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.BATCH_MAX_OPERATIONS} operations per batch"
+        )
+
+    errors: List[BatchOperationError] = []
+    steps: List[Step] = []
+    for index, operation in enumerate(operations):
+        try:
+            steps.append(validate_operation(index, operation))
+        except OperationError as e:
+            errors.append(BatchOperationError(index=index, status=e.status_code, error=str(e)))
+
+    # one lookup per table for everything the batch touches
+    perfume_ids = {step.id for step in steps if step.type == "perfume" and step.id is not None}
+    perfume_ids |= {step.values["perfume_id"] for step in steps
+                    if step.type == "purchase" and step.values and step.values.get("perfume_id")}
+    purchase_ids = {step.id for step in steps if step.type == "purchase" and step.id is not None}
+    perfumes = dict(db.execute(
+        select(Perfume.id, Perfume.user_id).where(Perfume.id.in_(perfume_ids))
+    ).all()) if perfume_ids else {}
+    purchases = {row[0]: tuple(row[1:]) for row in db.execute(
+        select(Purchase.id, Purchase.user_id, Purchase.perfume_id, Purchase.date, Purchase.price).
+            where(Purchase.id.in_(purchase_ids))
+    )} if purchase_ids else {}
+
+    state = BatchState(user_id, perfumes, purchases)
+    for step in steps:
+        try:
+            state.apply(step)
+        except OperationError as e:
+            errors.append(BatchOperationError(index=step.index, status=e.status_code, error=str(e)))
+
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=[error.model_dump() for error in sorted(errors, key=lambda error: error.index)]
+        )
+    return steps
+
+class BatchWriter:
+    def __init__(
+            self,
+            db: Session,
+            user_id: int
+            ):
+        self.db = db
+        self.user_id = user_id
+        self.ref_ids: Dict[str, int] = {}
+        self.perfumes: Dict[int, PerfumeRead] = {}
+        self.added: List[Tuple[date, float]] = []
+        self.removed: List[Tuple[date, float]] = []
+        self.leaderboard_changes: List[tuple] = []
+        self.writes = 0
+        self.results: List[BatchOperationResult] = []
+
+    def result(
+            self,
+            step: Step,
+            item_id: int,
+            item=None
+            ) -> None:
+        self.results.append(BatchOperationResult(index=step.index, op=step.op, type=step.type, id=item_id, item=item))
+
+    def purchase_values(
+            self,
+            step: Step
+            ) -> dict:
+        values = dict(step.values)
+        if step.perfume_ref is not None:
+            values["perfume_id"] = self.ref_ids[step.perfume_ref]
+        return values
+
+    def create_perfumes(
+            self,
+            steps: List[Step]
+            ) -> None:
+        values = [{**step.values, "user_id": self.user_id} for step in steps]
+        # rows in parameter order, so identical operations still get their own ids; without an
+        # insert sentinel SQLite gets one statement per row, all inside the batch's transaction
+        rows = self.db.execute(insert(Perfume).returning(*PERFUME_COLUMNS, sort_by_parameter_order=True), values).all()
+        for step, row in zip(steps, rows):
+            perfume = PerfumeRead.model_validate(row._mapping)
+            self.perfumes[perfume.id] = perfume
+            if step.ref is not None:
+                self.ref_ids[step.ref] = perfume.id
+            self.result(step, perfume.id, perfume)
+        self.leaderboard_changes.append(("perfume", self.user_id, len(rows)))
+        self.writes += len(rows)
+
+    def create_purchases(
+            self,
+            steps: List[Step]
+            ) -> None:
+        values = [{**self.purchase_values(step), "user_id": self.user_id} for step in steps]
+        rows = self.db.execute(insert(Purchase).returning(*PURCHASE_COLUMNS, sort_by_parameter_order=True), values).all()
+        for step, row in zip(steps, rows):
+            purchase = PurchaseRead.model_validate(row._mapping)
+            self.added.append((purchase.date, purchase.price))
+            self.leaderboard_changes.append((
+                "purchase_added", purchase.id, purchase.price, purchase.perfume_id, self.user_id,
+                self.perfumes.get(purchase.perfume_id)
+            ))
+            self.result(step, purchase.id, purchase)
+        self.writes += len(rows)
+
+    def remove_purchases(
+            self,
+            rows: list
+            ) -> None:
+        for purchase_id, purchase_date, price in rows:
+            self.removed.append((purchase_date, price))
+            self.leaderboard_changes.append(("purchase_removed", purchase_id, price, self.user_id))
+        self.writes += len(rows)
+
+    def delete_perfumes(
+            self,
+            steps: List[Step]
+            ) -> None:
+        ids = [step.id for step in steps]
+        # the ORM cascade would load every purchase first; one set-based delete does the same
+        self.remove_purchases(self.db.execute(
+            delete(Purchase).where(Purchase.perfume_id.in_(ids)).
+                returning(Purchase.id, Purchase.date, Purchase.price).
+                execution_options(synchronize_session=False)
+        ).all())
+        self.db.execute(
+            delete(Perfume).where(Perfume.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        self.leaderboard_changes.append(("perfume", self.user_id, -len(ids)))
+        self.writes += len(ids)
+        for step in steps:
+            self.perfumes.pop(step.id, None)
+            self.result(step, step.id)
+
+    def delete_purchases(
+            self,
+            steps: List[Step]
+            ) -> None:
+        self.remove_purchases(self.db.execute(
+            delete(Purchase).where(Purchase.id.in_([step.id for step in steps])).
+                returning(Purchase.id, Purchase.date, Purchase.price).
+                execution_options(synchronize_session=False)
+        ).all())
+        for step in steps:
+            self.result(step, step.id)
+
+    def update_perfume(
+            self,
+            step: Step
+            ) -> None:
+        row = self.db.execute(
+            update(Perfume).where(Perfume.id == step.id).values(**step.values).
+                returning(*PERFUME_COLUMNS).execution_options(synchronize_session=False)
+        ).one()
+        perfume = PerfumeRead.model_validate(row._mapping)
+        self.perfumes[perfume.id] = perfume
+        self.leaderboard_changes.append(("perfume_info", perfume))
+        self.result(step, perfume.id, perfume)
+
+    def update_purchase(
+            self,
+            step: Step
+            ) -> None:
+        row = self.db.execute(
+            update(Purchase).where(Purchase.id == step.id).values(**self.purchase_values(step)).
+                returning(*PURCHASE_COLUMNS).execution_options(synchronize_session=False)
+        ).one()
+        purchase = PurchaseRead.model_validate(row._mapping)
+        if (purchase.date, purchase.price) != step.previous:
+            self.removed.append(step.previous)
+            self.added.append((purchase.date, purchase.price))
+        # same as an ORM update: the top purchases may have to be recomputed
+        self.leaderboard_changes.append(("reseed",))
+        self.result(step, purchase.id, purchase)
+
+    def apply(
+            self,
+            op: str,
+            kind: str,
+            steps: List[Step]
+            ) -> None:
+        failing = steps
+        try:
+            if op == "update":
+                for step in steps:
+                    failing = [step]
+                    getattr(self, f"update_{kind}")(step)
+            else:
+                getattr(self, f"{op}_{kind}s")(steps)
+        except (IntegrityError, DataError) as e:
+            raise StatementFailed(failing, e)
+
+    def apply_all(
+            self,
+            steps: List[Step]
+            ) -> None:
+        # consecutive creates or deletes of one type become a single statement
+        for (op, kind), group in groupby(steps, key=lambda step: (step.op, step.type)):
+            self.apply(op, kind, list(group))
+
+    def write(
+            self,
+            steps: List[Step]
+            ) -> List[BatchOperationResult]:
+        self.apply_all(steps)
+        record_purchases(self.db, self.user_id, self.added)
+        record_purchases(self.db, self.user_id, self.removed, sign=-1)
+        return self.results
+
+def failing_index(
+        db: Session,
+        user_id: int,
+        steps: List[Step],
+        failure: StatementFailed
+        ) -> int:
+    if len(failure.steps) == 1:
+        return failure.steps[0].index
+    # a grouped statement does not say which row it choked on: replay up to it one row at a time
+    start = next(position for position, step in enumerate(steps) if step is failure.steps[0])
+    writer = BatchWriter(db, user_id)
+    try:
+        writer.apply_all(steps[:start])
+        for step in failure.steps:
+            try:
+                writer.apply(step.op, step.type, [step])
+            except StatementFailed:
+                return step.index
+    except StatementFailed:
+        pass
+    finally:
+        db.rollback()
+    return failure.steps[0].index
+
+def run_batch(
+        db: Session,
+        user_id: int,
+        operations: List[BatchOperation]
+        ) -> List[BatchOperationResult]:
+    steps = plan_batch(db, user_id, operations)
+    writer = BatchWriter(db, user_id)
+    try:
+        results = writer.write(steps)
+        db.commit()
+    except StatementFailed as e:
+        db.rollback()
+        status_code = status.HTTP_409_CONFLICT if isinstance(e.error, IntegrityError) else status.HTTP_422_UNPROCESSABLE_CONTENT
+        message = str(getattr(e.error, "orig", e.error)).splitlines()[0]
+        error = BatchOperationError(
+            index=failing_index(db, user_id, steps, e),
+            status=status_code,
+            error=f"Rejected by the database: {message}"
+        )
+        raise HTTPException(status_code=status_code, detail=[error.model_dump()])
+
+    # Core statements bypass the session events that keep these in step
+    leaderboards.apply(writer.leaderboard_changes)
+    if writer.writes:
+        dashboard_snapshot.record_write(writer.writes)
+    invalidate_users([user_id])
+    return results
@@ -0,0 +1,190 @@
+import csv
+import json
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app.http_cache import invalidate_users
+from app.leaderboards import leaderboards
+from app.models import Perfume, Purchase
+from app.rollups import record_purchases
+from app.routers.admin import dashboard_snapshot
+from app.schemas import BulkImportResult, BulkRowError, PerfumeCreate, PurchaseCreate
+
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+BULK_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/x-ndjson": {"schema": {"type": "string"}},
+            "text/csv": {"schema": {"type": "string"}},
+        },
+    }
+}
+
+def request_format(
+        request: Request,
+        format: Optional[str]
+        ) -> str:
+    if format:
+        return format
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"
+    )
+
+async def _lines(
+        request: Request
+        ) -> AsyncIterator[str]:
+    pending = b""
+    async for chunk in request.stream():
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8-sig").rstrip("\r")
+
+async def iter_records(
+        request: Request,
+        fmt: str
+        ) -> AsyncIterator[Tuple[int, object]]:
+    # rows are numbered from 1 excluding the CSV header; quoted newlines in CSV are not supported
+    header: Optional[List[str]] = None
+    row = 0
+    async for line in _lines(request):
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            row += 1
+            yield row, {key: value for key, value in zip(header, values) if value != ""}
+        else:
+            row += 1
+            try:
+                yield row, json.loads(line)
+            except ValueError as e:
+                yield row, e
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: List[BulkRowError] = []
+        self.started = time.perf_counter()
+
+    def error(
+            self,
+            row: int,
+            message: str
+            ) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(BulkRowError(row=row, error=message))
+
+    def result(self) -> BulkImportResult:
+        elapsed = time.perf_counter() - self.started
+        processed = self.inserted + self.failed
+        return BulkImportResult(
+            inserted=self.inserted,
+            failed=self.failed,
+            errors=self.errors,
+            elapsed_seconds=round(elapsed, 4),
+            rows_per_second=round(processed / elapsed, 1) if elapsed else 0.0
+        )
+
+def validation_message(
+        error: ValidationError
+        ) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" if item["loc"] else item["msg"]
+        for item in error.errors(include_url=False)
+    )
+
+def import_perfume_chunk(
+        db: Session,
+        user_id: int,
+        items: List[Tuple[int, PerfumeCreate]],
+        report: ImportReport
+        ) -> None:
+    rows = [{**item.model_dump(), "user_id": user_id} for _, item in items]
+    db.execute(insert(Perfume), rows)
+    db.commit()
+
+    report.inserted += len(rows)
+    leaderboards.apply([("perfume", user_id, len(rows))])
+    dashboard_snapshot.record_write(len(rows))
+    invalidate_users([user_id])
+
+def import_purchase_chunk(
+        db: Session,
+        user_id: int,
+        items: List[Tuple[int, PurchaseCreate]],
+        report: ImportReport
+        ) -> None:
+    # one set-based ownership check for the whole chunk
+    perfume_ids = {item.perfume_id for _, item in items}
+    owned = set(db.execute(
+        select(Perfume.id).where(Perfume.id.in_(perfume_ids), Perfume.user_id == user_id)
+    ).scalars())
+
+    rows = []
+    for row, item in items:
+        if item.perfume_id not in owned:
+            report.error(row, f"perfume_id: Perfume {item.perfume_id} not found")
+            continue
+        rows.append({**item.model_dump(), "user_id": user_id})
+    if not rows:
+        return
+
+    ids = db.execute(
+        insert(Purchase).returning(Purchase.id, sort_by_parameter_order=True), rows
+    ).scalars().all()
+    record_purchases(db, user_id, [(row["date"], row["price"]) for row in rows])
+    db.commit()
+
+    report.inserted += len(rows)
+    leaderboards.apply([
+        ("purchase_added", purchase_id, row["price"], row["perfume_id"], user_id, None)
+        for purchase_id, row in zip(ids, rows)
+    ])
+    dashboard_snapshot.record_write(len(rows))
+    invalidate_users([user_id])
+
+async def run_import(
+        request: Request,
+        fmt: str,
+        schema: Type[BaseModel],
+        import_chunk: Callable[[List[Tuple[int, BaseModel]], ImportReport], Awaitable[None]]
+        ) -> BulkImportResult:
+    report = ImportReport()
+    chunk: List[Tuple[int, BaseModel]] = []
+    async for row, data in iter_records(request, fmt):
+        if isinstance(data, Exception):
+            report.error(row, f"Invalid JSON: {data}")
+            continue
+        try:
+            chunk.append((row, schema.model_validate(data)))
+        except ValidationError as e:
+            report.error(row, validation_message(e))
+            continue
+        if len(chunk) >= CHUNK_SIZE:
+            await import_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        await import_chunk(chunk, report)
+    return report.result()
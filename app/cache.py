@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+
+class LRUCache:
+    def __init__(
+            self,
+            maxsize: int = 1024,
+            ttl: Optional[float] = None,
+            maxbytes: Optional[int] = None,
+            weigh: Callable[[Any], int] = lambda value: 0
+            ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # optional memory cap, enforced with the caller's estimate of each value's size
+        self.maxbytes = maxbytes
+        self.weigh = weigh
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+            self,
+            key: Hashable,
+            default: Any = None
+            ) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value, _ = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(
+            self,
+            key: Hashable,
+            value: Any,
+            ttl: Optional[float] = None
+            ) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        weight = self.weigh(value)
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (expires_at, value, weight)
+            self.bytes += weight
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+                _, (_, _, evicted) = self._data.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def _remove(
+            self,
+            key: Hashable
+            ) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def invalidate(
+            self,
+            key: Hashable
+            ) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
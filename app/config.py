@@ -0,0 +1,107 @@
+from typing import Dict, Literal, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class Settings(BaseSettings):
+    SECRET_KEY: str
+    ALGORITHM: str
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # /auth/refresh trades a refresh token for a new access token and a new refresh token without
+    # a password check, retiring the one it was given; /auth/logout revokes the session behind all
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    DB_STACK: Literal["sync", "async"] = "sync"
+    BCRYPT_ROUNDS: int = 12
+    HASH_POOL_KIND: Literal["process", "thread"] = "process"
+    HASH_POOL_WORKERS: int = 2
+    HASH_POOL_MAX_PENDING: int = 16
+    HASH_POOL_RETRY_AFTER_SECONDS: int = 1
+    USER_CACHE_SIZE: int = 4096
+    USER_CACHE_TTL_SECONDS: float = 60
+    # when true, user endpoints trust the signed uid/active claims and skip the DB;
+    # deactivation then takes effect through the token denylist
+    AUTH_TRUST_CLAIMS: bool = False
+    # revoked sessions and deactivated users are loaded into memory at startup and re-read every
+    # TOKEN_DENYLIST_REFRESH_SECONDS, which is how revocations reach the other workers
+    LOAD_TOKEN_DENYLIST_ON_STARTUP: bool = True
+    TOKEN_DENYLIST_REFRESH_SECONDS: float = 10
+    # verified access tokens, so repeat requests skip signature checks and JSON parsing
+    TOKEN_CACHE_SIZE: int = 10000
+    # key rotation: verification keys by kid (the secret for HS*, a PEM public key for RS*/ES*)
+    # and the kid new tokens are signed with, using JWT_SIGNING_KEY (the PEM private key) when set.
+    # Keep a retired kid listed until its tokens expire. Without JWT_KEYS, SECRET_KEY signs.
+    JWT_KEYS: Dict[str, str] = {}
+    JWT_SIGNING_KID: Optional[str] = None
+    JWT_SIGNING_KEY: Optional[str] = None
+    DASHBOARD_REFRESH_SECONDS: float = 30
+    DASHBOARD_WRITE_THRESHOLD: int = 100
+    DASHBOARD_BACKGROUND_REFRESH: bool = True
+    SEED_LEADERBOARDS_ON_STARTUP: bool = True
+    # with several workers and no shared cache backend to announce writes, each worker's
+    # leaderboards are reseeded once older than this
+    LEADERBOARD_MAX_AGE_SECONDS: float = 30
+    # list endpoints select plain columns and encode rows straight to JSON bytes,
+    # skipping per-item response_model validation
+    FAST_JSON_LISTS: bool = False
+    HTTP_CACHE_ENABLED: bool = True
+    # Server-Timing headers and /metrics; admins can add an X-Profile header to any
+    # request to get a sampled stack dump written under PROFILE_DIR
+    INSTRUMENTATION_ENABLED: bool = True
+    # /metrics answers 404 until this is set, then only to scrapers sending it as a bearer token
+    METRICS_TOKEN: Optional[str] = None
+    PROFILE_DIR: str = "profiles"
+    RESPONSE_CACHE_SIZE: int = 10000
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 1024 * 1024
+    RESPONSE_CACHE_TTL_SECONDS: float = 300
+    # redis:// URL shared by all workers for cache invalidation state; without it (or when it
+    # is unreachable at startup) each process keeps its own and the response cache is only
+    # used when WEB_CONCURRENCY is 1
+    CACHE_BACKEND_URL: Optional[str] = None
+    CACHE_BACKEND_TIMEOUT_SECONDS: float = 0.5
+    # per-router token buckets ("count/second|minute|hour") keyed by user, or by IP when
+    # anonymous, shared by all workers through CACHE_BACKEND_URL and per worker otherwise;
+    # plus caps on concurrent requests per router in each worker
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: Dict[str, str] = {"auth": "30/minute", "admin": "120/minute", "stats": "300/minute"}
+    CONCURRENCY_LIMITS: Dict[str, int] = {"admin": 4, "stats": 32}
+    CONCURRENCY_RETRY_AFTER_SECONDS: int = 1
+    # columnar purchase frames behind /stats/timeseries and /stats/breakdowns, per user data version
+    ANALYTICS_CACHE_SIZE: int = 256
+    ANALYTICS_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    # /stats/timeseries returns every bucket between the first and last purchase; wider ranges
+    # are refused rather than materialized
+    TIMESERIES_MAX_POINTS: int = 5000
+    # POST /purchases hands rows to one writer thread that commits everything queued within
+    # GROUP_COMMIT_MAX_DELAY_MS (or GROUP_COMMIT_MAX_ROWS) as one transaction; each request
+    # still returns only after its row is committed. The writer uses DATABASE_URL on both stacks.
+    GROUP_COMMIT_ENABLED: bool = False
+    GROUP_COMMIT_MAX_DELAY_MS: float = 2
+    GROUP_COMMIT_MAX_ROWS: int = 500
+    # operations accepted by one POST /batch, all applied in a single transaction
+    BATCH_MAX_OPERATIONS: int = 1000
+    # worker processes per host; gunicorn and uvicorn read the same variable
+    WEB_CONCURRENCY: int = 1
+    # on startup open pool connections, compile the hot queries and start the hashing workers
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_CONNECTIONS: int = 4
+
+    DATABASE_URL: str = "sqlite:///perfumes.db"
+    ASYNC_DATABASE_URL: str = "sqlite+aiosqlite:///perfumes.db"
+    # development keeps SQLite defaults and statement echo; production applies the tuning below
+    DB_PROFILE: Literal["development", "production"] = "development"
+    DB_ECHO: Optional[bool] = None
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE_SECONDS: int = 3600
+    # optional replica for GET endpoints; after a write the client reads from the primary
+    # for REPLICA_STICKY_SECONDS so it sees its own changes
+    READ_REPLICA_URL: Optional[str] = None
+    ASYNC_READ_REPLICA_URL: Optional[str] = None
+    REPLICA_STICKY_SECONDS: float = 5
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KIB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456
+
+    model_config = SettingsConfigDict(env_file=".env")
+
+settings = Settings()
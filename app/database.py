@@ -1,10 +1,108 @@
-from sqlalchemy import create_engine
+import math
+import time
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
-from typing import Generator
+from sqlalchemy.pool import QueuePool
+from starlette.datastructures import MutableHeaders
+from typing import AsyncGenerator, Generator, Optional
+
+from app.config import Settings, settings
+
+def sqlite_pragmas(
+        config: Settings,
+        read_only: bool = False
+        ) -> dict:
+    if config.DB_PROFILE != "production":
+        return {"query_only": "ON"} if read_only else {}
+    pragmas = {
+        # WAL lets readers proceed while a writer holds the lock
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -config.SQLITE_CACHE_SIZE_KIB,
+        "mmap_size": config.SQLITE_MMAP_SIZE,
+        "temp_store": "MEMORY",
+    }
+    if read_only:
+        pragmas["query_only"] = "ON"
+    return pragmas
+
+def _apply_pragmas(
+        engine: Engine,
+        pragmas: dict
+        ) -> None:
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
 
-DATABASE_URL = "sqlite:///perfumes.db"
+def _set_read_only_session(
+        engine: Engine
+        ) -> None:
 
-engine = create_engine(DATABASE_URL, echo=True, future=True)
+    @event.listens_for(engine, "connect")
+    def set_read_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+        cursor.close()
+        dbapi_connection.commit()
+
+def _engine_options(
+        url: str,
+        config: Settings
+        ) -> dict:
+    echo = config.DB_ECHO if config.DB_ECHO is not None else config.DB_PROFILE == "development"
+    options = {"echo": echo}
+    if url.startswith("sqlite"):
+        # connections are handed between threadpool workers, never used concurrently
+        options["connect_args"] = {"check_same_thread": False}
+    if config.DB_PROFILE == "production":
+        options.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_recycle=config.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=not url.startswith("sqlite"),
+        )
+    return options
+
+def create_db_engine(
+        url: str,
+        config: Settings = settings,
+        read_only: bool = False
+        ) -> Engine:
+    options = _engine_options(url, config)
+    if config.DB_PROFILE == "production":
+        options["poolclass"] = QueuePool
+    engine = create_engine(url, future=True, **options)
+    if url.startswith("sqlite"):
+        _apply_pragmas(engine, sqlite_pragmas(config, read_only))
+    elif read_only:
+        _set_read_only_session(engine)
+    return engine
+
+def create_async_db_engine(
+        url: str,
+        config: Settings = settings,
+        read_only: bool = False
+        ) -> AsyncEngine:
+    engine = create_async_engine(url, **_engine_options(url, config))
+    # connect events fire on the sync engine the async one drives
+    if url.startswith("sqlite"):
+        _apply_pragmas(engine.sync_engine, sqlite_pragmas(config, read_only))
+    elif read_only:
+        _set_read_only_session(engine.sync_engine)
+    return engine
+
+engine = create_db_engine(settings.DATABASE_URL)
 
 SessionLocal = sessionmaker(
     bind= engine,
@@ -13,11 +111,104 @@ SessionLocal = sessionmaker(
     future= True 
 )
 
+def _create_read_engine(
+        config: Settings = settings
+        ) -> Engine:
+    if config.READ_REPLICA_URL:
+        return create_db_engine(config.READ_REPLICA_URL, config, read_only=True)
+    if config.DB_PROFILE == "production":
+        return create_db_engine(config.DATABASE_URL, config, read_only=True)
+    return engine
+
+# GET endpoints read through their own pool: the replica when one is configured,
+# otherwise a read-only pool on the primary in production
+read_engine = _create_read_engine()
+
+ReadSessionLocal = sessionmaker(
+    bind= read_engine,
+    autoflush= False,
+    autocommit= False,
+    future= True
+)
+
+async_engine = create_async_db_engine(settings.ASYNC_DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind= async_engine,
+    autoflush= False,
+    expire_on_commit= False
+)
+
+async_read_engine = create_async_db_engine(settings.ASYNC_READ_REPLICA_URL, read_only=True) \
+    if settings.ASYNC_READ_REPLICA_URL else async_engine
+
+AsyncReadSessionLocal = async_sessionmaker(
+    bind= async_read_engine,
+    autoflush= False,
+    expire_on_commit= False
+)
+
 Base = declarative_base()
 
+PRIMARY_READ_COOKIE = "read_primary_until"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+def reads_from_primary(
+        request: Request
+        ) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_READ_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+class ReadYourWritesMiddleware:
+    # a replica can lag the primary, so a client that just wrote gets a short-lived
+    # cookie steering its reads to the primary. Keeping the marker client-side
+    # means it holds across workers and hosts.
+    def __init__(self, app, sticky_seconds: Optional[float] = None):
+        self.app = app
+        self.sticky_seconds = settings.REPLICA_STICKY_SECONDS if sticky_seconds is None else sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + self.sticky_seconds
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{PRIMARY_READ_COOKIE}={until:.3f}; Max-Age={math.ceil(self.sticky_seconds)}; "
+                    "Path=/; HttpOnly; SameSite=lax"
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def get_read_db(
+        request: Request
+        ) -> Generator[Session, None, None]:
+    db = SessionLocal() if reads_from_primary(request) else ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_async_read_db(
+        request: Request
+        ) -> AsyncGenerator[AsyncSession, None]:
+    factory = AsyncSessionLocal if reads_from_primary(request) else AsyncReadSessionLocal
+    async with factory() as db:
+        yield db
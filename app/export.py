@@ -0,0 +1,220 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Iterator, List, Sequence
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models import Perfume, Purchase
+
+EXPORT_BATCH_SIZE = 1000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def perfume_export_query(
+        user_id: int
+        ):
+    return select(
+        Perfume.id, Perfume.name, Perfume.brand, Perfume.concentration, Perfume.season, Perfume.available
+        ).where(Perfume.user_id == user_id).order_by(Perfume.id)
+
+def purchase_export_query(
+        user_id: int,
+        with_perfume: bool = False
+        ):
+    columns = [Purchase.id, Purchase.perfume_id, Purchase.date, Purchase.price, Purchase.store, Purchase.ml]
+    if not with_perfume:
+        return select(*columns).where(Purchase.user_id == user_id).order_by(Purchase.id)
+    return select(
+        *columns,
+        Perfume.name.label("perfume_name"),
+        Perfume.brand.label("perfume_brand"),
+        Perfume.concentration,
+        Perfume.season
+        ).join(Perfume, Purchase.perfume_id == Perfume.id).\
+        where(Purchase.user_id == user_id).\
+        order_by(Purchase.id)
+
+# parquet column types by the selected column's Python type; enums and dates are written as
+# their wire strings, like the other formats
+ARROW_TYPES = {bool: "bool_", int: "int64", float: "float64"}
+
+def _python_type(
+        column
+        ) -> type:
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return str
+
+def _plain(value):
+    # enums and dates as their wire representation, everything else untouched
+    if hasattr(value, "value"):
+        return value.value
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+class NDJSONEncoder:
+    def __init__(self, columns: Sequence):
+        self.keys = [column.name for column in columns]
+
+    def start(self) -> bytes:
+        return b""
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        keys = self.keys
+        return "".join(
+            json.dumps(dict(zip(keys, map(_plain, row)))) + "\n" for row in rows
+        ).encode()
+
+    def finish(self) -> bytes:
+        return b""
+
+class CSVEncoder:
+    def __init__(self, columns: Sequence):
+        self.keys = [column.name for column in columns]
+
+    def _write(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def start(self) -> bytes:
+        return self._write([self.keys])
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        return self._write([map(_plain, row) for row in rows])
+
+    def finish(self) -> bytes:
+        return b""
+
+class _ByteSink(io.RawIOBase):
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+class ParquetEncoder:
+    # one row group per fetched batch, bytes are flushed to the client as they are written
+    def __init__(self, columns: Sequence):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.keys = [column.name for column in columns]
+        # fixed up front: inferred per batch, a nullable column that is all None in the first
+        # batch would become type null and every later batch would fail to match it
+        self.schema = pyarrow.schema([
+            (column.name, getattr(pyarrow, ARROW_TYPES.get(_python_type(column), "string"))())
+            for column in columns
+        ])
+        self.sink = _ByteSink()
+        self.writer = None
+
+    def start(self) -> bytes:
+        return b""
+
+    def encode(self, rows: List[tuple]) -> bytes:
+        columns = {key: [_plain(row[i]) for row in rows] for i, key in enumerate(self.keys)}
+        table = self.pa.table(columns, schema=self.schema)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.sink, self.schema)
+        self.writer.write_table(table)
+        return self.sink.drain()
+
+    def finish(self) -> bytes:
+        if self.writer is None:
+            # no rows still makes a readable file with the columns in it
+            self.writer = self.pq.ParquetWriter(self.sink, self.schema)
+        self.writer.close()
+        return self.sink.drain()
+
+ENCODERS = {"ndjson": NDJSONEncoder, "csv": CSVEncoder, "parquet": ParquetEncoder}
+
+def _encoder(
+        fmt: str,
+        stmt
+        ):
+    try:
+        return ENCODERS[fmt](stmt.selected_columns)
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Parquet export requires pyarrow to be installed"
+        )
+
+def _headers(
+        filename: str,
+        fmt: str
+        ) -> dict:
+    return {"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+
+def _stream(
+        bind,
+        stmt,
+        encoder
+        ) -> Iterator[bytes]:
+    # own session: the request-scoped one may be closed before the body is streamed
+    with Session(bind=bind) as session:
+        result = session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        yield encoder.start()
+        for batch in result.partitions():
+            yield encoder.encode(batch)
+        yield encoder.finish()
+
+async def _stream_async(
+        bind,
+        stmt,
+        encoder
+        ) -> AsyncIterator[bytes]:
+    async with AsyncSession(bind=bind) as session:
+        result = await session.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        yield encoder.start()
+        async for batch in result.partitions():
+            yield encoder.encode(batch)
+        yield encoder.finish()
+
+def export_response(
+        db: Session,
+        stmt,
+        fmt: str,
+        filename: str
+        ) -> StreamingResponse:
+    encoder = _encoder(fmt, stmt)
+    return StreamingResponse(
+        _stream(db.get_bind(), stmt, encoder),
+        media_type=MEDIA_TYPES[fmt],
+        headers=_headers(filename, fmt)
+    )
+
+def export_response_async(
+        db: AsyncSession,
+        stmt,
+        fmt: str,
+        filename: str
+        ) -> StreamingResponse:
+    encoder = _encoder(fmt, stmt)
+    return StreamingResponse(
+        _stream_async(db.bind, stmt, encoder),
+        media_type=MEDIA_TYPES[fmt],
+        headers=_headers(filename, fmt)
+    )
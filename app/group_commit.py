@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from app.batch import PURCHASE_COLUMNS
+from app.config import settings
+from app.database import SessionLocal
+from app.http_cache import invalidate_users
+from app.leaderboards import leaderboards
+from app.models import Purchase
+from app.rollups import record_purchases
+from app.routers.admin import dashboard_snapshot
+from app.schemas import PerfumeRead, PurchaseCreate, PurchaseRead
+
+_STOP = object()
+
+# (purchase column values, the perfume for the leaderboards, the waiting request's future)
+PendingPurchase = Tuple[dict, Optional[PerfumeRead], Future]
+
+class GroupCommitWriter:
+    # Purchases from concurrent requests are queued to one writer thread, which inserts
+    # whatever has arrived in a single transaction. Each request waits on its future, which
+    # resolves only after that transaction commits, so a 201 still means the row is durable.
+    # One writer also means request threads never queue on SQLite's write lock.
+    def __init__(
+            self,
+            session_factory: Callable[[], Session],
+            max_delay: float,
+            max_rows: int
+            ):
+        self.session_factory = session_factory
+        self.max_delay = max_delay
+        self.max_rows = max_rows
+        self.batches = 0
+        self.rows = 0
+        self._last_batch = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(
+            self,
+            values: dict,
+            perfume: Optional[PerfumeRead] = None
+            ) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+            self._queue.put((values, perfume, future))
+        return future
+
+    def stop(self) -> None:
+        # everything queued before the stop is still written
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "average_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def _collect(
+            self,
+            first: PendingPurchase
+            ) -> Tuple[List[PendingPurchase], bool]:
+        batch = [first]
+        # a lone client would only pay the delay; it is worth waiting once batches form
+        deadline = time.monotonic() + (self.max_delay if self._last_batch > 1 else 0)
+        while len(batch) < self.max_rows:
+            # past the deadline only what is already queued joins the batch
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch, stopping = self._collect(item)
+            self._last_batch = len(batch)
+            try:
+                self._write(batch)
+            except Exception as e:
+                # the writer has to outlive any one batch, and no request may wait forever
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _write(
+            self,
+            batch: List[PendingPurchase]
+            ) -> None:
+        values = [item[0] for item in batch]
+        try:
+            with self.session_factory() as db:
+                rows = db.execute(insert(Purchase).returning(*PURCHASE_COLUMNS, sort_by_parameter_order=True), values).all()
+                purchases = [PurchaseRead.model_validate(row._mapping) for row in rows]
+                by_user: Dict[int, list] = {}
+                for purchase in purchases:
+                    by_user.setdefault(purchase.user_id, []).append((purchase.date, purchase.price))
+                for user_id, spending in by_user.items():
+                    record_purchases(db, user_id, spending)
+                db.commit()
+        except (IntegrityError, DataError) as e:
+            if len(batch) > 1:
+                # one bad row must not fail everyone it happened to share a transaction with
+                for item in batch:
+                    self._write([item])
+                return
+            batch[0][2].set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(batch)
+        leaderboards.apply([
+            ("purchase_added", purchase.id, purchase.price, purchase.perfume_id, purchase.user_id, perfume)
+            for purchase, (_, perfume, _) in zip(purchases, batch)
+        ])
+        dashboard_snapshot.record_write(len(batch))
+        invalidate_users(by_user)
+        for purchase, (_, _, future) in zip(purchases, batch):
+            future.set_result(purchase)
+
+purchase_writer = GroupCommitWriter(
+    SessionLocal,
+    max_delay=settings.GROUP_COMMIT_MAX_DELAY_MS / 1000,
+    max_rows=settings.GROUP_COMMIT_MAX_ROWS
+)
+
+def submit_purchase(
+        user_id: int,
+        purchase_in: PurchaseCreate,
+        perfume: Optional[PerfumeRead] = None
+        ) -> Future:
+    return purchase_writer.submit({**purchase_in.model_dump(), "user_id": user_id}, perfume)
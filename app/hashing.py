@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Optional, Tuple
+
+from passlib.context import CryptContext
+
+class HashingPoolSaturated(RuntimeError):
+    pass
+
+@lru_cache(maxsize=None)
+def crypt_context(
+        rounds: int
+        ) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+# module level so they can be pickled into pool worker processes
+
+def hash_password(
+        password: str,
+        rounds: int
+        ) -> str:
+    return crypt_context(rounds).hash(password)
+
+def verify_and_update(
+        plain_password: str,
+        hashed_password: str,
+        rounds: int
+        ) -> Tuple[bool, Optional[str]]:
+    return crypt_context(rounds).verify_and_update(plain_password, hashed_password)
+
+def load_crypt_context(
+        rounds: int
+        ) -> None:
+    # builds the context and loads the bcrypt backend without paying for a hash
+    crypt_context(rounds).handler().get_backend()
+
+class HashingPool:
+    def __init__(
+            self,
+            kind: str = "process",
+            workers: int = 2,
+            max_pending: int = 16
+            ):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        # created on first use so forked server workers each get their own pool
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hashing")
+        return self._executor
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def submit(
+            self,
+            fn: Callable,
+            *args
+            ) -> Future:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise HashingPoolSaturated("Password hashing pool is saturated")
+            self.pending += 1
+            executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            with self._lock:
+                self.pending -= 1
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def run(
+            self,
+            fn: Callable,
+            *args
+            ):
+        return self.submit(fn, *args).result()
+
+    async def run_async(
+            self,
+            fn: Callable,
+            *args
+            ):
+        return await asyncio.wrap_future(self.submit(fn, *args))
+
+    def warm(
+            self,
+            fn: Callable,
+            *args
+            ) -> None:
+        # starts every worker now instead of on the first logins after a deploy
+        with self._lock:
+            executor = self._get_executor()
+        for future in [executor.submit(fn, *args) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
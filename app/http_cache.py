@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import secrets
+import time
+from typing import Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.datastructures import Headers
+
+from app.auth import bearer_payload
+from app.cache import LRUCache
+from app.config import settings
+from app.models import Perfume, Purchase, User
+from app.shared_cache import CacheBackendError, MemoryBackend, cache_backend
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_PATHS = frozenset({
+    "/perfumes", "/purchases", "/stats/spending", "/stats/most_expensive", "/stats/timeseries", "/stats/breakdowns"
+})
+
+class DataVersions:
+    # per-user counter bumped on every committed write to that user's data. With a shared
+    # cache backend every worker reads the same counters. With the in-memory fallback a write
+    # only reaches the worker that made it, which is why create_app keeps the response cache
+    # off for several workers. The epoch keeps ETags minted against other counters, such as
+    # a previous process, from ever matching.
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.backend.set("epoch", secrets.token_hex(4).encode(), only_if_missing=True)
+        self.epoch = self.backend.get("epoch").decode()
+
+    def get(
+            self,
+            user_id: int
+            ) -> Tuple[int, float]:
+        version, changed_at = self.backend.mget([f"version:{user_id}", f"changed:{user_id}"])
+        return int(version or 0), float(changed_at or 0.0)
+
+    def bump(
+            self,
+            user_ids: Iterable[int]
+            ) -> None:
+        # wall clock rather than monotonic so other processes can compare it;
+        # stamped before the increment so a reader never sees a new version with an old time
+        now = str(time.time()).encode()
+        for user_id in user_ids:
+            self.backend.set(f"changed:{user_id}", now)
+            self.backend.incr(f"version:{user_id}")
+
+data_versions = DataVersions(cache_backend)
+
+def invalidate_users(
+        user_ids: Iterable[int]
+        ) -> None:
+    try:
+        data_versions.bump(user_ids)
+    except CacheBackendError:
+        # the write is already committed; cached reads for these users lag until their TTL
+        logger.exception("Could not bump data versions for users %s", sorted(user_ids))
+
+def _owner_ids(
+        objects: Iterable
+        ) -> Set[int]:
+    owners = set()
+    for obj in objects:
+        if isinstance(obj, (Perfume, Purchase)):
+            owners.add(obj.user_id)
+        elif isinstance(obj, User) and obj.id is not None:
+            # role or is_active changes must not keep being answered from the cache
+            owners.add(obj.id)
+    return owners
+
+@event.listens_for(Session, "after_flush")
+def _collect_writes(session: Session, flush_context) -> None:
+    dirty = [obj for obj in session.dirty if session.is_modified(obj)]
+    owners = _owner_ids(session.new) | _owner_ids(session.deleted) | _owner_ids(dirty)
+    if owners:
+        session.info.setdefault("http_cache_owners", set()).update(owners)
+
+@event.listens_for(Session, "after_commit")
+def _bump_versions(session: Session) -> None:
+    owners = session.info.pop("http_cache_owners", None)
+    if owners:
+        invalidate_users(owners)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_writes(session: Session, previous_transaction) -> None:
+    session.info.pop("http_cache_owners", None)
+
+def versions_are_shared() -> bool:
+    # per-process versions can't tell one worker about another worker's writes
+    return data_versions.backend.shared or settings.WEB_CONCURRENCY == 1
+
+def stable_version(
+        user_id: int
+        ) -> Optional[int]:
+    # the user's data version when something derived from their data may be cached under it
+    if not versions_are_shared():
+        return None
+    try:
+        version, changed_at = data_versions.get(user_id)
+    except CacheBackendError:
+        return None
+    if settings.READ_REPLICA_URL and time.time() - changed_at < settings.REPLICA_STICKY_SECONDS:
+        # a lagging replica could still answer with pre-write data; don't pin that to the new version
+        return None
+    return version
+
+def compute_etag(
+        user_id: int,
+        version: int,
+        path: str,
+        query_string: bytes
+        ) -> str:
+    query = sorted(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))
+    raw = f"{data_versions.epoch}:{user_id}:{version}:{path}?{query}"
+    return '"' + hashlib.blake2b(raw.encode(), digest_size=12).hexdigest() + '"'
+
+def etag_matches(
+        if_none_match: str,
+        etag: str
+        ) -> bool:
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def create_response_cache() -> LRUCache:
+    return LRUCache(
+        maxsize=settings.RESPONSE_CACHE_SIZE,
+        ttl=settings.RESPONSE_CACHE_TTL_SECONDS,
+        maxbytes=settings.RESPONSE_CACHE_MAX_BYTES,
+        weigh=lambda entry: len(entry[1]) + sum(len(k) + len(v) for k, v in entry[0])
+    )
+
+class ConditionalGetMiddleware:
+    # answers If-None-Match with 304 and replays cached bodies for the polled read
+    # endpoints. Both happen before routing, so neither touches the database; the
+    # user comes from the token's uid claim.
+    def __init__(self, app, cache: Optional[LRUCache] = None):
+        self.app = app
+        self.cache = cache if cache is not None else create_response_cache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or scope["path"] not in CACHEABLE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        payload = bearer_payload(headers.get("authorization"))
+        user_id = payload.get("uid") if payload is not None else None
+        if user_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        version = stable_version(user_id)
+        if version is None:
+            await self.app(scope, receive, send)
+            return
+
+        etag = compute_etag(user_id, version, scope["path"], scope["query_string"])
+        validators = [(b"etag", etag.encode()), (b"cache-control", b"private, no-cache"), (b"vary", b"Authorization")]
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        cached = self.cache.get(etag)
+        if cached is not None:
+            cached_headers, body = cached
+            await send({"type": "http.response.start", "status": 200, "headers": cached_headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        status = None
+        response_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+        size = 0
+
+        async def send_with_etag(message):
+            nonlocal status, response_headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if status == 200:
+                    response_headers = list(message.get("headers", [])) + validators
+                    message["headers"] = response_headers
+            elif message["type"] == "http.response.body" and status == 200:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if size > settings.RESPONSE_CACHE_MAX_ENTRY_BYTES:
+                    status = None
+                    chunks.clear()
+                elif not message.get("more_body", False):
+                    self.cache.set(etag, (response_headers, b"".join(chunks)))
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
@@ -1,9 +1,14 @@
 from app.database import engine, Base
 from app import models
+from app.migrations import run_migrations
 
 def init_db():
     Base.metadata.create_all(bind=engine)
     print("Database tables created")
 
+    applied = run_migrations(engine)
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,289 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import Perfume, Purchase, User
+from app.schemas import (
+    MostExpensivePurchase,
+    PerfumeRead,
+    TopUsersResponse,
+    UserPerfumeCount,
+    UserRead,
+    UserTotalSpent
+)
+from app.shared_cache import SharedVersions
+
+MAX_LIMIT = 10
+
+class RankedScores:
+    # scores kept alongside a list sorted by (-score, key), so top(k) is a slice
+    def __init__(self):
+        self.scores: Dict[Hashable, float] = {}
+        self.counts: Dict[Hashable, int] = {}
+        self._ranked: List[Tuple[float, Hashable]] = []
+
+    def add(
+            self,
+            key: Hashable,
+            delta: float,
+            count: int = 1
+            ) -> None:
+        old = self.scores.get(key)
+        if old is not None:
+            del self._ranked[bisect_left(self._ranked, (-old, key))]
+        new_count = self.counts.get(key, 0) + count
+        if new_count <= 0:
+            self.scores.pop(key, None)
+            self.counts.pop(key, None)
+            return
+        score = (old or 0) + delta
+        self.scores[key] = score
+        self.counts[key] = new_count
+        insort(self._ranked, (-score, key))
+
+    def top(
+            self,
+            k: int
+            ) -> List[Tuple[Hashable, float]]:
+        return [(key, -score) for score, key in self._ranked[:k]]
+
+class TopPurchases:
+    # the `capacity` most expensive purchases; `exhaustive` when it holds every purchase
+    def __init__(
+            self,
+            capacity: int = MAX_LIMIT * 5
+            ):
+        self.capacity = capacity
+        self.exhaustive = True
+        self.needs_reseed = False
+        self.purchases: Dict[int, Tuple[float, int, int]] = {}
+        self.perfumes: Dict[int, PerfumeRead] = {}
+        self._ranked: List[Tuple[float, int]] = []
+
+    def add(
+            self,
+            purchase_id: int,
+            price: float,
+            perfume_id: int,
+            user_id: int,
+            perfume: Optional[PerfumeRead]
+            ) -> None:
+        # below the cutoff of a partial buffer there may be unseen purchases in the DB
+        if not self.exhaustive and (not self._ranked or -price > self._ranked[-1][0]):
+            return
+        if perfume is None and perfume_id not in self.perfumes:
+            self.needs_reseed = True
+            return
+        if perfume is not None:
+            self.perfumes[perfume_id] = perfume
+        insort(self._ranked, (-price, purchase_id))
+        self.purchases[purchase_id] = (price, perfume_id, user_id)
+        if len(self._ranked) > self.capacity:
+            _, dropped = self._ranked.pop()
+            self.purchases.pop(dropped)
+            self.exhaustive = False
+
+    def remove(
+            self,
+            purchase_id: int
+            ) -> None:
+        entry = self.purchases.pop(purchase_id, None)
+        if entry is None:
+            return
+        del self._ranked[bisect_left(self._ranked, (-entry[0], purchase_id))]
+        if not self.exhaustive and len(self._ranked) < MAX_LIMIT:
+            self.needs_reseed = True
+
+    def top(
+            self,
+            k: int
+            ) -> List[Tuple[float, int, int]]:
+        return [self.purchases[purchase_id] for _, purchase_id in self._ranked[:k]]
+
+class Leaderboards:
+    # every worker keeps its own copy and applies its own commits to it; the shared version
+    # counts commits from all workers, so a gap means another worker wrote and a reseed is due
+    def __init__(self, versions: Optional[SharedVersions] = None):
+        self.versions = versions if versions is not None else SharedVersions("leaderboards")
+        self.seeded = False
+        self.version: Optional[int] = None
+        self.seeded_at = 0.0
+        self.users: Dict[int, UserRead] = {}
+        self.perfume_counts = RankedScores()
+        self.total_spent = RankedScores()
+        self.top_purchases = TopPurchases()
+        self._lock = threading.RLock()
+
+    def _seed_top_purchases(
+            self,
+            db: Session
+            ) -> None:
+        top = TopPurchases(self.top_purchases.capacity)
+        rows = db.execute(
+            select(Purchase, Perfume).
+                join(Perfume, Purchase.perfume_id == Perfume.id).
+                order_by(Purchase.price.desc()).
+                limit(top.capacity + 1)
+        ).all()
+        for purchase, perfume in rows[:top.capacity]:
+            top.add(purchase.id, purchase.price, purchase.perfume_id, purchase.user_id, PerfumeRead.model_validate(perfume))
+        top.exhaustive = len(rows) <= top.capacity
+        self.top_purchases = top
+
+    def seed(
+            self,
+            db: Session
+            ) -> None:
+        with self._lock:
+            self.version = self.versions.get()
+            self.seeded_at = time.monotonic()
+            self.users = {user.id: UserRead.model_validate(user) for user in db.execute(select(User)).scalars()}
+
+            self.perfume_counts = RankedScores()
+            for user_id, count in db.execute(
+                    select(Perfume.user_id, func.count(Perfume.id)).group_by(Perfume.user_id)):
+                self.perfume_counts.add(user_id, count, count)
+
+            self.total_spent = RankedScores()
+            for user_id, total, count in db.execute(
+                    select(Purchase.user_id, func.sum(Purchase.price), func.count(Purchase.id)).group_by(Purchase.user_id)):
+                self.total_spent.add(user_id, total, count)
+
+            self._seed_top_purchases(db)
+            self.seeded = True
+
+    def _current(self) -> bool:
+        version = self.versions.get()
+        if version is not None:
+            return version == self.version
+        # nothing shared: only this worker's writes reach it, age bounds what it misses
+        return settings.WEB_CONCURRENCY == 1 or time.monotonic() - self.seeded_at < settings.LEADERBOARD_MAX_AGE_SECONDS
+
+    def ensure_seeded(
+            self,
+            db: Session
+            ) -> None:
+        with self._lock:
+            if not self.seeded or not self._current():
+                self.seed(db)
+            elif self.top_purchases.needs_reseed:
+                self._seed_top_purchases(db)
+
+    def apply(
+            self,
+            changes: List[tuple]
+            ) -> None:
+        with self._lock:
+            # bumped under the lock so this worker's own commits arrive in version order
+            version = self.versions.bump()
+            if not self.seeded:
+                return
+            if version is not None:
+                if self.version is not None and version == self.version + 1:
+                    self.version = version
+                else:
+                    # another worker committed since this copy was seeded
+                    self.seeded = False
+                    return
+            for change in changes:
+                kind = change[0]
+                if kind == "user":
+                    self.users[change[1].id] = change[1]
+                elif kind == "perfume":
+                    _, user_id, sign = change
+                    self.perfume_counts.add(user_id, sign, sign)
+                elif kind == "perfume_info":
+                    perfume = change[1]
+                    if perfume.id in self.top_purchases.perfumes:
+                        self.top_purchases.perfumes[perfume.id] = perfume
+                elif kind == "purchase_added":
+                    _, purchase_id, price, perfume_id, user_id, perfume = change
+                    self.total_spent.add(user_id, price, 1)
+                    self.top_purchases.add(purchase_id, price, perfume_id, user_id, perfume)
+                elif kind == "purchase_removed":
+                    _, purchase_id, price, user_id = change
+                    self.total_spent.add(user_id, -price, -1)
+                    self.top_purchases.remove(purchase_id)
+                elif kind == "reseed":
+                    self.seeded = False
+
+    def top_users(
+            self,
+            limit: int
+            ) -> TopUsersResponse:
+        with self._lock:
+            most_perfumes = [
+                UserPerfumeCount(perfume_count=int(count), user=self.users[user_id])
+                for user_id, count in self.perfume_counts.top(limit)
+            ]
+            most_expensive_purchase = [
+                MostExpensivePurchase(
+                    price=price,
+                    perfume=self.top_purchases.perfumes[perfume_id],
+                    user=self.users[user_id]
+                )
+                for price, perfume_id, user_id in self.top_purchases.top(limit)
+            ]
+            most_expensive_collection = [
+                UserTotalSpent(total_spent=total, user=self.users[user_id])
+                for user_id, total in self.total_spent.top(limit)
+            ]
+        return TopUsersResponse(
+            most_perfumes=most_perfumes or None,
+            most_expensive_purchase=most_expensive_purchase or None,
+            most_expensive_collection=most_expensive_collection or None
+        )
+
+leaderboards = Leaderboards()
+
+def _perfume_read(
+        session: Session,
+        perfume_id: int
+        ) -> Optional[PerfumeRead]:
+    perfume = session.identity_map.get(inspect(Perfume).identity_key_from_primary_key((perfume_id,)))
+    return PerfumeRead.model_validate(perfume) if perfume is not None else None
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context) -> None:
+    changes = session.info.setdefault("leaderboard_changes", [])
+    for obj in session.new:
+        if isinstance(obj, User):
+            changes.append(("user", UserRead.model_validate(obj)))
+        elif isinstance(obj, Perfume):
+            changes.append(("perfume", obj.user_id, 1))
+        elif isinstance(obj, Purchase):
+            changes.append((
+                "purchase_added", obj.id, obj.price, obj.perfume_id, obj.user_id,
+                _perfume_read(session, obj.perfume_id)
+            ))
+    for obj in session.deleted:
+        if isinstance(obj, Perfume):
+            changes.append(("perfume", obj.user_id, -1))
+        elif isinstance(obj, Purchase):
+            changes.append(("purchase_removed", obj.id, obj.price, obj.user_id))
+    for obj in session.dirty:
+        if not session.is_modified(obj):
+            continue
+        if isinstance(obj, User):
+            changes.append(("user", UserRead.model_validate(obj)))
+        elif isinstance(obj, Perfume):
+            if inspect(obj).attrs.user_id.history.has_changes():
+                changes.append(("reseed",))
+            changes.append(("perfume_info", PerfumeRead.model_validate(obj)))
+        elif isinstance(obj, Purchase):
+            changes.append(("reseed",))
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session: Session) -> None:
+    changes = session.info.pop("leaderboard_changes", None)
+    if changes:
+        leaderboards.apply(changes)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session: Session, previous_transaction) -> None:
+    session.info.pop("leaderboard_changes", None)
@@ -1,19 +1,93 @@
-from fastapi import FastAPI
-from app.routers import perfumes, purchases, stats, auth, admin
+import asyncio
+from contextlib import asynccontextmanager
 
-app = FastAPI(
-    title="Perfume Tracker",
-    version="0.1.0",
-    description="Track my perfume collection and purchases"
+from fastapi import FastAPI
+from app.auth import hash_pool
+from app.config import settings
+from app.database import ReadYourWritesMiddleware, SessionLocal
+from app.group_commit import purchase_writer
+from app.http_cache import ConditionalGetMiddleware, create_response_cache, versions_are_shared
+from app.leaderboards import leaderboards
+from app.metrics import InstrumentationMiddleware, metrics_endpoint
+from app.revocation import load_denylist, run_denylist_refresher
+from app.snapshots import run_refresher
+from app.warmup import warm_up
+from app.routers import perfumes, purchases, stats, auth, admin, batch
+from app.routers.aio import (
+    perfumes as aio_perfumes,
+    purchases as aio_purchases,
+    stats as aio_stats,
+    auth as aio_auth,
+    admin as aio_admin,
+    batch as aio_batch
 )
 
-@app.get('/')
+# DB_STACK picks which set serves the API; both expose the same routes
+ROUTERS = {
+    "sync": [auth.router, perfumes.router, purchases.router, batch.router, stats.router, admin.router],
+    "async": [aio_auth.router, aio_perfumes.router, aio_purchases.router, aio_batch.router, aio_stats.router,
+              aio_admin.router],
+}
+
 def root():
     return {"status": "ok",
             "message": "Perfume Tracker is running"}
 
-app.include_router(auth.router)
-app.include_router(perfumes.router)
-app.include_router(purchases.router)
-app.include_router(stats.router)
-app.include_router(admin.router)
\ No newline at end of file
+def seed_leaderboards():
+    db = SessionLocal()
+    try:
+        leaderboards.seed(db)
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.WARMUP_ON_STARTUP:
+        await warm_up(app.state.db_stack)
+    if settings.SEED_LEADERBOARDS_ON_STARTUP:
+        await asyncio.to_thread(seed_leaderboards)
+
+    tasks = []
+    if settings.LOAD_TOKEN_DENYLIST_ON_STARTUP:
+        await asyncio.to_thread(load_denylist, SessionLocal)
+        tasks.append(asyncio.create_task(run_denylist_refresher(SessionLocal, settings.TOKEN_DENYLIST_REFRESH_SECONDS)))
+    if settings.DASHBOARD_BACKGROUND_REFRESH:
+        tasks.append(asyncio.create_task(run_refresher(admin.dashboard_snapshot, SessionLocal)))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # otherwise the bcrypt worker processes outlive a stopped server worker
+    await asyncio.to_thread(hash_pool.shutdown)
+    await asyncio.to_thread(purchase_writer.stop)
+
+def create_app(
+        db_stack: str = settings.DB_STACK
+        ) -> FastAPI:
+    app = FastAPI(
+        title="Perfume Tracker",
+        version="0.1.0",
+        description="Track my perfume collection and purchases",
+        lifespan=lifespan
+    )
+    app.state.db_stack = db_stack
+
+    if settings.READ_REPLICA_URL or settings.ASYNC_READ_REPLICA_URL:
+        app.add_middleware(ReadYourWritesMiddleware)
+    if settings.HTTP_CACHE_ENABLED and versions_are_shared():
+        app.state.response_cache = create_response_cache()
+        app.add_middleware(ConditionalGetMiddleware, cache=app.state.response_cache)
+    if settings.INSTRUMENTATION_ENABLED:
+        # added last so it is outermost and times the other middleware too
+        app.add_middleware(InstrumentationMiddleware)
+        app.get("/metrics", include_in_schema=False)(metrics_endpoint)
+
+    app.get('/')(root)
+
+    for router in ROUTERS[db_stack]:
+        app.include_router(router)
+    return app
+
+app = create_app()
@@ -0,0 +1,292 @@
+import bisect
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+
+from app.auth import bearer_payload, token_role
+from app.config import settings
+from app.models import Role
+
+@dataclass
+class RequestStats:
+    db_seconds: float = 0.0
+    statements: int = 0
+    rows: int = 0
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+_profiler: ContextVar[Optional["SamplingProfiler"]] = ContextVar("profiler", default=None)
+
+class _CountingCursor:
+    # stands in for the DBAPI cursor while a result is read so fetched rows can be counted
+    def __init__(self, cursor, stats: RequestStats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+# listening on the Engine class covers every engine, including the sync side of async ones
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+    profiler = _profiler.get()
+    if profiler is not None:
+        # sync endpoints run on threadpool threads the middleware never sees; the request's
+        # context follows them there, so their first statement enrolls them
+        profiler.track()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None or not conn.info.get("statement_started"):
+        return
+    stats.db_seconds += time.perf_counter() - conn.info["statement_started"].pop()
+    stats.statements += 1
+    if context is not None and cursor.description is not None:
+        context.cursor = _CountingCursor(cursor, stats)
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: Sequence[float]):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(
+            self,
+            labels: Tuple,
+            value: float
+            ) -> None:
+        series = self._series.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(
+            self,
+            label_names: Sequence[str]
+            ) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self._series.items()):
+            base = ",".join(f'{name}="{value}"' for name, value in zip(label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base},le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+class RequestMetrics:
+    LABELS = ("method", "route", "status")
+
+    def __init__(self):
+        self.duration = Histogram(
+            "http_request_duration_seconds", "Wall time per request.", DURATION_BUCKETS)
+        self.db_duration = Histogram(
+            "http_request_db_seconds", "Time spent executing SQL per request.", DURATION_BUCKETS)
+        self.statements = Histogram(
+            "http_request_sql_statements", "SQL statements executed per request.", STATEMENT_BUCKETS)
+        self.rows: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(
+            self,
+            labels: Tuple[str, str, str],
+            seconds: float,
+            stats: RequestStats
+            ) -> None:
+        with self._lock:
+            self.duration.observe(labels, seconds)
+            self.db_duration.observe(labels, stats.db_seconds)
+            self.statements.observe(labels, stats.statements)
+            self.rows[labels] += stats.rows
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for histogram in (self.duration, self.db_duration, self.statements):
+                lines += histogram.render(self.LABELS)
+            lines += [
+                "# HELP http_request_rows_fetched_total Rows fetched from the database.",
+                "# TYPE http_request_rows_fetched_total counter",
+            ]
+            for labels, rows in sorted(self.rows.items()):
+                base = ",".join(f'{name}="{value}"' for name, value in zip(self.LABELS, labels))
+                lines.append(f"http_request_rows_fetched_total{{{base}}} {rows}")
+        return "\n".join(lines) + "\n"
+
+request_metrics = RequestMetrics()
+
+def metrics_endpoint(
+        request: Request
+        ) -> Response:
+    if not settings.METRICS_TOKEN:
+        return Response(status_code=404)
+    authorization = request.headers.get("authorization", "")
+    if not secrets.compare_digest(authorization.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()):
+        return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(request_metrics.render(), media_type="text/plain; version=0.0.4")
+
+class SamplingProfiler:
+    # samples the stacks of the threads doing one request's work: sync endpoints run in the
+    # threadpool where cProfile, which only sees the thread that enabled it, would miss them.
+    # Threads are enrolled with track() from the request's context; the event loop thread is
+    # shared, so async code of concurrent requests can still show up in its samples.
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.threads: Set[int] = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def track(self) -> None:
+        self.threads.add(threading.get_ident())
+
+    def _run(self) -> None:
+        while True:
+            current = sys._current_frames()
+            for thread_id in list(self.threads):
+                frame = current.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        # Brendan Gregg's folded format, readable by flamegraph.pl and speedscope
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+def _is_admin(
+        headers: Headers
+        ) -> bool:
+    payload = bearer_payload(headers.get("authorization"))
+    return payload is not None and token_role(payload) == Role.ADMIN
+
+def _profile_path(
+        scope
+        ) -> str:
+    name = f"{time.time_ns()}-{scope['method']}{scope['path'].replace('/', '_')}.collapsed"
+    return os.path.join(settings.PROFILE_DIR, name)
+
+def _route_path(
+        scope
+        ) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # answered before routing ran (a cached response, a 304): find the route it would have hit
+    # the same way the router does, so those requests are labelled with their endpoint
+    app = scope.get("app")
+    partial = None
+    for candidate in getattr(getattr(app, "router", None), "routes", ()):
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return candidate.path
+        if match == Match.PARTIAL and partial is None:
+            partial = candidate
+    return partial.path if partial is not None else "unmatched"
+
+class InstrumentationMiddleware:
+    def __init__(self, app, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        headers = Headers(scope=scope)
+        profiler = profile_path = profiler_token = None
+        if headers.get("x-profile") and _is_admin(headers):
+            profiler = SamplingProfiler()
+            profile_path = _profile_path(scope)
+            profiler.track()
+            profiler_token = _profiler.set(profiler)
+            profiler.start()
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - start
+                response_headers = MutableHeaders(scope=message)
+                response_headers.append(
+                    "server-timing",
+                    f"app;dur={elapsed * 1000:.2f}, "
+                    f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.statements} queries, {stats.rows} rows"'
+                )
+                if profile_path is not None:
+                    response_headers.append("x-profile-file", profile_path)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            labels = (scope["method"], _route_path(scope), str(status))
+            self.metrics.record(labels, elapsed, stats)
+            if profiler is not None:
+                _profiler.reset(profiler_token)
+                profiler.stop()
+                os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+                with open(profile_path, "w") as f:
+                    f.write(profiler.collapsed())
+
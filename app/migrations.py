@@ -0,0 +1,99 @@
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from app import models
+from app.database import Base
+from app.rollups import rebuild_rollups
+from app.search import create_search_index, drop_search_index
+
+# kept out of Base.metadata so create_all never stamps a version on its own
+migration_metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def _create_indexes(
+        conn: Connection,
+        table
+        ) -> None:
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+def _composite_query_indexes(
+        conn: Connection
+        ) -> None:
+    _create_indexes(conn, models.Perfume.__table__)
+    _create_indexes(conn, models.Purchase.__table__)
+
+def _spending_rollups(
+        conn: Connection
+        ) -> None:
+    models.UserSpending.__table__.create(conn, checkfirst=True)
+    models.UserMonthlySpending.__table__.create(conn, checkfirst=True)
+    rebuild_rollups(conn)
+
+def _brand_trigram_index(
+        conn: Connection
+        ) -> None:
+    # ddl_if makes this a no-op outside PostgreSQL
+    models.brand_trigram_index.create(conn, checkfirst=True)
+
+def _revoked_sessions(
+        conn: Connection
+        ) -> None:
+    models.RevokedSession.__table__.create(conn, checkfirst=True)
+
+# append only: (version, description, upgrade). Upgrades must be idempotent
+# because a fresh database already has the current schema from create_all.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "composite indexes for list, filter and stats queries", _composite_query_indexes),
+    (2, "per-user and per-month spending rollups", _spending_rollups),
+    (3, "trigram index for brand search on PostgreSQL", _brand_trigram_index),
+    (4, "FTS5 index over perfume names and brands", create_search_index),
+    (5, "revoked sessions for refresh token logout", _revoked_sessions),
+]
+
+def current_version(
+        conn: Connection
+        ) -> int:
+    migration_metadata.create_all(bind=conn)
+    versions = conn.execute(select(schema_version.c.version)).scalars().all()
+    return max(versions, default=0)
+
+def run_migrations(
+        engine: Engine
+        ) -> List[int]:
+    applied = []
+    with engine.begin() as conn:
+        version = current_version(conn)
+        for number, description, upgrade in MIGRATIONS:
+            if number <= version:
+                continue
+            upgrade(conn)
+            conn.execute(insert(schema_version).values(
+                version=number,
+                description=description,
+                applied_at=datetime.now(timezone.utc)
+            ))
+            applied.append(number)
+    return applied
+
+def reset_schema(
+        engine: Engine
+        ) -> None:
+    # drops what create_all and the migrations made, including the version stamps, so the
+    # migrations really run again instead of being skipped as already applied
+    with engine.begin() as conn:
+        drop_search_index(conn)
+    Base.metadata.drop_all(bind=engine)
+    migration_metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
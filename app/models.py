@@ -1,7 +1,7 @@
 from typing import Optional
 from datetime import date
 from enum import Enum
-from sqlalchemy import Column, Integer, String, Float, Date, Boolean, ForeignKey, Enum as SQLEnum
+from sqlalchemy import DDL, Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Index, Enum as SQLEnum, event
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -50,6 +50,27 @@ class Perfume(Base):
     owner = relationship("User", back_populates="perfumes")
     purchases = relationship("Purchase", back_populates= "perfume", cascade="all, delete-orphan")
 
+    # every list query filters on user_id first; the trailing columns serve sort_by=name|brand
+    __table_args__ = (
+        Index("ix_perfumes_user_id_name", "user_id", "name"),
+        Index("ix_perfumes_user_id_brand_name", "user_id", "brand", "name"),
+    )
+
+# brand filters are substring ilike matches, which only a trigram index can serve;
+# SQLite has no equivalent so the index exists on PostgreSQL only
+brand_trigram_index = Index(
+    "ix_perfumes_brand_trgm",
+    Perfume.brand,
+    postgresql_using="gin",
+    postgresql_ops={"brand": "gin_trgm_ops"}
+).ddl_if(dialect="postgresql")
+
+event.listen(
+    brand_trigram_index,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
 class Purchase(Base):
     __tablename__ = "purchases"
 
@@ -62,4 +83,35 @@ class Purchase(Base):
     ml = Column(Integer, default=100)
 
     perfume = relationship("Perfume", back_populates="purchases")
-    user = relationship("User", back_populates="purchases")
\ No newline at end of file
+    user = relationship("User", back_populates="purchases")
+
+    __table_args__ = (
+        Index("ix_purchases_user_id_date", "user_id", "date"),
+        Index("ix_purchases_user_id_price", "user_id", "price"),
+        Index("ix_purchases_perfume_id", "perfume_id"),
+    )
+
+class UserSpending(Base):
+    __tablename__ = "user_spending"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_spent = Column(Float, nullable=False, default=0.0)
+    purchase_count = Column(Integer, nullable=False, default=0)
+
+class UserMonthlySpending(Base):
+    __tablename__ = "user_monthly_spending"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(Date, primary_key=True)
+    total_spent = Column(Float, nullable=False, default=0.0)
+    purchase_count = Column(Integer, nullable=False, default=0)
+
+class RevokedSession(Base):
+    __tablename__ = "revoked_sessions"
+
+    # the sid claim shared by a login's refresh token and every access token issued from it
+    sid = Column(String, primary_key=True)
+    user_id = Column(Integer, nullable=True, index=True)
+    revoked_at = Column(DateTime, nullable=False)
+    # past this no token of the session is valid anyway, so the row can be dropped
+    expires_at = Column(DateTime, nullable=False, index=True)
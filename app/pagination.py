@@ -0,0 +1,207 @@
+import base64
+import hashlib
+import hmac
+import json
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.auth import SECRET_KEY
+
+class InvalidCursor(ValueError):
+    pass
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _sign(payload: bytes) -> str:
+    return _b64encode(hmac.new(SECRET_KEY.encode(), payload, hashlib.sha256).digest())
+
+def encode_cursor(
+        data: dict
+        ) -> str:
+    payload = json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+    return f"{_b64encode(payload)}.{_sign(payload)}"
+
+def decode_cursor(
+        token: str
+        ) -> dict:
+    try:
+        encoded, signature = token.split(".", 1)
+        payload = _b64decode(encoded)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidCursor("Invalid cursor signature")
+
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(data, dict) or "id" not in data:
+        raise InvalidCursor("Malformed cursor")
+    return data
+
+def filters_digest(
+        filters: Optional[dict]
+        ) -> str:
+    # unset filters are left out so omitting a parameter and passing it empty agree
+    normalized = {key: value for key, value in (filters or {}).items() if value is not None and value != ""}
+    payload = json.dumps(normalized, separators=(",", ":"), sort_keys=True, default=str).encode()
+    return _b64encode(hashlib.sha256(payload).digest()[:12])
+
+def keyset_after(
+        id_column,
+        last_id: int,
+        order: str = "asc",
+        sort_column=None,
+        last_value: Optional[Any] = None
+        ):
+    # rows strictly after (last_value, last_id) in the (sort_column, id) ordering
+    if order == "asc":
+        id_after = id_column > last_id
+        if sort_column is None:
+            return id_after
+        return or_(sort_column > last_value, and_(sort_column == last_value, id_after))
+
+    id_after = id_column < last_id
+    if sort_column is None:
+        return id_after
+    return or_(sort_column < last_value, and_(sort_column == last_value, id_after))
+
+def count_statement(
+        stmt
+        ):
+    return select(func.count()).select_from(stmt.subquery())
+
+def count_total(
+        db: Session,
+        stmt
+        ) -> int:
+    return db.execute(count_statement(stmt)).scalar_one()
+
+def keyset_statement(
+        stmt,
+        id_column,
+        limit: int,
+        cursor: Optional[str] = None,
+        order: str = "asc",
+        sort_by: Optional[str] = None,
+        sort_column=None,
+        filters: Optional[dict] = None,
+        owner: Optional[int] = None
+        ) -> Tuple[Any, Optional[int]]:
+    cached_total = None
+    if cursor is not None:
+        data = decode_cursor(cursor)
+        if data.get("sort_by") != sort_by or data.get("order") != order:
+            raise InvalidCursor("Cursor does not match the requested sort order")
+        # its position and cached total belong to the result set it was issued for
+        if data.get("filters") != filters_digest(filters):
+            raise InvalidCursor("Cursor does not match the requested filters")
+        if data.get("owner") != owner:
+            raise InvalidCursor("Cursor was issued for another user")
+        cached_total = data.get("total")
+        stmt = stmt.where(keyset_after(id_column, data["id"], order, sort_column, data.get("value")))
+
+    if sort_column is not None:
+        stmt = stmt.order_by(*(
+            (sort_column.asc(), id_column.asc()) if order == "asc"
+            else (sort_column.desc(), id_column.desc())
+        ))
+    else:
+        stmt = stmt.order_by(id_column.asc() if order == "asc" else id_column.desc())
+
+    # one extra row tells us whether another page exists without a COUNT
+    return stmt.limit(limit + 1), cached_total
+
+def keyset_page(
+        rows: Sequence[Any],
+        id_column,
+        limit: int,
+        total: Optional[int] = None,
+        order: str = "asc",
+        sort_by: Optional[str] = None,
+        sort_column=None,
+        filters: Optional[dict] = None,
+        owner: Optional[int] = None
+        ) -> dict:
+    items = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_data = {
+            "id": getattr(last, id_column.key),
+            "sort_by": sort_by,
+            "order": order,
+            "filters": filters_digest(filters),
+            "owner": owner
+        }
+        if sort_column is not None:
+            next_data["value"] = getattr(last, sort_column.key)
+        if total is not None:
+            next_data["total"] = total
+        next_cursor = encode_cursor(next_data)
+
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": 0,
+        "items": items,
+        "next_cursor": next_cursor
+    }
+
+def paginate_keyset(
+        db: Session,
+        stmt,
+        id_column,
+        limit: int,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        order: str = "asc",
+        sort_by: Optional[str] = None,
+        sort_column=None,
+        as_rows: bool = False,
+        filters: Optional[dict] = None,
+        owner: Optional[int] = None
+        ) -> dict:
+    page_stmt, total = keyset_statement(stmt, id_column, limit, cursor, order, sort_by, sort_column, filters, owner)
+    if not include_total:
+        total = None
+    elif cursor is None:
+        total = count_total(db, stmt)
+
+    result = db.execute(page_stmt)
+    rows = result.all() if as_rows else result.scalars().all()
+    return keyset_page(rows, id_column, limit, total, order, sort_by, sort_column, filters, owner)
+
+async def paginate_keyset_async(
+        db: AsyncSession,
+        stmt,
+        id_column,
+        limit: int,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        order: str = "asc",
+        sort_by: Optional[str] = None,
+        sort_column=None,
+        as_rows: bool = False,
+        filters: Optional[dict] = None,
+        owner: Optional[int] = None
+        ) -> dict:
+    page_stmt, total = keyset_statement(stmt, id_column, limit, cursor, order, sort_by, sort_column, filters, owner)
+    if not include_total:
+        total = None
+    elif cursor is None:
+        total = (await db.execute(count_statement(stmt))).scalar_one()
+
+    result = await db.execute(page_stmt)
+    rows = result.all() if as_rows else result.scalars().all()
+    return keyset_page(rows, id_column, limit, total, order, sort_by, sort_column, filters, owner)
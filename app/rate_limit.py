@@ -0,0 +1,173 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict
+
+from fastapi import HTTPException, Request, status
+
+from app.auth import bearer_payload
+from app.config import settings
+from app.shared_cache import CLIENT_ERRORS, RedisBackend, cache_backend
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+@dataclass(frozen=True)
+class Rate:
+    count: int
+    period: float
+
+    @property
+    def interval(self) -> float:
+        return self.period / self.count
+
+@lru_cache(maxsize=None)
+def parse_rate(
+        spec: str
+        ) -> Rate:
+    # "30/minute": bursts of up to 30, refilled at one every two seconds
+    count, _, period = spec.partition("/")
+    if period not in PERIODS or int(count) < 1:
+        raise ValueError(f"Invalid rate {spec!r}, expected e.g. 30/minute")
+    return Rate(int(count), PERIODS[period])
+
+# Token buckets are kept as GCRA: a single "theoretical arrival time" per key instead of
+# a token count and a refill timestamp. A request is allowed when it arrives no earlier
+# than tat - (count - 1) * interval, and admitting it pushes tat one interval further.
+
+class MemoryRateStore:
+    def __init__(self, maxsize: int = 100_000):
+        # least recently seen keys are dropped first; an evicted key just starts with a full bucket
+        self.maxsize = maxsize
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(
+            self,
+            key: str,
+            rate: Rate,
+            now: float
+            ) -> float:
+        # seconds until the request would be allowed, 0 when it is admitted
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            allow_at = tat - (rate.count - 1) * rate.interval
+            if now < allow_at:
+                return allow_at - now
+            self._tats[key] = tat + rate.interval
+            self._tats.move_to_end(key)
+            if len(self._tats) > self.maxsize:
+                self._tats.popitem(last=False)
+            return 0.0
+
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local allow_at = tat - (count - 1) * interval
+if now < allow_at then
+    return tostring(allow_at - now)
+end
+redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', math.ceil((tat + interval - now) * 1000))
+return '0'
+"""
+
+class RedisRateStore:
+    # the same algorithm run atomically inside redis, so every worker draws from one bucket
+    def __init__(self, backend: RedisBackend):
+        self.prefix = backend.prefix + "rate:"
+        self._script = backend.client.register_script(GCRA_SCRIPT)
+
+    def take(
+            self,
+            key: str,
+            rate: Rate,
+            now: float
+            ) -> float:
+        try:
+            return float(self._script(keys=[self.prefix + key], args=[now, rate.interval, rate.count]))
+        except CLIENT_ERRORS:
+            # the limiter must not take the API down with it: fail open
+            return 0.0
+
+def create_rate_store():
+    if isinstance(cache_backend, RedisBackend):
+        return RedisRateStore(cache_backend)
+    return MemoryRateStore()
+
+class ConcurrencyLimiter:
+    # in-flight requests are a property of this process, so this one is never shared
+    def __init__(self):
+        self.in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(
+            self,
+            group: str,
+            limit: int
+            ) -> bool:
+        with self._lock:
+            current = self.in_flight.get(group, 0)
+            if current >= limit:
+                return False
+            self.in_flight[group] = current + 1
+            return True
+
+    def release(
+            self,
+            group: str
+            ) -> None:
+        with self._lock:
+            self.in_flight[group] -= 1
+
+rate_store = create_rate_store()
+concurrency = ConcurrencyLimiter()
+
+def client_key(
+        request: Request
+        ) -> str:
+    # signed-in callers get their own bucket wherever they connect from; everyone else is an IP
+    payload = bearer_payload(request.headers.get("authorization"))
+    if payload is not None and "uid" in payload:
+        return f"user:{payload['uid']}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def limit(
+        group: str
+        ):
+    # router-level dependency: a token bucket per caller, then a cap on the group's in-flight
+    # requests. Both answer straight away instead of queueing behind the expensive work.
+    async def check_limits(request: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            yield
+            return
+
+        spec = settings.RATE_LIMITS.get(group)
+        if spec:
+            wait = rate_store.take(f"{group}:{client_key(request)}", parse_rate(spec), time.time())
+            if wait:
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Rate limit exceeded",
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+
+        max_in_flight = settings.CONCURRENCY_LIMITS.get(group)
+        if max_in_flight is None:
+            yield
+            return
+        if not concurrency.acquire(group, max_in_flight):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again shortly",
+                headers={"Retry-After": str(settings.CONCURRENCY_RETRY_AFTER_SECONDS)},
+            )
+        try:
+            yield
+        finally:
+            concurrency.release(group)
+
+    return check_limits
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import delete, event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models import RevokedSession, User
+
+logger = logging.getLogger(__name__)
+
+def utcnow() -> datetime:
+    # naive UTC, the way the DateTime columns store it
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class TokenDenylist:
+    # revoked sessions and deactivated users, held in memory so checking a token costs a set
+    # lookup instead of a query; revoked_sessions and users.is_active are the source of truth
+    def __init__(self):
+        self.sessions: Dict[str, datetime] = {}
+        self.users: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def session_revoked(
+            self,
+            sid: Optional[str]
+            ) -> bool:
+        return sid in self.sessions
+
+    def user_revoked(
+            self,
+            user_id: Optional[int]
+            ) -> bool:
+        return user_id in self.users
+
+    def revoke_session(
+            self,
+            sid: str,
+            expires_at: datetime
+            ) -> None:
+        with self._lock:
+            self.sessions[sid] = expires_at
+
+    def set_user_active(
+            self,
+            user_id: int,
+            active: bool
+            ) -> None:
+        with self._lock:
+            if active:
+                self.users.discard(user_id)
+            else:
+                self.users.add(user_id)
+
+    def load(
+            self,
+            db: Session
+            ) -> None:
+        now = utcnow()
+        db.execute(delete(RevokedSession).where(RevokedSession.expires_at <= now))
+        sessions = dict(db.execute(select(RevokedSession.sid, RevokedSession.expires_at)).all())
+        users = set(db.execute(select(User.id).where(User.is_active == False)).scalars())
+        db.commit()
+        with self._lock:
+            # a session revoked here after the query started must not be dropped by this reload
+            for sid, expires_at in self.sessions.items():
+                if expires_at > now:
+                    sessions.setdefault(sid, expires_at)
+            self.sessions = sessions
+            self.users = users
+
+    def stats(self) -> dict:
+        return {"sessions": len(self.sessions), "users": len(self.users)}
+
+token_denylist = TokenDenylist()
+
+@event.listens_for(Session, "after_flush")
+def _collect_revocations(session: Session, flush_context) -> None:
+    sessions = {obj.sid: obj.expires_at for obj in session.new if isinstance(obj, RevokedSession)}
+    users = {
+        obj.id: obj.is_active is not False
+        for obj in session.new | session.dirty
+        if isinstance(obj, User) and obj.id is not None and inspect(obj).attrs.is_active.history.has_changes()
+    }
+    users.update((obj.id, True) for obj in session.deleted if isinstance(obj, User) and obj.id is not None)
+    if sessions or users:
+        pending = session.info.setdefault("token_denylist", {"sessions": {}, "users": {}})
+        pending["sessions"].update(sessions)
+        pending["users"].update(users)
+
+@event.listens_for(Session, "after_commit")
+def _apply_revocations(session: Session) -> None:
+    pending = session.info.pop("token_denylist", None)
+    if pending:
+        for sid, expires_at in pending["sessions"].items():
+            token_denylist.revoke_session(sid, expires_at)
+        for user_id, active in pending["users"].items():
+            token_denylist.set_user_active(user_id, active)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_revocations(session: Session, previous_transaction) -> None:
+    session.info.pop("token_denylist", None)
+
+def load_denylist(
+        session_factory: Callable[[], Session]
+        ) -> None:
+    db = session_factory()
+    try:
+        token_denylist.load(db)
+    finally:
+        db.close()
+
+async def run_denylist_refresher(
+        session_factory: Callable[[], Session],
+        interval: float
+        ) -> None:
+    # re-reading the tables is how revocations made by other workers arrive, and how expired
+    # sessions leave memory
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(load_denylist, session_factory)
+        except Exception:
+            logger.exception("Token denylist refresh failed")
@@ -0,0 +1,202 @@
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.models import Purchase, UserMonthlySpending, UserSpending
+
+# per-user and per-user-per-month spending totals, kept in step with purchases
+# by create_purchase/delete_purchase in the same transaction
+
+def month_start(
+        day: date
+        ) -> date:
+    return day.replace(day=1)
+
+def next_month(
+        month: date
+        ) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _upsert(
+        dialect_name: str,
+        model,
+        values: dict,
+        index_elements: List[str],
+        price_delta: float,
+        count_delta: int
+        ):
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(model).values(**values)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={
+            "total_spent": model.total_spent + price_delta,
+            "purchase_count": model.purchase_count + count_delta,
+        }
+    )
+
+def spending_deltas(
+        purchases: Iterable[Tuple[date, float]],
+        sign: int = 1
+        ) -> Dict[date, Tuple[float, int]]:
+    deltas: Dict[date, Tuple[float, int]] = {}
+    for purchase_date, price in purchases:
+        month = month_start(purchase_date)
+        total, count = deltas.get(month, (0.0, 0))
+        deltas[month] = (total + price * sign, count + sign)
+    return deltas
+
+def rollup_statements(
+        dialect_name: str,
+        user_id: int,
+        deltas: Dict[date, Tuple[float, int]]
+        ) -> list:
+    price_delta = sum(total for total, _ in deltas.values())
+    count_delta = sum(count for _, count in deltas.values())
+    values = {"user_id": user_id, "total_spent": price_delta, "purchase_count": count_delta}
+    statements = [_upsert(dialect_name, UserSpending, values, ["user_id"], price_delta, count_delta)]
+    for month, (month_price, month_count) in deltas.items():
+        statements.append(_upsert(
+            dialect_name,
+            UserMonthlySpending,
+            {"user_id": user_id, "month": month, "total_spent": month_price, "purchase_count": month_count},
+            ["user_id", "month"],
+            month_price,
+            month_count
+        ))
+    return statements
+
+def record_purchases(
+        db,
+        user_id: int,
+        purchases: Iterable[Tuple[date, float]],
+        sign: int = 1
+        ) -> None:
+    deltas = spending_deltas(purchases, sign)
+    if not deltas:
+        return
+    for stmt in rollup_statements(db.get_bind().dialect.name, user_id, deltas):
+        db.execute(stmt)
+
+def record_purchase(
+        db,
+        user_id: int,
+        purchase_date: date,
+        price: float,
+        sign: int = 1
+        ) -> None:
+    record_purchases(db, user_id, [(purchase_date, price)], sign)
+
+async def record_purchase_async(
+        db,
+        user_id: int,
+        purchase_date: date,
+        price: float,
+        sign: int = 1
+        ) -> None:
+    deltas = spending_deltas([(purchase_date, price)], sign)
+    for stmt in rollup_statements(db.get_bind().dialect.name, user_id, deltas):
+        await db.execute(stmt)
+
+def _raw_spending(
+        user_id: int,
+        start_date: Optional[date],
+        end_date: Optional[date]
+        ):
+    stmt = select(
+        func.coalesce(func.sum(Purchase.price), 0.0).label("total_spent"),
+        func.count(Purchase.id).label("purchase_count")
+        ).where(Purchase.user_id == user_id)
+    if start_date:
+        stmt = stmt.where(Purchase.date >= start_date)
+    if end_date:
+        stmt = stmt.where(Purchase.date <= end_date)
+    return stmt
+
+def spending_statements(
+        user_id: int,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+        ) -> list:
+    # each statement yields one (total_spent, purchase_count) row; their sum is the answer
+    if start_date is None and end_date is None:
+        return [select(
+            func.coalesce(func.sum(UserSpending.total_spent), 0.0).label("total_spent"),
+            func.coalesce(func.sum(UserSpending.purchase_count), 0).label("purchase_count")
+            ).where(UserSpending.user_id == user_id)]
+
+    # whole months inside the range come from the monthly buckets ...
+    first_full = None
+    if start_date is not None:
+        first_full = start_date if start_date.day == 1 else next_month(month_start(start_date))
+    last_full = None
+    if end_date is not None:
+        end_month = month_start(end_date)
+        last_full = end_month if next_month(end_month) - timedelta(days=1) == end_date else \
+            month_start(end_month - timedelta(days=1))
+
+    if first_full is not None and last_full is not None and first_full > last_full:
+        return [_raw_spending(user_id, start_date, end_date)]
+
+    monthly = select(
+        func.coalesce(func.sum(UserMonthlySpending.total_spent), 0.0).label("total_spent"),
+        func.coalesce(func.sum(UserMonthlySpending.purchase_count), 0).label("purchase_count")
+        ).where(UserMonthlySpending.user_id == user_id)
+    if first_full is not None:
+        monthly = monthly.where(UserMonthlySpending.month >= first_full)
+    if last_full is not None:
+        monthly = monthly.where(UserMonthlySpending.month <= last_full)
+    statements = [monthly]
+
+    # ... and the partial edge months from the purchases themselves
+    if start_date is not None and first_full != start_date:
+        statements.append(_raw_spending(user_id, start_date, first_full - timedelta(days=1)))
+    if end_date is not None and last_full is not None and next_month(last_full) <= end_date:
+        statements.append(_raw_spending(user_id, next_month(last_full), end_date))
+    return statements
+
+def combine_spending(
+        rows: Iterable
+        ) -> dict:
+    total_spent = 0.0
+    purchase_count = 0
+    for row in rows:
+        total_spent += row.total_spent or 0.0
+        purchase_count += row.purchase_count or 0
+    return {"total_spent": total_spent, "purchase_count": purchase_count}
+
+def month_start_expr(
+        dialect_name: str
+        ):
+    if dialect_name == "postgresql":
+        return func.date_trunc("month", Purchase.date).cast(UserMonthlySpending.month.type)
+    return func.date(Purchase.date, "start of month")
+
+def rebuild_rollups(
+        conn
+        ) -> None:
+    dialect_name = conn.get_bind().dialect.name if hasattr(conn, "get_bind") else conn.dialect.name
+    conn.execute(delete(UserMonthlySpending))
+    conn.execute(delete(UserSpending))
+
+    conn.execute(insert(UserSpending).from_select(
+        ["user_id", "total_spent", "purchase_count"],
+        select(Purchase.user_id, func.sum(Purchase.price), func.count(Purchase.id)).
+            group_by(Purchase.user_id)
+    ))
+
+    month = month_start_expr(dialect_name)
+    conn.execute(insert(UserMonthlySpending).from_select(
+        ["user_id", "month", "total_spent", "purchase_count"],
+        select(Purchase.user_id, month, func.sum(Purchase.price), func.count(Purchase.id)).
+            group_by(Purchase.user_id, month)
+    ))
+
+if __name__ == "__main__":
+    from app.database import engine
+
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+    print("Spending rollups rebuilt")
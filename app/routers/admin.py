@@ -1,85 +1,235 @@
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import case, desc, event, func, select
 
-from app.database import get_db
+from app.database import get_read_db
 from app.models import User, Perfume, Purchase, Role
+from app.pagination import count_statement
 from app.schemas import (
-    PerfumeRead,
-    UserRead,
+    CacheStats,
+    PaginatedResponse,
+    PerfumeReadAdmin,
+    PurchaseReadAdmin,
     TopUsersResponse,
-    AdminDashboard,
-    UserPerfumeCount,
-    UserTotalSpent,
-    MostExpensivePurchase
+    AdminDashboard
 )
-from app.auth import get_current_admin_user
+from app.analytics import frame_cache
+from app.auth import get_current_admin_user, token_cache, user_cache
+from app.config import settings
+from app.leaderboards import MAX_LIMIT, leaderboards
+from app.snapshots import Snapshot
+from app.rate_limit import limit
+from app.shared_cache import SharedVersions
 
-router = APIRouter(prefix="/admin", tags=["Admin"])
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(limit("admin"))])
 
-@router.get("/stats/dashboard", response_model=AdminDashboard)
-def get_admin_dashboard(
-    db: Session = Depends(get_db),
-    admin: User = Depends(get_current_admin_user)
-    ):
-    total_users: int = db.query(func.count(User.id)).filter(User.role != Role.ADMIN).scalar()
-    total_perfumes: int = db.query(func.count(Perfume.id)).scalar()
-    total_purchases: int = db.query(func.count(Purchase.id)).scalar()
-    total_amount: float = db.query(func.coalesce(func.sum(Purchase.price), 0.0)).scalar()
-    active_users: int = db.query(func.count(User.id)).filter(User.is_active == True).filter(User.role != Role.ADMIN).scalar()
+# one aggregate pass per table
+DASHBOARD_QUERIES = [
+    select(
+        func.count(case((User.role != Role.ADMIN, User.id))).label("total_users"),
+        func.count(case(((User.role != Role.ADMIN) & (User.is_active == True), User.id))).label("active_users")
+    ),
+    select(func.count(Perfume.id).label("total_perfumes")),
+    select(
+        func.count(Purchase.id).label("total_purchases"),
+        func.coalesce(func.sum(Purchase.price), 0.0).label("total_amount")
+    ),
+]
 
+def dashboard_result(
+        totals: dict,
+        computed_at: datetime
+        ) -> AdminDashboard:
+    total_amount = totals["total_amount"]
     return AdminDashboard(
-        total_users=total_users or 0,
-        total_perfumes=total_perfumes or 0,
-        total_purchases=total_purchases or 0,
+        total_users=totals["total_users"] or 0,
+        total_perfumes=totals["total_perfumes"] or 0,
+        total_purchases=totals["total_purchases"] or 0,
         total_amount=round(total_amount, 2) if total_amount else 0.0,
-        active_users=active_users or 0
+        active_users=totals["active_users"] or 0,
+        computed_at=computed_at
     )
 
-@router.get("/stats/top-users", response_model=TopUsersResponse)
-def get_top_users(
-    limit: int = Query(3, ge=1, le=10, description="Number of top users to return"),
-    db: Session = Depends(get_db),
-    admin: User = Depends(get_current_admin_user)
-    ):
-    most_perfumes_counts = db.query(User, func.count(Perfume.id).label("perfume_count")).\
+def compute_dashboard(
+        db: Session,
+        computed_at: datetime
+        ) -> AdminDashboard:
+    totals = {}
+    for stmt in DASHBOARD_QUERIES:
+        totals.update(db.execute(stmt).one()._mapping)
+    return dashboard_result(totals, computed_at)
+
+dashboard_snapshot = Snapshot(
+    compute_dashboard,
+    max_age=settings.DASHBOARD_REFRESH_SECONDS,
+    write_threshold=settings.DASHBOARD_WRITE_THRESHOLD,
+    shared_writes=SharedVersions("dashboard_writes")
+)
+
+@event.listens_for(Session, "after_flush")
+def _collect_dashboard_writes(session: Session, flush_context) -> None:
+    count = sum(1 for obj in session.new if isinstance(obj, (User, Perfume, Purchase)))
+    count += sum(1 for obj in session.deleted if isinstance(obj, (Perfume, Purchase)))
+    count += sum(1 for obj in session.dirty if isinstance(obj, User) and session.is_modified(obj))
+    if count:
+        session.info["dashboard_writes"] = session.info.get("dashboard_writes", 0) + count
+
+@event.listens_for(Session, "after_commit")
+def _count_dashboard_writes(session: Session) -> None:
+    # once per commit, so a shared backend sees one bump per transaction rather than per row
+    count = session.info.pop("dashboard_writes", 0)
+    if count:
+        dashboard_snapshot.record_write(count)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_dashboard_writes(session: Session, previous_transaction) -> None:
+    session.info.pop("dashboard_writes", None)
+
+def most_perfumes_query(
+        limit: int
+        ):
+    return select(User, func.count(Perfume.id).label("perfume_count")).\
         join(Perfume, User.id == Perfume.user_id).\
         group_by(User.id).\
         order_by(desc("perfume_count")).\
-        limit(limit).all()
-    
-    most_expensive_perfume = db.query(Purchase, Perfume, User).\
+        limit(limit)
+
+def most_expensive_purchase_query(
+        limit: int
+        ):
+    return select(Purchase, Perfume, User).\
         join(Perfume, Purchase.perfume_id == Perfume.id).\
         join(User, Purchase.user_id == User.id).\
         order_by(desc(Purchase.price)).\
-        limit(limit).all()
+        limit(limit)
 
-    most_expensive_collection = db.query(User, func.sum(Purchase.price).label("total_spent")).\
+def most_expensive_collection_query(
+        limit: int
+        ):
+    return select(User, func.sum(Purchase.price).label("total_spent")).\
         join(Purchase, User.id == Purchase.user_id).\
         group_by(User.id).\
         order_by(desc("total_spent")).\
-        limit(limit).all()
-
-    return TopUsersResponse(
-        most_perfumes=[
-            UserPerfumeCount(
-                perfume_count=int(item[1]),
-                user=UserRead.model_validate(item[0])
-            ) for item in most_perfumes_counts
-        ] if most_perfumes_counts else None,
-        
-        most_expensive_purchase=[
-            MostExpensivePurchase(
-                price=item[0].price,
-                perfume=PerfumeRead.model_validate(item[1]),
-                user=UserRead.model_validate(item[2])
-            ) for item in most_expensive_perfume
-        ] if most_expensive_perfume else None,
-
-        most_expensive_collection=[
-            UserTotalSpent(
-                total_spent=item[1],
-                user=UserRead.model_validate(item[0])
-            ) for item in most_expensive_collection
-        ] if most_expensive_collection else None
-    )
\ No newline at end of file
+        limit(limit)
+
+# relationships serialized by PerfumeReadAdmin / PurchaseReadAdmin, loaded in the page SELECT
+ADMIN_PERFUME_LOADERS = (joinedload(Perfume.owner),)
+ADMIN_PURCHASE_LOADERS = (joinedload(Purchase.user), joinedload(Purchase.perfume))
+
+def admin_perfumes_query(
+        user_id: Optional[int] = None
+        ):
+    stmt = select(Perfume)
+    if user_id is not None:
+        stmt = stmt.where(Perfume.user_id == user_id)
+    return stmt
+
+def admin_purchases_query(
+        user_id: Optional[int] = None
+        ):
+    stmt = select(Purchase)
+    if user_id is not None:
+        stmt = stmt.where(Purchase.user_id == user_id)
+    return stmt
+
+def leaderboard_problems(
+        db: Session,
+        limit: int = MAX_LIMIT
+        ) -> List[str]:
+    # compares the in-memory leaderboards with the equivalent SQL
+    leaderboards.ensure_seeded(db)
+    cached = leaderboards.top_users(limit)
+    problems = []
+
+    expected = [int(count) for _, count in db.execute(most_perfumes_query(limit)).all()]
+    actual = [item.perfume_count for item in cached.most_perfumes or []]
+    if expected != actual:
+        problems.append(f"most_perfumes: expected {expected}, got {actual}")
+
+    expected = [purchase.price for purchase, _, _ in db.execute(most_expensive_purchase_query(limit)).all()]
+    actual = [item.price for item in cached.most_expensive_purchase or []]
+    if expected != actual:
+        problems.append(f"most_expensive_purchase: expected {expected}, got {actual}")
+
+    expected = [round(total, 2) for _, total in db.execute(most_expensive_collection_query(limit)).all()]
+    actual = [round(item.total_spent, 2) for item in cached.most_expensive_collection or []]
+    if expected != actual:
+        problems.append(f"most_expensive_collection: expected {expected}, got {actual}")
+    return problems
+
+@router.get("/stats/dashboard", response_model=AdminDashboard)
+def get_admin_dashboard(
+    fresh: bool = Query(False, description="Recompute instead of serving the cached snapshot"),
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(get_current_admin_user)
+    ):
+    if fresh:
+        return dashboard_snapshot.refresh(db)
+    return dashboard_snapshot.get(db)
+
+@router.get("/stats/top-users", response_model=TopUsersResponse)
+def get_top_users(
+    limit: int = Query(3, ge=1, le=MAX_LIMIT, description="Number of top users to return"),
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(get_current_admin_user)
+    ):
+    leaderboards.ensure_seeded(db)
+    return leaderboards.top_users(limit)
+
+def cache_stats(
+        request: Request
+        ) -> dict:
+    stats = {"users": user_cache.stats(), "tokens": token_cache.stats(), "analytics": frame_cache.stats()}
+    response_cache = getattr(request.app.state, "response_cache", None)
+    if response_cache is not None:
+        stats["responses"] = response_cache.stats()
+    return stats
+
+@router.get("/stats/cache", response_model=Dict[str, CacheStats])
+def get_cache_stats(
+    request: Request,
+    admin: User = Depends(get_current_admin_user)
+    ):
+    return cache_stats(request)
+
+@router.get("/perfumes", response_model=PaginatedResponse[PerfumeReadAdmin])
+def list_all_perfumes(
+    user_id: Optional[int] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(get_current_admin_user)
+    ):
+    stmt = admin_perfumes_query(user_id)
+    total = db.execute(count_statement(stmt)).scalar_one()
+    page = stmt.options(*ADMIN_PERFUME_LOADERS).order_by(Perfume.id).offset(offset).limit(limit)
+    items = db.execute(page).scalars().all()
+
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "items": items
+    }
+
+@router.get("/purchases", response_model=PaginatedResponse[PurchaseReadAdmin])
+def list_all_purchases(
+    user_id: Optional[int] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(get_current_admin_user)
+    ):
+    stmt = admin_purchases_query(user_id)
+    total = db.execute(count_statement(stmt)).scalar_one()
+    page = stmt.options(*ADMIN_PURCHASE_LOADERS).order_by(Purchase.id).offset(offset).limit(limit)
+    items = db.execute(page).scalars().all()
+
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "items": items
+    }
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database import get_async_read_db, get_read_db
+from app.models import Perfume, Purchase, User
+from app.schemas import (
+    CacheStats,
+    PaginatedResponse,
+    PerfumeReadAdmin,
+    PurchaseReadAdmin,
+    TopUsersResponse,
+    AdminDashboard
+)
+from app.auth import get_current_admin_user_async
+from app.leaderboards import MAX_LIMIT, leaderboards
+from app.pagination import count_statement
+from app.routers.admin import (
+    ADMIN_PERFUME_LOADERS,
+    ADMIN_PURCHASE_LOADERS,
+    admin_perfumes_query,
+    admin_purchases_query,
+    cache_stats,
+    dashboard_snapshot
+)
+from app.rate_limit import limit
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(limit("admin"))])
+
+# the snapshot and the leaderboards are shared with the background refresher and the writer
+# threads behind threading locks; waiting on one inside run_sync would stall the event loop,
+# so both are computed on a worker thread through a sync read session
+
+@router.get("/stats/dashboard", response_model=AdminDashboard)
+async def get_admin_dashboard(
+    fresh: bool = Query(False, description="Recompute instead of serving the cached snapshot"),
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(get_current_admin_user_async)
+    ):
+    if fresh:
+        return await asyncio.to_thread(dashboard_snapshot.refresh, db)
+    return await asyncio.to_thread(dashboard_snapshot.get, db)
+
+@router.get("/stats/top-users", response_model=TopUsersResponse)
+async def get_top_users(
+    limit: int = Query(3, ge=1, le=MAX_LIMIT, description="Number of top users to return"),
+    db: Session = Depends(get_read_db),
+    admin: User = Depends(get_current_admin_user_async)
+    ):
+    await asyncio.to_thread(leaderboards.ensure_seeded, db)
+    return leaderboards.top_users(limit)
+
+@router.get("/stats/cache", response_model=Dict[str, CacheStats])
+async def get_cache_stats(
+    request: Request,
+    admin: User = Depends(get_current_admin_user_async)
+    ):
+    return cache_stats(request)
+
+@router.get("/perfumes", response_model=PaginatedResponse[PerfumeReadAdmin])
+async def list_all_perfumes(
+    user_id: Optional[int] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_read_db),
+    admin: User = Depends(get_current_admin_user_async)
+    ):
+    stmt = admin_perfumes_query(user_id)
+    total = (await db.execute(count_statement(stmt))).scalar_one()
+    page = stmt.options(*ADMIN_PERFUME_LOADERS).order_by(Perfume.id).offset(offset).limit(limit)
+    items = (await db.execute(page)).scalars().all()
+
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "items": items
+    }
+
+@router.get("/purchases", response_model=PaginatedResponse[PurchaseReadAdmin])
+async def list_all_purchases(
+    user_id: Optional[int] = Query(None),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_async_read_db),
+    admin: User = Depends(get_current_admin_user_async)
+    ):
+    stmt = admin_purchases_query(user_id)
+    total = (await db.execute(count_statement(stmt))).scalar_one()
+    page = stmt.options(*ADMIN_PURCHASE_LOADERS).order_by(Purchase.id).offset(offset).limit(limit)
+    items = (await db.execute(page)).scalars().all()
+
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "items": items
+    }
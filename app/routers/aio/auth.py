@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_db
+from app.models import User
+from app.schemas import RefreshRequest, UserCreate, UserRead, Token
+from app.auth import (
+    decode_refresh_token,
+    get_current_user_async,
+    get_password_hash_async,
+    get_token_payload,
+    verify_and_update_password_async
+)
+from app.routers.auth import (
+    invalid_login_exception,
+    invalid_refresh_exception,
+    refreshed_user,
+    retired_refresh_token,
+    revoked_session,
+    token_response
+)
+from app.rate_limit import limit
+
+router = APIRouter(prefix="/auth", tags=["Authentication"], dependencies=[Depends(limit("auth"))])
+
+@router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
+async def register_user(
+    user_in: UserCreate,
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    existing_user = (await db.execute(select(User).where(User.username == user_in.username))).scalars().first()
+    if existing_user:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already registered")
+
+    existing_email = (await db.execute(select(User).where(User.email == user_in.email))).scalars().first()
+    if existing_email:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
+
+    hashed_password = await get_password_hash_async(user_in.password)
+    user = User(
+        username=user_in.username,
+        email=user_in.email,
+        hashed_password=hashed_password,
+        is_active=True)
+
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+@router.post("/login", response_model=Token)
+async def login_user(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    user = (await db.execute(select(User).where(User.username == form_data.username))).scalars().first()
+
+    if not user:
+        raise invalid_login_exception()
+
+    valid, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+    if not valid:
+        raise invalid_login_exception()
+
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+
+    return token_response(user)
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    body: RefreshRequest,
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    try:
+        payload = decode_refresh_token(body.refresh_token)
+    except HTTPException:
+        raise invalid_refresh_exception()
+    user = refreshed_user(await db.get(User, payload["uid"]), payload)
+    retired, sid = retired_refresh_token(payload)
+    db.add(retired)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise invalid_refresh_exception()
+    return token_response(user, sid)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    revoked = revoked_session(payload)
+    if revoked is not None:
+        await db.merge(revoked)
+        await db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.get("/me", response_model=UserRead)
+async def read_users_me(
+    current_user: User = Depends(get_current_user_async)
+    ):
+    return current_user
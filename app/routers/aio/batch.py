@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.auth import get_current_active_user_async
+from app.batch import run_batch
+from app.database import get_async_db
+from app.models import User
+from app.routers.batch import BATCH_RESPONSES
+from app.schemas import BatchRequest, BatchResult
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+@router.post("", response_model=BatchResult, responses=BATCH_RESPONSES)
+async def apply_batch(
+    batch: BatchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    return {"results": await db.run_sync(run_batch, current_user.id, batch.operations)}
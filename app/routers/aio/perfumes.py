@@ -0,0 +1,156 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional
+
+from app.auth import get_current_active_user_async
+from app.bulk import BULK_OPENAPI, import_perfume_chunk, request_format, run_import
+from app.config import settings
+from app.export import export_response_async, perfume_export_query
+from app.fast_json import page_response
+from app.database import get_async_db, get_async_read_db
+from app.pagination import InvalidCursor, count_statement, paginate_keyset_async
+from app.models import Perfume, Purchase, User
+from app.search import search_perfumes
+from app.schemas import BulkImportResult, PerfumeCreate, PerfumeRead, PurchaseRead, PaginatedResponse
+from app.routers.perfumes import (
+    PERFUME_READ_COLUMNS,
+    check_perfume_owner,
+    check_search_pagination,
+    perfumes_query,
+    resolve_sort_column
+)
+
+router = APIRouter(prefix="/perfumes", tags=["Perfumes"])
+
+@router.post("", response_model=PerfumeRead, status_code=status.HTTP_201_CREATED)
+async def create_perfume(
+    perfume_in: PerfumeCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    perfume = Perfume(
+        name = perfume_in.name,
+        brand = perfume_in.brand,
+        concentration = perfume_in.concentration,
+        season = perfume_in.season,
+        available = perfume_in.available,
+        user_id = current_user.id
+    )
+
+    db.add(perfume)
+    await db.commit()
+    await db.refresh(perfume)
+    return perfume
+
+@router.post("/bulk", response_model=BulkImportResult, openapi_extra=BULK_OPENAPI)
+async def bulk_import_perfumes(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults to the Content-Type"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    return await run_import(
+        request,
+        request_format(request, format),
+        PerfumeCreate,
+        lambda items, report: db.run_sync(import_perfume_chunk, current_user.id, items, report)
+    )
+
+@router.get("", response_model=PaginatedResponse[PerfumeRead])
+async def list_perfumes(
+    available: Optional[bool] = Query(None),
+    concentration: Optional[str] = Query(None),
+    season: Optional[str] = Query(None),
+    brand: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description="Search name and brand; matches prefixes and tolerates typos"),
+    sort_by: Optional[str] = Query(None, description="Sort by: name, brand"),
+    order: Literal["asc", "desc"] = Query("asc"),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    pagination: Literal["offset", "cursor"] = Query("offset", description="Use cursor for keyset pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, implies cursor pagination"),
+    include_total: bool = Query(True, description="Skip the COUNT query when false"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+
+    stmt = perfumes_query(current_user.id, available, concentration, season, brand)
+    column = resolve_sort_column(sort_by)
+    check_search_pagination(q, sort_by, cursor is not None or pagination == "cursor")
+    rank = None
+    if q:
+        stmt, rank = await db.run_sync(search_perfumes, stmt, current_user.id, q)
+    fast = settings.FAST_JSON_LISTS
+    if fast:
+        stmt = stmt.with_only_columns(*PERFUME_READ_COLUMNS)
+
+    if cursor is not None or pagination == "cursor":
+        try:
+            page = await paginate_keyset_async(
+                db,
+                stmt,
+                Perfume.id,
+                limit,
+                cursor=cursor,
+                include_total=include_total,
+                order=order if column is not None else "asc",
+                sort_by=sort_by,
+                sort_column=column,
+                as_rows=fast,
+                filters={"available": available, "concentration": concentration, "season": season,
+                         "brand": brand, "q": q},
+                owner=current_user.id
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return page_response(page) if fast else page
+
+    total = (await db.execute(count_statement(stmt))).scalar_one() if include_total else None
+
+    if column is not None:
+        stmt = stmt.order_by(column.asc() if order == "asc" else column.desc())
+    elif rank is not None:
+        stmt = stmt.order_by(rank, Perfume.id)
+
+    result = await db.execute(stmt.offset(offset).limit(limit))
+    page = {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "items": result.all() if fast else result.scalars().all()
+    }
+    return page_response(page) if fast else page
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_perfumes(
+    format: Literal["ndjson", "csv", "parquet"] = Query("ndjson"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    return export_response_async(db, perfume_export_query(current_user.id), format, "perfumes")
+
+@router.get("/{perfume_id}", response_model=PerfumeRead)
+async def get_perfume(
+    perfume_id: int,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    perfume = await db.get(Perfume, perfume_id)
+
+    return check_perfume_owner(perfume, current_user)
+
+@router.get("/{perfume_id}/purchases", response_model=List[PurchaseRead])
+async def get_perfume_purchases(
+    perfume_id: int,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    perfume = await db.get(Perfume, perfume_id)
+
+    check_perfume_owner(perfume, current_user)
+
+    # lazy loading is not available on AsyncSession, load the collection explicitly
+    stmt = select(Purchase).where(Purchase.perfume_id == perfume_id)
+    return (await db.execute(stmt)).scalars().all()
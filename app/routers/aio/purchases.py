@@ -0,0 +1,149 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
+from datetime import date
+
+from app.auth import get_current_active_user_async
+from app.bulk import BULK_OPENAPI, import_purchase_chunk, request_format, run_import
+from app.config import settings
+from app.export import export_response_async, purchase_export_query
+from app.fast_json import page_response
+from app.group_commit import submit_purchase
+from app.database import get_async_db, get_async_read_db
+from app.pagination import InvalidCursor, count_statement, paginate_keyset_async
+from app.models import Purchase, Perfume, User
+from app.rollups import record_purchase_async
+from app.schemas import BulkImportResult, PerfumeRead, PurchaseCreate, PurchaseRead, PaginatedResponse
+from app.routers.perfumes import check_perfume_owner
+from app.routers.purchases import PURCHASE_READ_COLUMNS, check_purchase_owner, purchases_query
+
+router = APIRouter(prefix="/purchases", tags=["Purchases"])
+
+@router.post("", response_model=PurchaseRead, status_code=status.HTTP_201_CREATED)
+async def create_purchase(
+    purchase_in: PurchaseCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    perfume = await db.get(Perfume, purchase_in.perfume_id)
+
+    check_perfume_owner(perfume, current_user)
+
+    if settings.GROUP_COMMIT_ENABLED:
+        perfume = PerfumeRead.model_validate(perfume)
+        await db.rollback()
+        return await asyncio.wrap_future(submit_purchase(current_user.id, purchase_in, perfume))
+
+    purchase = Purchase(
+        perfume_id=purchase_in.perfume_id,
+        user_id=current_user.id,
+        date=purchase_in.date,
+        price=purchase_in.price,
+        store=purchase_in.store,
+        ml=purchase_in.ml,
+    )
+
+    db.add(purchase)
+    await record_purchase_async(db, current_user.id, purchase.date, purchase.price)
+    await db.commit()
+    await db.refresh(purchase)
+
+    return purchase
+
+@router.post("/bulk", response_model=BulkImportResult, openapi_extra=BULK_OPENAPI)
+async def bulk_import_purchases(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults to the Content-Type"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    return await run_import(
+        request,
+        request_format(request, format),
+        PurchaseCreate,
+        lambda items, report: db.run_sync(import_purchase_chunk, current_user.id, items, report)
+    )
+
+@router.get("", response_model=PaginatedResponse[PurchaseRead])
+async def list_purchases(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    pagination: Literal["offset", "cursor"] = Query("offset", description="Use cursor for keyset pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, implies cursor pagination"),
+    include_total: bool = Query(True, description="Skip the COUNT query when false"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+
+    stmt = purchases_query(current_user.id, start_date, end_date, min_price, max_price)
+    fast = settings.FAST_JSON_LISTS
+    if fast:
+        stmt = stmt.with_only_columns(*PURCHASE_READ_COLUMNS)
+
+    if cursor is not None or pagination == "cursor":
+        try:
+            page = await paginate_keyset_async(
+                db,
+                stmt,
+                Purchase.id,
+                limit,
+                cursor=cursor,
+                include_total=include_total,
+                as_rows=fast,
+                filters={"start_date": start_date, "end_date": end_date, "min_price": min_price,
+                         "max_price": max_price},
+                owner=current_user.id
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return page_response(page) if fast else page
+
+    total = (await db.execute(count_statement(stmt))).scalar_one() if include_total else None
+
+    result = await db.execute(stmt.offset(offset).limit(limit))
+    page = {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "items": result.all() if fast else result.scalars().all()
+    }
+    return page_response(page) if fast else page
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_purchases(
+    format: Literal["ndjson", "csv", "parquet"] = Query("ndjson"),
+    with_perfume: bool = Query(False, description="Join perfume name, brand, concentration and season"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    return export_response_async(db, purchase_export_query(current_user.id, with_perfume), format, "purchases")
+
+@router.get("/{purchase_id}", response_model=PurchaseRead)
+async def get_purchase(
+    purchase_id: int,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    purchase = await db.get(Purchase, purchase_id)
+
+    return check_purchase_owner(purchase, current_user)
+
+@router.delete("/{purchase_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_purchase(
+    purchase_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    purchase = await db.get(Purchase, purchase_id)
+
+    check_purchase_owner(purchase, current_user, "delete")
+
+    await db.delete(purchase)
+    await record_purchase_async(db, purchase.user_id, purchase.date, purchase.price, sign=-1)
+    await db.commit()
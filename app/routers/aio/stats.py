@@ -0,0 +1,72 @@
+from typing import Literal, Optional
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analytics import TooManyPoints, breakdowns, load_frame, timeseries
+from app.auth import get_current_active_user_async
+from app.database import get_async_read_db
+from app.models import User
+from app.routers.stats import (
+    check_date_range,
+    most_expensive_query,
+    most_expensive_result,
+    spending_query,
+    spending_result
+)
+from app.schemas import SpendingBreakdowns, SpendingTimeseries
+from app.rate_limit import limit
+
+router = APIRouter(prefix="/stats", tags=["Stats"], dependencies=[Depends(limit("stats"))])
+
+@router.get("/spending")
+async def spending_stats(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+
+    statements = spending_query(current_user.id, start_date, end_date)
+
+    return spending_result([(await db.execute(stmt)).one() for stmt in statements])
+
+@router.get("/most_expensive")
+async def most_expensive(
+    num : Optional[int] = Query(5, ge=1),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+
+    most_expensive = (await db.execute(most_expensive_query(current_user.id, num))).all()
+
+    return most_expensive_result(most_expensive)
+
+@router.get("/timeseries", response_model=SpendingTimeseries)
+async def spending_timeseries(
+    bucket: Literal["day", "week", "month"] = Query("month", description="Weeks start on Monday"),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    check_date_range(start_date, end_date)
+    frame = await db.run_sync(load_frame, current_user.id)
+
+    try:
+        points = timeseries(frame, bucket, start_date, end_date)
+    except TooManyPoints as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e))
+    return {"bucket": bucket, "points": points}
+
+@router.get("/breakdowns", response_model=SpendingBreakdowns)
+async def spending_breakdowns(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(get_current_active_user_async)
+    ):
+    check_date_range(start_date, end_date)
+    frame = await db.run_sync(load_frame, current_user.id)
+
+    return breakdowns(frame, start_date, end_date)
@@ -1,20 +1,96 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app.database import get_db
-from app.models import User
-from app.schemas import UserCreate, UserRead, Token
+from app.models import RevokedSession, User
+from app.schemas import RefreshRequest, UserCreate, UserRead, Token
 from app.auth import (
     get_current_user,
     get_password_hash,
-    verify_password,
+    get_token_payload,
+    verify_and_update_password,
     create_access_token,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    create_refresh_token,
+    decode_refresh_token,
+    new_session_id,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    REFRESH_TOKEN_EXPIRE_DAYS
 )
+from app.revocation import utcnow
+from app.rate_limit import limit
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], dependencies=[Depends(limit("auth"))])
+
+def invalid_login_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Incorrect username or password",
+        headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def invalid_refresh_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or revoked refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def token_response(
+        user: User,
+        sid: Optional[str] = None
+        ) -> dict:
+    # a login starts a session; a refresh issues new tokens within the caller's
+    sid = sid or new_session_id()
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={
+            "sub": user.username,
+            "role": user.role.value,
+            "uid": user.id,
+            "active": user.is_active,
+            "sid": sid
+            },
+        expires_delta=access_token_expires
+    )
+    refresh_token = create_refresh_token({"sub": user.username, "uid": user.id}, sid)
+
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+def refreshed_user(
+        user: Optional[User],
+        payload: dict
+        ) -> User:
+    if user is None or not user.is_active or user.username != payload["sub"]:
+        raise invalid_refresh_exception()
+    return user
+
+def retired_refresh_token(
+        payload: dict
+        ) -> Tuple[RevokedSession, Optional[str]]:
+    # the jti goes on the denylist until the token would have expired anyway, and the new tokens
+    # stay in the session. Refresh tokens issued before rotation used the sid as their jti, so
+    # retiring one ends its session and the new tokens start another.
+    expires_at = datetime.fromtimestamp(payload["exp"], timezone.utc).replace(tzinfo=None)
+    retired = RevokedSession(sid=payload["jti"], user_id=payload["uid"], revoked_at=utcnow(), expires_at=expires_at)
+    return retired, None if payload["jti"] == payload["sid"] else payload["sid"]
+
+def revoked_session(
+        payload: dict
+        ) -> Optional[RevokedSession]:
+    # tokens issued before sessions existed carry no sid and simply run out
+    if payload.get("sid") is None:
+        return None
+    now = utcnow()
+    return RevokedSession(
+        sid=payload["sid"],
+        user_id=payload.get("uid"),
+        revoked_at=now,
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    )
 
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
 def register_user(
@@ -49,29 +125,50 @@ def login_user(
     user = db.query(User).filter(User.username == form_data.username).first()
 
     if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
-            )
-
-    if not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
-            )
+        raise invalid_login_exception()
 
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={
-            "sub": user.username,
-            "role": user.role.value
-            },
-        expires_delta=access_token_expires
-    )
+    valid, new_hash = verify_and_update_password(form_data.password, user.hashed_password)
+    if not valid:
+        raise invalid_login_exception()
 
-    return {"access_token": access_token, "token_type": "bearer"}
+    # CryptContext flagged the stored hash (e.g. BCRYPT_ROUNDS changed), upgrade it transparently
+    if new_hash:
+        user.hashed_password = new_hash
+        db.commit()
+
+    return token_response(user)
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(
+    body: RefreshRequest,
+    db: Session = Depends(get_db)
+    ):
+    try:
+        payload = decode_refresh_token(body.refresh_token)
+    except HTTPException:
+        raise invalid_refresh_exception()
+    # role and is_active come from the primary, not from the refresh token or a lagging replica
+    user = refreshed_user(db.get(User, payload["uid"]), payload)
+    retired, sid = retired_refresh_token(payload)
+    db.add(retired)
+    try:
+        db.commit()
+    except IntegrityError:
+        # the same refresh token was just redeemed by another request
+        db.rollback()
+        raise invalid_refresh_exception()
+    return token_response(user, sid)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+    ):
+    revoked = revoked_session(payload)
+    if revoked is not None:
+        db.merge(revoked)
+        db.commit()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.get("/me", response_model=UserRead)
 def read_users_me(
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.auth import get_current_active_user
+from app.batch import run_batch
+from app.database import get_db
+from app.models import User
+from app.schemas import BatchRejected, BatchRequest, BatchResult
+
+router = APIRouter(prefix="/batch", tags=["Batch"])
+
+BATCH_RESPONSES = {
+    409: {"model": BatchRejected, "description": "Nothing was applied; the database rejected the named operation"},
+    422: {"model": BatchRejected, "description": "Nothing was applied; one entry per rejected operation"},
+}
+
+@router.post("", response_model=BatchResult, responses=BATCH_RESPONSES)
+def apply_batch(
+    batch: BatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+    return {"results": run_batch(db, current_user.id, batch.operations)}
@@ -1,15 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
 from typing import List, Literal, Optional
 from sqlalchemy import asc, desc, func, select
 
 from app.auth import get_current_active_user
-from app.database import get_db
+from app.bulk import BULK_OPENAPI, import_perfume_chunk, request_format, run_import
+from app.config import settings
+from app.export import export_response, perfume_export_query
+from app.fast_json import page_response, read_columns
+from app.database import get_db, get_read_db
+from app.pagination import InvalidCursor, count_total, paginate_keyset
 from app.models import Perfume, Purchase, User
-from app.schemas import PerfumeCreate, PerfumeRead, PurchaseRead, PaginatedResponse
+from app.search import search_perfumes
+from app.schemas import BulkImportResult, PerfumeCreate, PerfumeRead, PurchaseRead, PaginatedResponse
 
 router = APIRouter(prefix="/perfumes", tags=["Perfumes"])
 
+ALLOWED_SORT_FIELDS = {"name": Perfume.name, "brand": Perfume.brand}
+PERFUME_READ_COLUMNS = read_columns(Perfume, PerfumeRead)
+
+def perfumes_query(
+        user_id: int,
+        available: Optional[bool] = None,
+        concentration: Optional[str] = None,
+        season: Optional[str] = None,
+        brand: Optional[str] = None
+        ):
+    stmt = select(Perfume).where(Perfume.user_id == user_id)
+
+    if available is not None:
+        stmt = stmt.where(Perfume.available == available)
+    if concentration is not None:
+        stmt = stmt.where(Perfume.concentration == concentration)
+    if season is not None:
+        stmt = stmt.where(Perfume.season == season)
+    if brand is not None:
+        stmt = stmt.where(Perfume.brand.ilike(f"%{brand}%"))
+    return stmt
+
+def resolve_sort_column(
+        sort_by: Optional[str]
+        ):
+    if not sort_by:
+        return None
+    if sort_by not in ALLOWED_SORT_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid sort_by field. Allowed fields are: {', '.join(ALLOWED_SORT_FIELDS.keys())}"
+        )
+    return ALLOWED_SORT_FIELDS[sort_by]
+
+def check_search_pagination(
+        q: Optional[str],
+        sort_by: Optional[str],
+        cursor_mode: bool
+        ) -> None:
+    # keyset pages walk (sort column, id); relevance is neither, so it can't be resumed
+    if q and cursor_mode and not sort_by:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor pagination can't keep search relevance order; pass sort_by or use offset pagination"
+        )
+
+def check_perfume_owner(
+        perfume: Optional[Perfume],
+        current_user: User
+        ) -> Perfume:
+    if not perfume:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Perfume not found"
+        )
+    
+    if perfume.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this perfume"
+        )
+    return perfume
+
 @router.post("", response_model=PerfumeRead, status_code=status.HTTP_201_CREATED)
 def create_perfume(
     perfume_in: PerfumeCreate,
@@ -30,97 +101,113 @@ def create_perfume(
     db.refresh(perfume)
     return perfume
 
+@router.post("/bulk", response_model=BulkImportResult, openapi_extra=BULK_OPENAPI)
+async def bulk_import_perfumes(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults to the Content-Type"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+    return await run_import(
+        request,
+        request_format(request, format),
+        PerfumeCreate,
+        lambda items, report: run_in_threadpool(import_perfume_chunk, db, current_user.id, items, report)
+    )
+
 @router.get("", response_model=PaginatedResponse[PerfumeRead])
 def list_perfumes(
     available: Optional[bool] = Query(None),
     concentration: Optional[str] = Query(None),
     season: Optional[str] = Query(None),
     brand: Optional[str] = Query(None),
+    q: Optional[str] = Query(None, description="Search name and brand; matches prefixes and tolerates typos"),
     sort_by: Optional[str] = Query(None, description="Sort by: name, brand"),
     order: Literal["asc", "desc"] = Query("asc"),
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    pagination: Literal["offset", "cursor"] = Query("offset", description="Use cursor for keyset pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, implies cursor pagination"),
+    include_total: bool = Query(True, description="Skip the COUNT query when false"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
     ):
 
-    stmt = select(Perfume).where(Perfume.user_id == current_user.id)
-
-    if available is not None:
-        stmt = stmt.where(Perfume.available == available)
-    if concentration is not None:
-        stmt = stmt.where(Perfume.concentration == concentration)
-    if season is not None:
-        stmt = stmt.where(Perfume.season == season)
-    if brand is not None:
-        stmt = stmt.where(Perfume.brand.ilike(f"%{brand}%"))
+    stmt = perfumes_query(current_user.id, available, concentration, season, brand)
+    column = resolve_sort_column(sort_by)
+    check_search_pagination(q, sort_by, cursor is not None or pagination == "cursor")
+    rank = None
+    if q:
+        stmt, rank = search_perfumes(db, stmt, current_user.id, q)
+    fast = settings.FAST_JSON_LISTS
+    if fast:
+        stmt = stmt.with_only_columns(*PERFUME_READ_COLUMNS)
+
+    if cursor is not None or pagination == "cursor":
+        try:
+            page = paginate_keyset(
+                db,
+                stmt,
+                Perfume.id,
+                limit,
+                cursor=cursor,
+                include_total=include_total,
+                order=order if column is not None else "asc",
+                sort_by=sort_by,
+                sort_column=column,
+                as_rows=fast,
+                filters={"available": available, "concentration": concentration, "season": season,
+                         "brand": brand, "q": q},
+                owner=current_user.id
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return page_response(page) if fast else page
 
-    count_stmt = select(func.count()).select_from(stmt.subquery())
-    total = db.execute(count_stmt).scalar_one()
+    total = count_total(db, stmt) if include_total else None
 
-    allowed_sort_fields = {"name": Perfume.name, "brand": Perfume.brand}
-    if sort_by:
-        if sort_by not in allowed_sort_fields:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Invalid sort_by field. Allowed fields are: {', '.join(allowed_sort_fields.keys())}"
-            )
-        
-        column = allowed_sort_fields[sort_by]
+    if column is not None:
         stmt = stmt.order_by(column.asc() if order == "asc" else column.desc())
+    elif rank is not None:
+        stmt = stmt.order_by(rank, Perfume.id)
 
-    stmt = stmt.offset(offset).limit(limit)
-    items = db.execute(stmt).scalars().all()
-
-    return {
+    result = db.execute(stmt.offset(offset).limit(limit))
+    page = {
         "total": total,
         "limit": limit,
         "offset": offset,
-        "items": items
+        "items": result.all() if fast else result.scalars().all()
     }
+    return page_response(page) if fast else page
+
+@router.get("/export", response_class=StreamingResponse)
+def export_perfumes(
+    format: Literal["ndjson", "csv", "parquet"] = Query("ndjson"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+    return export_response(db, perfume_export_query(current_user.id), format, "perfumes")
 
 @router.get("/{perfume_id}", response_model=PerfumeRead)
 def get_perfume(
     perfume_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
     ):
     stmt = select(Perfume).where(Perfume.id == perfume_id)
     perfume = db.execute(stmt).scalars().first()
 
-    if not perfume:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Perfume not found"
-        )
-    
-    if perfume.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to access this perfume"
-        )
-
-    return perfume
+    return check_perfume_owner(perfume, current_user)
 
 @router.get("/{perfume_id}/purchases", response_model=List[PurchaseRead])
 def get_perfume_purchases(
     perfume_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
     ):
-    stmt = select(Perfume).where(Perfume.id == perfume_id)
+    stmt = select(Perfume).where(Perfume.id == perfume_id).options(selectinload(Perfume.purchases))
     perfume = db.execute(stmt).scalars().first()
 
-    if not perfume:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Perfume not found"
-        )
-
-    if perfume.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to access this perfume"
-        )
+    check_perfume_owner(perfume, current_user)
 
     return perfume.purchases
\ No newline at end of file
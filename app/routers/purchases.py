@@ -1,16 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from starlette.concurrency import run_in_threadpool
+from typing import List, Literal, Optional
 from datetime import date
 
 from app.auth import get_current_active_user
-from app.database import get_db
+from app.bulk import BULK_OPENAPI, import_purchase_chunk, request_format, run_import
+from app.config import settings
+from app.export import export_response, purchase_export_query
+from app.fast_json import page_response, read_columns
+from app.group_commit import submit_purchase
+from app.database import get_db, get_read_db
+from app.pagination import InvalidCursor, count_total, paginate_keyset
 from app.models import Purchase, Perfume, User
-from app.schemas import PurchaseCreate, PurchaseRead, PaginatedResponse
+from app.rollups import record_purchase
+from app.schemas import BulkImportResult, PerfumeRead, PurchaseCreate, PurchaseRead, PaginatedResponse
 
 router = APIRouter(prefix="/purchases", tags=["Purchases"])
 
+PURCHASE_READ_COLUMNS = read_columns(Purchase, PurchaseRead)
+
+def purchases_query(
+        user_id: int,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+        ):
+    stmt = select(Purchase).where(Purchase.user_id == user_id)
+
+    if start_date:
+        stmt = stmt.where(Purchase.date >= start_date)
+    if end_date:
+        stmt = stmt.where(Purchase.date <= end_date)
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Start date cannot be after end date")
+    
+    if min_price is not None:
+        stmt = stmt.where(Purchase.price >= min_price)
+    if max_price is not None:
+        stmt = stmt.where(Purchase.price <= max_price)
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Minimum price cannot be greater than maximum price")
+    return stmt
+
+def check_purchase_owner(
+        purchase: Optional[Purchase],
+        current_user: User,
+        action: str = "access"
+        ) -> Purchase:
+    if not purchase:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Purchase not found")
+
+    if purchase.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Not authorized to {action} this purchase"
+        )
+    return purchase
+
 @router.post("", response_model=PurchaseRead, status_code=status.HTTP_201_CREATED)
 def create_purchase(
     purchase_in: PurchaseCreate,
@@ -29,6 +79,12 @@ def create_purchase(
             detail="Not authorized to access this perfume"
         )
 
+    if settings.GROUP_COMMIT_ENABLED:
+        perfume = PerfumeRead.model_validate(perfume)
+        # end the read transaction so it holds no lock while the writer commits
+        db.rollback()
+        return submit_purchase(current_user.id, purchase_in, perfume).result()
+
     purchase = Purchase(
         perfume_id=purchase_in.perfume_id,
         user_id=current_user.id,
@@ -39,11 +95,26 @@ def create_purchase(
     )
 
     db.add(purchase)
+    record_purchase(db, current_user.id, purchase.date, purchase.price)
     db.commit()
     db.refresh(purchase)
 
     return purchase
 
+@router.post("/bulk", response_model=BulkImportResult, openapi_extra=BULK_OPENAPI)
+async def bulk_import_purchases(
+    request: Request,
+    format: Optional[Literal["csv", "ndjson"]] = Query(None, description="Defaults to the Content-Type"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+    return await run_import(
+        request,
+        request_format(request, format),
+        PurchaseCreate,
+        lambda items, report: run_in_threadpool(import_purchase_chunk, db, current_user.id, items, report)
+    )
+
 @router.get("", response_model=PaginatedResponse[PurchaseRead])
 def list_purchases(
     start_date: Optional[date] = Query(None),
@@ -52,56 +123,66 @@ def list_purchases(
     max_price: Optional[float] = Query(None, ge=0),
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    pagination: Literal["offset", "cursor"] = Query("offset", description="Use cursor for keyset pagination"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, implies cursor pagination"),
+    include_total: bool = Query(True, description="Skip the COUNT query when false"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
     ):
 
-    stmt = select(Purchase).where(Purchase.user_id == current_user.id)
-
-    if start_date:
-        stmt = stmt.where(Purchase.date >= start_date)
-    if end_date:
-        stmt = stmt.where(Purchase.date <= end_date)
-    if start_date and end_date and start_date > end_date:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Start date cannot be after end date")
-    
-    if min_price is not None:
-        stmt = stmt.where(Purchase.price >= min_price)
-    if max_price is not None:
-        stmt = stmt.where(Purchase.price <= max_price)
-    if min_price is not None and max_price is not None and min_price > max_price:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Minimum price cannot be greater than maximum price")
-    
-    total_stmt = select(func.count()).select_from(stmt.subquery())
-    total = db.execute(total_stmt).scalar_one()
-
-    items = db.execute(stmt.offset(offset).limit(limit)).scalars().all()
-
-    return {
+    stmt = purchases_query(current_user.id, start_date, end_date, min_price, max_price)
+    fast = settings.FAST_JSON_LISTS
+    if fast:
+        stmt = stmt.with_only_columns(*PURCHASE_READ_COLUMNS)
+
+    if cursor is not None or pagination == "cursor":
+        try:
+            page = paginate_keyset(
+                db,
+                stmt,
+                Purchase.id,
+                limit,
+                cursor=cursor,
+                include_total=include_total,
+                as_rows=fast,
+                filters={"start_date": start_date, "end_date": end_date, "min_price": min_price,
+                         "max_price": max_price},
+                owner=current_user.id
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        return page_response(page) if fast else page
+
+    total = count_total(db, stmt) if include_total else None
+
+    result = db.execute(stmt.offset(offset).limit(limit))
+    page = {
         "total": total,
         "limit": limit,
         "offset": offset,
-        "items": items
+        "items": result.all() if fast else result.scalars().all()
     }
+    return page_response(page) if fast else page
+
+@router.get("/export", response_class=StreamingResponse)
+def export_purchases(
+    format: Literal["ndjson", "csv", "parquet"] = Query("ndjson"),
+    with_perfume: bool = Query(False, description="Join perfume name, brand, concentration and season"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+    return export_response(db, purchase_export_query(current_user.id, with_perfume), format, "purchases")
 
 @router.get("/{purchase_id}", response_model=PurchaseRead)
 def get_purchase(
     purchase_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
     ):
     stmt = select(Purchase).where(Purchase.id == purchase_id)
-    purchase = db.execute(stmt).scalar_one()
+    purchase = db.execute(stmt).scalars().first()
 
-    if not purchase:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Purchase not found")
-
-    if purchase.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to access this purchase"
-        )
-    return purchase
+    return check_purchase_owner(purchase, current_user)
 
 @router.delete("/{purchase_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_purchase(
@@ -110,18 +191,12 @@ def delete_purchase(
     current_user: User = Depends(get_current_active_user)
     ):
     stmt = select(Purchase).where(Purchase.id == purchase_id)
-    purchase = db.execute(stmt).scalar_one()
+    purchase = db.execute(stmt).scalars().first()
 
-    if not purchase:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Purchase not found")
+    check_purchase_owner(purchase, current_user, "delete")
 
-    if purchase.user_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to delete this purchase"
-        )
-    
     db.delete(purchase)
+    record_purchase(db, purchase.user_id, purchase.date, purchase.price, sign=-1)
     db.commit()
 
     return purchase
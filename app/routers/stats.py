@@ -1,59 +1,58 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc, select
 
+from app.analytics import TooManyPoints, breakdowns, load_frame, timeseries
 from app.auth import get_current_active_user
-from app.database import get_db
+from app.database import get_read_db
 from app.models import Purchase, Perfume, User
+from app.rollups import combine_spending, spending_statements
+from app.schemas import SpendingBreakdowns, SpendingTimeseries
+from app.rate_limit import limit
 
-router = APIRouter(prefix="/stats", tags=["Stats"])
+router = APIRouter(prefix="/stats", tags=["Stats"], dependencies=[Depends(limit("stats"))])
 
-@router.get("/spending")
-def spending_stats(
-    start_date: Optional[date] = Query(None),
-    end_date: Optional[date] = Query(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-    ):
-
-    stmt = select(
-        func.sum(Purchase.price).label("total_spent"),
-        func.sum(Purchase.id).label("total_purchases"),
-        func.avg(Purchase.price).label("average_price")
-        ).where(Purchase.user_id == current_user.id)
-
-    if start_date:
-        stmt = stmt.where(Purchase.date >= start_date)
-    if end_date:
-        stmt = stmt.where(Purchase.date <= end_date)
+def check_date_range(
+        start_date: Optional[date],
+        end_date: Optional[date]
+        ) -> None:
     if start_date and end_date and start_date > end_date:
         raise HTTPException(status_code=400, detail="Start date cannot be after end date")
 
-    result = db.execute(stmt).one()
+def spending_query(
+        user_id: int,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None
+        ) -> list:
+    check_date_range(start_date, end_date)
+    return spending_statements(user_id, start_date, end_date)
 
+def spending_result(
+        rows
+        ) -> dict:
+    totals = combine_spending(rows)
+    total_spent, total_purchases = totals["total_spent"], totals["purchase_count"]
     return {
-        "total_spent": result.total_spent or 0,
-        "total_purchases": result.total_purchases or 0,
-        "average_price": round(result.average_price,2) if result.average_price else 0
+        "total_spent": total_spent,
+        "total_purchases": total_purchases,
+        "average_price": round(total_spent / total_purchases, 2) if total_purchases else 0
     }
 
-@router.get("/most_expensive")
-def most_expensive(
-    num : Optional[int] = Query(5, ge=1),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-    ):
-
-    stmt = select(Perfume.name, Perfume.brand, Purchase.price, Purchase.date).\
+def most_expensive_query(
+        user_id: int,
+        num: int
+        ):
+    return select(Perfume.name, Perfume.brand, Purchase.price, Purchase.date).\
         join(Purchase, Perfume.id == Purchase.perfume_id).\
-        where(Purchase.user_id == current_user.id).\
+        where(Purchase.user_id == user_id).\
         order_by(desc(Purchase.price)).\
         limit(num)
-    most_expensive = db.execute(stmt).all()
 
-    
+def most_expensive_result(
+        rows
+        ) -> List[dict]:
     return [
         {
             "rank": rank,
@@ -62,5 +61,57 @@ def most_expensive(
             "price": item.price,
             "date": item.date
         }
-        for rank, item in enumerate(most_expensive, start=1)
-    ]
\ No newline at end of file
+        for rank, item in enumerate(rows, start=1)
+    ]
+
+@router.get("/spending")
+def spending_stats(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+
+    statements = spending_query(current_user.id, start_date, end_date)
+
+    return spending_result(db.execute(stmt).one() for stmt in statements)
+
+@router.get("/most_expensive")
+def most_expensive(
+    num : Optional[int] = Query(5, ge=1),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+
+    most_expensive = db.execute(most_expensive_query(current_user.id, num)).all()
+
+    return most_expensive_result(most_expensive)
+
+@router.get("/timeseries", response_model=SpendingTimeseries)
+def spending_timeseries(
+    bucket: Literal["day", "week", "month"] = Query("month", description="Weeks start on Monday"),
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+    check_date_range(start_date, end_date)
+    frame = load_frame(db, current_user.id)
+
+    try:
+        points = timeseries(frame, bucket, start_date, end_date)
+    except TooManyPoints as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e))
+    return {"bucket": bucket, "points": points}
+
+@router.get("/breakdowns", response_model=SpendingBreakdowns)
+def spending_breakdowns(
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+    ):
+    check_date_range(start_date, end_date)
+    frame = load_frame(db, current_user.id)
+
+    return breakdowns(frame, start_date, end_date)
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, ConfigDict, EmailStr, Field
-from typing import Optional, List, Generic, TypeVar, Dict
+from typing import Optional, List, Generic, Literal, TypeVar, Dict, Union
 from .models import Concentration, Role, Season
-from datetime import date
+from datetime import date, datetime
 
 class UserBase(BaseModel):
     username: str = Field(..., min_length=3, max_length=50,)
@@ -29,6 +29,10 @@ class UserUpdate(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -43,6 +47,13 @@ class PerfumeBase(BaseModel):
 class PerfumeCreate(PerfumeBase):
     pass
 
+class PerfumeUpdate(BaseModel):
+    name: Optional[str] = None
+    brand: Optional[str] = None
+    concentration: Optional[Concentration] = None
+    season: Optional[Season] = None
+    available: Optional[bool] = None
+
 class PerfumeRead(PerfumeBase):
     id: int
     user_id: int
@@ -70,6 +81,14 @@ class PurchaseBase(BaseModel):
 class PurchaseCreate(PurchaseBase):
     pass
 
+class PurchaseUpdate(BaseModel):
+    perfume_id: Optional[int] = None
+    # a field named date would shadow the type in its own annotation
+    purchase_date: Optional[date] = Field(None, alias="date")
+    price: Optional[float] = None
+    store: Optional[str] = None
+    ml: Optional[int] = None
+
 class PurchaseRead(PurchaseBase):
     id: int
     user_id: int
@@ -85,10 +104,55 @@ class PurchaseReadAdmin(PurchaseRead):
 T = TypeVar('T')
 
 class PaginatedResponse(BaseModel, Generic[T]):
-    total: int
+    total: Optional[int]
     limit: int
     offset: int
     items: List[T]
+    next_cursor: Optional[str] = None
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkImportResult(BaseModel):
+    inserted: int
+    failed: int
+    errors: List[BulkRowError]
+    elapsed_seconds: float
+    rows_per_second: float
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    type: Literal["perfume", "purchase"]
+    # target of an update or delete
+    id: Optional[int] = None
+    # names a perfume created by this operation so later purchase operations can use it
+    ref: Optional[str] = None
+    # stands in for data.perfume_id on purchase operations
+    perfume_ref: Optional[str] = None
+    # validated against the create or update schema of the type
+    data: Dict = {}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1)
+
+class BatchOperationResult(BaseModel):
+    index: int
+    op: str
+    type: str
+    id: int
+    item: Optional[Union[PerfumeRead, PurchaseRead]] = None
+
+class BatchResult(BaseModel):
+    results: List[BatchOperationResult]
+
+class BatchOperationError(BaseModel):
+    index: int
+    status: int
+    error: str
+
+class BatchRejected(BaseModel):
+    detail: List[BatchOperationError]
 
 class AdminDashboard(BaseModel):
     total_users: int
@@ -96,6 +160,16 @@ class AdminDashboard(BaseModel):
     total_purchases: int
     total_amount: float
     active_users: int
+    computed_at: datetime
+
+class CacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+    bytes: int = 0
+    hit_rate: float
 
 class UserPerfumeCount(BaseModel):
     perfume_count: int
@@ -120,3 +194,27 @@ class TopUsersResponse(BaseModel):
     most_perfumes: Optional[List[UserPerfumeCount]]
     most_expensive_purchase: Optional[List[MostExpensivePurchase]]
     most_expensive_collection: Optional[List[UserTotalSpent]]
+
+class TimeseriesPoint(BaseModel):
+    period: date
+    purchases: int
+    total_spent: float
+
+class SpendingTimeseries(BaseModel):
+    bucket: str
+    points: List[TimeseriesPoint]
+
+class BreakdownRow(BaseModel):
+    key: Optional[str]
+    purchases: int
+    total_spent: float
+    average_price: float
+    total_ml: int
+    price_per_ml: Optional[float]
+
+class SpendingBreakdowns(BaseModel):
+    brand: List[BreakdownRow]
+    store: List[BreakdownRow]
+    concentration: List[BreakdownRow]
+    season: List[BreakdownRow]
+    price_per_ml: List[BreakdownRow]
@@ -0,0 +1,144 @@
+import difflib
+import re
+import unicodedata
+from typing import List, Optional, Tuple
+
+from sqlalchemy import ColumnElement, Select, column, func, literal_column, or_, select, table
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models import Perfume
+
+FTS_TABLE = "perfumes_fts"
+# bm25 weights per indexed column: a hit in the name outranks one in the brand,
+# user_id only scopes the match
+RANK_WEIGHTS = (10.0, 4.0, 0.0)
+MIN_FUZZY_LENGTH = 4
+MAX_CORRECTIONS = 3
+FUZZY_CUTOFF = 0.75
+FUZZY_CANDIDATE_ROWS = 200
+
+perfumes_fts = table(FTS_TABLE, column("rowid"), column("name"), column("brand"), column("user_id"))
+
+# external content table: the index reads name/brand back from perfumes, and the
+# triggers keep it in step with every write path, including bulk executemany inserts.
+# detail='column' drops term positions (no phrase queries) for a smaller, faster index.
+SEARCH_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, brand, user_id,
+        content='perfumes', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3', detail='column'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON perfumes BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, brand, user_id) VALUES (new.id, new.name, new.brand, new.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON perfumes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, brand, user_id)
+        VALUES ('delete', old.id, old.name, old.brand, old.user_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, brand, user_id ON perfumes BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, brand, user_id)
+        VALUES ('delete', old.id, old.name, old.brand, old.user_id);
+        INSERT INTO {FTS_TABLE}(rowid, name, brand, user_id) VALUES (new.id, new.name, new.brand, new.user_id);
+    END""",
+]
+
+def create_search_index(
+        conn: Connection
+        ) -> None:
+    if conn.dialect.name != "sqlite":
+        return
+    for statement in SEARCH_DDL:
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+def drop_search_index(
+        conn: Connection
+        ) -> None:
+    # raw DDL, so Base.metadata.drop_all leaves all of it behind
+    if conn.dialect.name != "sqlite":
+        return
+    for suffix in ("ai", "ad", "au"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+    # the vocabulary table earlier versions created
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}_vocab")
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+def search_terms(
+        q: str
+        ) -> List[str]:
+    # fold the same way the unicode61 tokenizer does so terms line up with the index
+    folded = "".join(
+        c for c in unicodedata.normalize("NFKD", q.lower()) if not unicodedata.combining(c)
+    )
+    return re.findall(r"\w+", folded)
+
+def _user_match(
+        user_id: int,
+        expression: str
+        ) -> ColumnElement:
+    return literal_column(FTS_TABLE).op("MATCH")(f'user_id : "{user_id}" AND {expression}')
+
+def _has_prefix(
+        db: Session,
+        user_id: int,
+        term: str
+        ) -> bool:
+    return db.execute(
+        select(perfumes_fts.c.rowid).where(_user_match(user_id, f'"{term}"*')).limit(1)
+    ).first() is not None
+
+def _corrections(
+        db: Session,
+        user_id: int,
+        term: str
+        ) -> List[str]:
+    # candidates come from the user's own perfumes, found through the index: typos rarely hit
+    # the first letter, so only rows with a word starting with it are read, and at most
+    # FUZZY_CANDIDATE_ROWS of them however large the collection
+    initial = term[0]
+    rows = db.execute(
+        select(perfumes_fts.c.name, perfumes_fts.c.brand)
+        .where(_user_match(user_id, f'"{initial}"*'))
+        .limit(FUZZY_CANDIDATE_ROWS)
+    ).all()
+    candidates = {word for row in rows for field in row for word in search_terms(field) if word[0] == initial}
+    return difflib.get_close_matches(term, sorted(candidates), n=MAX_CORRECTIONS, cutoff=FUZZY_CUTOFF)
+
+def match_expression(
+        db: Session,
+        user_id: int,
+        terms: List[str]
+        ) -> str:
+    clauses = [f'user_id : "{user_id}"']
+    for term in terms:
+        alternatives = [f'"{term}"*']
+        if len(term) >= MIN_FUZZY_LENGTH and not _has_prefix(db, user_id, term):
+            alternatives += [f'"{correction}"' for correction in _corrections(db, user_id, term)]
+        clauses.append(f"({' OR '.join(alternatives)})")
+    return " AND ".join(clauses)
+
+def search_perfumes(
+        db: Session,
+        stmt: Select,
+        user_id: int,
+        q: str
+        ) -> Tuple[Select, Optional[ColumnElement]]:
+    terms = search_terms(q)
+    if not terms:
+        return stmt, None
+
+    if db.get_bind().dialect.name != "sqlite":
+        # no FTS5 elsewhere; substring matches, with the trigram index serving brand on PostgreSQL
+        for term in terms:
+            stmt = stmt.where(or_(Perfume.name.ilike(f"%{term}%"), Perfume.brand.ilike(f"%{term}%")))
+        return stmt, None
+
+    # materialized so the MATCH runs once up front; joined inline, SQLite may drive the
+    # join from perfumes and re-run the full-text query for every one of the user's rows
+    fts = literal_column(FTS_TABLE)
+    matches = select(perfumes_fts.c.rowid.label("id"), func.bm25(fts, *RANK_WEIGHTS).label("rank")) \
+        .where(fts.op("MATCH")(match_expression(db, user_id, terms))) \
+        .cte("search_matches") \
+        .prefix_with("MATERIALIZED")
+    return stmt.join(matches, matches.c.id == Perfume.id), matches.c.rank
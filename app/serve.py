@@ -0,0 +1,31 @@
+import argparse
+import os
+
+import uvicorn
+
+# python -m app.serve --workers 4
+# WEB_CONCURRENCY is exported before the workers import the app so each one knows it
+# has siblings; see create_app and CACHE_BACKEND_URL
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the API with several uvicorn worker processes")
+    parser.add_argument("--host", default=os.environ.get("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction, default=True)
+    args = parser.parse_args()
+
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        log_level=args.log_level,
+        access_log=args.access_log,
+        timeout_graceful_shutdown=30
+    )
+
+if __name__ == "__main__":
+    main()
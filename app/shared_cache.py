@@ -0,0 +1,186 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CLIENT_ERRORS = (redis.RedisError, OSError) if redis is not None else (OSError,)
+
+logger = logging.getLogger(__name__)
+
+class CacheBackendError(RuntimeError):
+    pass
+
+class MemoryBackend:
+    # the fallback when no shared backend is configured: each worker process keeps its own keys
+    shared = False
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], bytes]] = {}
+        self._lock = threading.Lock()
+
+    def _live(
+            self,
+            key: str
+            ) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(
+            self,
+            key: str
+            ) -> Optional[bytes]:
+        with self._lock:
+            return self._live(key)
+
+    def mget(
+            self,
+            keys: Sequence[str]
+            ) -> List[Optional[bytes]]:
+        with self._lock:
+            return [self._live(key) for key in keys]
+
+    def set(
+            self,
+            key: str,
+            value: bytes,
+            ttl: Optional[float] = None,
+            only_if_missing: bool = False
+            ) -> bool:
+        with self._lock:
+            if only_if_missing and self._live(key) is not None:
+                return False
+            self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+            return True
+
+    def incr(
+            self,
+            key: str,
+            amount: int = 1
+            ) -> int:
+        with self._lock:
+            value = int(self._live(key) or 0) + amount
+            self._data[key] = (None, str(value).encode())
+            return value
+
+    def delete(
+            self,
+            key: str
+            ) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+class RedisBackend:
+    # any client with redis-py's get/mget/set/incr/delete signatures works, which is
+    # how the tests run it against an in-memory stand-in
+    shared = True
+
+    def __init__(self, client, prefix: str = "perfume-tracker:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _call(self, method: str, *args, **kwargs):
+        try:
+            return getattr(self.client, method)(*args, **kwargs)
+        except CLIENT_ERRORS as e:
+            raise CacheBackendError(str(e)) from e
+
+    def get(
+            self,
+            key: str
+            ) -> Optional[bytes]:
+        return self._call("get", self.prefix + key)
+
+    def mget(
+            self,
+            keys: Sequence[str]
+            ) -> List[Optional[bytes]]:
+        return self._call("mget", [self.prefix + key for key in keys])
+
+    def set(
+            self,
+            key: str,
+            value: bytes,
+            ttl: Optional[float] = None,
+            only_if_missing: bool = False
+            ) -> bool:
+        px = int(ttl * 1000) if ttl else None
+        return bool(self._call("set", self.prefix + key, value, px=px, nx=only_if_missing))
+
+    def incr(
+            self,
+            key: str,
+            amount: int = 1
+            ) -> int:
+        return self._call("incr", self.prefix + key, amount)
+
+    def delete(
+            self,
+            key: str
+            ) -> None:
+        self._call("delete", self.prefix + key)
+
+def create_cache_backend(
+        url: Optional[str] = None
+        ):
+    url = url or settings.CACHE_BACKEND_URL
+    if not url:
+        return MemoryBackend()
+    if redis is None:
+        logger.warning("CACHE_BACKEND_URL is set but redis is not installed; caches stay per process")
+        return MemoryBackend()
+    timeout = settings.CACHE_BACKEND_TIMEOUT_SECONDS
+    client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+    try:
+        client.ping()
+    except redis.RedisError:
+        logger.warning("Cache backend %s is unreachable; caches stay per process", url)
+        return MemoryBackend()
+    return RedisBackend(client)
+
+cache_backend = create_cache_backend()
+
+class SharedVersions:
+    # counters for state every worker keeps its own copy of: a worker bumps one after changing
+    # the state, and a copy taken under an older version missed another worker's change.
+    # None means versions can't be shared (no shared backend, or it failed), and callers fall
+    # back to what a single process knows.
+    def __init__(self, prefix: str, backend=None):
+        self.prefix = prefix
+        self.backend = backend if backend is not None else cache_backend
+
+    def get(
+            self,
+            key: str = ""
+            ) -> Optional[int]:
+        if not self.backend.shared:
+            return None
+        try:
+            return int(self.backend.get(f"{self.prefix}:{key}") or 0)
+        except CacheBackendError:
+            return None
+
+    def bump(
+            self,
+            key: str = "",
+            amount: int = 1
+            ) -> Optional[int]:
+        if not self.backend.shared:
+            return None
+        try:
+            return self.backend.incr(f"{self.prefix}:{key}", amount)
+        except CacheBackendError:
+            logger.exception("Could not bump %s:%s", self.prefix, key)
+            return None
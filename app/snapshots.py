@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Generic, Optional, TypeVar
+
+from sqlalchemy.orm import Session
+
+from app.shared_cache import SharedVersions
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class Snapshot(Generic[T]):
+    def __init__(
+            self,
+            compute: Callable[[Session, datetime], T],
+            max_age: float = 30,
+            write_threshold: int = 100,
+            shared_writes: Optional[SharedVersions] = None
+            ):
+        self.compute = compute
+        self.max_age = max_age
+        self.write_threshold = write_threshold
+        self.value: Optional[T] = None
+        self.writes = 0
+        # writes counted across all workers, and that count when the value was computed
+        self.shared_writes = shared_writes
+        self._shared_writes_at: Optional[int] = None
+        # set while a background refresher owns staleness, reads then never recompute inline
+        self.background = False
+        self._computed_at = 0.0
+        self._lock = threading.Lock()
+
+    def record_write(self, count: int = 1) -> None:
+        self.writes += count
+        if self.shared_writes is not None:
+            self.shared_writes.bump(amount=count)
+
+    def pending_writes(self) -> int:
+        if self.shared_writes is not None and self._shared_writes_at is not None:
+            total = self.shared_writes.get()
+            if total is not None:
+                return total - self._shared_writes_at
+        return self.writes
+
+    def is_stale(self) -> bool:
+        return (
+            self.value is None
+            or time.monotonic() - self._computed_at >= self.max_age
+            or self.pending_writes() >= self.write_threshold
+        )
+
+    def refresh(
+            self,
+            db: Session
+            ) -> T:
+        with self._lock:
+            writes = self.writes
+            shared_writes = self.shared_writes.get() if self.shared_writes is not None else None
+            value = self.compute(db, datetime.now(timezone.utc))
+            self.value = value
+            self.writes -= writes
+            self._shared_writes_at = shared_writes
+            self._computed_at = time.monotonic()
+            return value
+
+    def get(
+            self,
+            db: Session
+            ) -> T:
+        value = self.value
+        if value is None or (not self.background and self.is_stale()):
+            return self.refresh(db)
+        return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self.value = None
+
+async def run_refresher(
+        snapshot: Snapshot,
+        session_factory: Callable[[], Session],
+        tick: float = 1.0
+        ) -> None:
+    def refresh():
+        db = session_factory()
+        try:
+            snapshot.refresh(db)
+        finally:
+            db.close()
+
+    snapshot.background = True
+    try:
+        while True:
+            if snapshot.is_stale():
+                try:
+                    await asyncio.to_thread(refresh)
+                except Exception:
+                    logger.exception("Snapshot refresh failed")
+            await asyncio.sleep(tick)
+    finally:
+        snapshot.background = False
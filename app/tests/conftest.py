@@ -1,16 +1,33 @@
+import os
+from contextlib import contextmanager
+
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("DASHBOARD_BACKGROUND_REFRESH", "false")
+os.environ.setdefault("SEED_LEADERBOARDS_ON_STARTUP", "false")
+os.environ.setdefault("WARMUP_ON_STARTUP", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("LOAD_TOKEN_DENYLIST_ON_STARTUP", "false")
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
-from app.main import app
-from app.database import Base, get_db
+from app.main import app, create_app
+from app.database import get_async_db, get_async_read_db, get_db, get_read_db
+from app.auth import get_password_hash
+from app.migrations import reset_schema
+from app.models import Role, User
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+# point these at a disposable PostgreSQL database to run the suite against it
+SQLALCHEMY_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "sqlite:///./test.db")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
 )
 
 TestingSessionLocal = sessionmaker(
@@ -28,12 +45,141 @@ def override_get_db():
 
 @pytest.fixture(scope="session")
 def client():
-    Base.metadata.drop_all(bind=engine)
-    Base.metadata.create_all(bind=engine)
+    reset_schema(engine)
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
 
     with TestClient(app) as c:
+        c.post(
+            "/auth/register",
+            json={"username": "tester", "email": "tester@example.com", "password": "secret123"}
+        )
+        response = c.post("/auth/login", data={"username": "tester", "password": "secret123"})
+        c.headers.update({"Authorization": f"Bearer {response.json()['access_token']}"})
         yield c
 
     app.dependency_overrides.clear()
+
+@pytest.fixture
+def captured_sql():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+ASYNC_DATABASE_URL = os.environ.get("TEST_ASYNC_DATABASE_URL", "sqlite+aiosqlite:///./test_async.db")
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+# the same database through a sync driver, for what the async stack runs on worker threads
+async_url = make_url(ASYNC_DATABASE_URL)
+async_sync_engine = create_engine(
+    async_url.set(drivername=async_url.get_backend_name()),
+    connect_args={"check_same_thread": False} if async_url.get_backend_name() == "sqlite" else {}
+)
+
+TestingAsyncSyncSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=async_sync_engine
+)
+
+def override_get_async_sync_db():
+    db = TestingAsyncSyncSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@pytest.fixture(scope="session")
+def async_client():
+    reset_schema(async_sync_engine)
+
+    async_app = create_app("async")
+    async_app.dependency_overrides[get_async_db] = override_get_async_db
+    async_app.dependency_overrides[get_async_read_db] = override_get_async_db
+    async_app.dependency_overrides[get_read_db] = override_get_async_sync_db
+
+    with TestClient(async_app) as c:
+        c.post(
+            "/auth/register",
+            json={"username": "tester", "email": "tester@example.com", "password": "secret123"}
+        )
+        response = c.post("/auth/login", data={"username": "tester", "password": "secret123"})
+        c.headers.update({"Authorization": f"Bearer {response.json()['access_token']}"})
+        yield c
+
+def login_headers(client, username, password="secret123"):
+    response = client.post("/auth/login", data={"username": username, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    db = TestingSessionLocal()
+    db.add(User(
+        username="admin",
+        email="admin@example.com",
+        hashed_password=get_password_hash("secret123"),
+        role=Role.ADMIN,
+        is_active=True
+    ))
+    db.commit()
+    db.close()
+    return login_headers(client, "admin")
+
+@pytest.fixture
+def max_queries(captured_sql):
+    @contextmanager
+    def check(limit):
+        start = len(captured_sql)
+        yield
+        issued = [statement for statement, _ in captured_sql[start:]]
+        assert len(issued) <= limit, f"{len(issued)} SQL statements issued, expected at most {limit}: {issued}"
+    return check
+
+# every request a test sends is held to this many SQL statements, so an N+1 shows up in
+# whichever endpoint test hits it; raise it per test with @pytest.mark.max_queries(n)
+DEFAULT_MAX_QUERIES = 6
+
+@pytest.fixture(autouse=True)
+def query_budget(request, monkeypatch):
+    marker = request.node.get_closest_marker("max_queries")
+    limit = marker.args[0] if marker else DEFAULT_MAX_QUERIES
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = (engine, async_engine.sync_engine)
+    for watched in engines:
+        event.listen(watched, "before_cursor_execute", record)
+    send = TestClient.request
+
+    def budgeted(self, method, url, *args, **kwargs):
+        start = len(statements)
+        response = send(self, method, url, *args, **kwargs)
+        issued = statements[start:]
+        assert len(issued) <= limit, (
+            f"{method} {url} issued {len(issued)} SQL statements, expected at most {limit}: {issued}"
+        )
+        return response
+
+    monkeypatch.setattr(TestClient, "request", budgeted)
+    yield
+    for watched in engines:
+        event.remove(watched, "before_cursor_execute", record)
@@ -0,0 +1,125 @@
+from app.leaderboards import leaderboards
+from app.models import User
+from app.routers.admin import dashboard_snapshot, leaderboard_problems
+from app.snapshots import Snapshot
+from app.tests.conftest import TestingSessionLocal, login_headers
+
+def test_dashboard_serves_snapshot_until_fresh(client, admin_headers):
+    fresh = client.get("/admin/stats/dashboard?fresh=true", headers=admin_headers).json()
+    assert "computed_at" in fresh
+
+    client.post(
+        "/perfumes",
+        json={"name": "Erba Pura", "brand": "Xerjoff", "concentration": "EDP", "season": "SUMMER"}
+    )
+
+    cached = client.get("/admin/stats/dashboard", headers=admin_headers).json()
+    assert cached == fresh
+
+    refreshed = client.get("/admin/stats/dashboard?fresh=true", headers=admin_headers).json()
+    assert refreshed["total_perfumes"] == fresh["total_perfumes"] + 1
+    assert refreshed["computed_at"] > fresh["computed_at"]
+
+def test_dashboard_requires_admin(client):
+    assert client.get("/admin/stats/dashboard").status_code == 403
+
+def test_snapshot_recomputes_after_write_threshold():
+    calls = []
+    snapshot = Snapshot(lambda db, computed_at: calls.append(computed_at) or len(calls), max_age=3600, write_threshold=2)
+
+    assert snapshot.get(None) == 1
+    snapshot.record_write()
+    assert snapshot.get(None) == 1
+    snapshot.record_write()
+    assert snapshot.get(None) == 2
+    assert snapshot.writes == 0
+
+def test_dashboard_counts_writes_once_per_commit(client, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(dashboard_snapshot, "record_write", recorded.append)
+    def new_users(*names):
+        return [User(username=name, email=f"{name}@example.com", hashed_password="x") for name in names]
+
+    db = TestingSessionLocal()
+    try:
+        db.add_all(new_users("rolled_back"))
+        db.flush()
+        db.rollback()
+        assert recorded == []
+
+        db.add_all(new_users("counted_one", "counted_two"))
+        db.flush()
+        db.add_all(new_users("counted_three"))
+        db.commit()
+        assert recorded == [3]
+    finally:
+        db.close()
+
+def test_leaderboards_track_writes(client, admin_headers):
+    db = TestingSessionLocal()
+    leaderboards.seed(db)
+
+    client.post(
+        "/auth/register",
+        json={"username": "collector", "email": "collector@example.com", "password": "secret123"}
+    )
+    headers = login_headers(client, "collector")
+    purchase_ids = []
+    for i in range(4):
+        perfume_id = client.post(
+            "/perfumes",
+            json={"name": f"Layton {i}", "brand": "PdM", "concentration": "EDP", "season": "WINTER"},
+            headers=headers
+        ).json()["id"]
+        purchase_ids.append(client.post(
+            "/purchases",
+            json={"perfume_id": perfume_id, "date": "2026-02-01", "price": 90000 + i, "store": "Store"},
+            headers=headers
+        ).json()["id"])
+    client.delete(f"/purchases/{purchase_ids[-1]}", headers=headers)
+
+    assert leaderboard_problems(db) == []
+
+    data = client.get("/admin/stats/top-users?limit=1", headers=admin_headers).json()
+    assert data["most_perfumes"][0]["user"]["username"] == "collector"
+    assert data["most_expensive_purchase"][0]["price"] == 90002
+    assert data["most_expensive_purchase"][0]["perfume"]["name"] == "Layton 2"
+    db.close()
+
+def test_admin_lists_load_relationships_eagerly(client, admin_headers, max_queries):
+    for name in ["Reflection Man", "Interlude Man"]:
+        perfume_id = client.post(
+            "/perfumes",
+            json={"name": name, "brand": "Amouage", "concentration": "EDP", "season": "ALL"}
+        ).json()["id"]
+        client.post(
+            "/purchases",
+            json={"perfume_id": perfume_id, "date": "2026-04-01", "price": 250, "store": "Store"}
+        )
+    client.get("/auth/me", headers=admin_headers)
+
+    with max_queries(2):
+        response = client.get("/admin/purchases?limit=100", headers=admin_headers)
+    assert response.status_code == 200
+    items = response.json()["items"]
+    assert len(items) >= 2
+    assert all(item["perfume"]["id"] == item["perfume_id"] for item in items)
+    assert all(item["user"]["id"] == item["user_id"] for item in items)
+
+    with max_queries(2):
+        response = client.get("/admin/perfumes?limit=100", headers=admin_headers)
+    assert "tester" in {item["owner"]["username"] for item in response.json()["items"]}
+
+def test_perfume_purchases_in_two_queries(client, max_queries):
+    perfume_id = client.post(
+        "/perfumes",
+        json={"name": "Two Queries", "brand": "Eager", "concentration": "EDT", "season": "ALL"}
+    ).json()["id"]
+    for price in (10, 20):
+        client.post("/purchases", json={"perfume_id": perfume_id, "date": "2026-04-02", "price": price, "store": "x"})
+    client.get("/auth/me")
+
+    with max_queries(2):
+        response = client.get(f"/perfumes/{perfume_id}/purchases")
+    assert response.status_code == 200
+    assert sorted(item["price"] for item in response.json()) == [10, 20]
@@ -0,0 +1,110 @@
+import threading
+
+from app.auth import get_password_hash
+from app.models import Role, User
+from app.routers.admin import dashboard_snapshot
+from app.tests.conftest import TestingAsyncSyncSessionLocal, login_headers
+
+def test_async_perfume_and_purchase_flow(async_client):
+    response = async_client.post(
+        "/perfumes",
+        json={"name": "Aventus", "brand": "Creed", "concentration": "EDP", "season": "ALL"}
+    )
+    assert response.status_code == 201
+    perfume_id = response.json()["id"]
+
+    response = async_client.post(
+        "/purchases",
+        json={"perfume_id": perfume_id, "date": "2026-01-15", "price": 300, "store": "Creed", "ml": 50}
+    )
+    assert response.status_code == 201
+    purchase_id = response.json()["id"]
+
+    purchases = async_client.get(f"/perfumes/{perfume_id}/purchases").json()
+    assert [p["id"] for p in purchases] == [purchase_id]
+
+    data = async_client.get("/perfumes?brand=creed&pagination=cursor").json()
+    assert data["total"] == 1
+    assert data["items"][0]["name"] == "Aventus"
+
+    found = async_client.get("/perfumes?q=avnetus").json()
+    assert [p["id"] for p in found["items"]] == [perfume_id]
+
+    stats = async_client.get("/stats/spending").json()
+    assert stats["total_spent"] == 300
+
+    points = async_client.get("/stats/timeseries", params={"bucket": "day"}).json()["points"]
+    assert points == [{"period": "2026-01-15", "purchases": 1, "total_spent": 300.0}]
+    breakdown = async_client.get("/stats/breakdowns").json()
+    assert breakdown["price_per_ml"] == [{"key": "5+", "purchases": 1, "total_spent": 300.0, "average_price": 300.0,
+                                          "total_ml": 50, "price_per_ml": 6.0}]
+
+    assert async_client.delete(f"/purchases/{purchase_id}").status_code == 204
+    assert async_client.get(f"/purchases/{purchase_id}").status_code == 404
+
+def test_async_me_and_admin_guard(async_client):
+    response = async_client.get("/auth/me")
+    assert response.status_code == 200
+    assert response.json()["username"] == "tester"
+
+    assert async_client.get("/admin/stats/dashboard").status_code == 403
+
+def test_async_refresh_and_logout(async_client):
+    tokens = async_client.post("/auth/login", data={"username": "tester", "password": "secret123"}).json()
+    renewed = async_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+    headers = {"Authorization": f"Bearer {renewed['access_token']}"}
+    assert async_client.get("/auth/me", headers=headers).status_code == 200
+
+    assert async_client.post("/auth/logout", headers=headers).status_code == 204
+    assert async_client.get("/auth/me", headers=headers).status_code == 401
+    assert async_client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+def test_async_bulk_import(async_client):
+    body = '{"name": "Neroli", "brand": "Async Bulk", "concentration": "EDC", "season": "SUMMER"}\n'
+    response = async_client.post("/perfumes/bulk?format=ndjson", content=body * 3)
+    assert response.json()["inserted"] == 3
+    assert async_client.get("/perfumes?brand=Async Bulk").json()["total"] == 3
+
+def test_async_batch(async_client):
+    response = async_client.post("/batch", json={"operations": [
+        {"op": "create", "type": "perfume", "ref": "p",
+         "data": {"name": "Vetiver", "brand": "Async Batch", "concentration": "EDT", "season": "ALL"}},
+        {"op": "create", "type": "purchase", "perfume_ref": "p",
+         "data": {"date": "2026-02-01", "price": 70, "store": "Online"}},
+    ]})
+    assert response.status_code == 200
+    perfume, purchase = response.json()["results"]
+    assert purchase["item"]["perfume_id"] == perfume["id"]
+    assert async_client.get(f"/purchases/{purchase['id']}").json()["price"] == 70
+
+def test_async_export_perfumes(async_client):
+    async_client.post("/perfumes", json={"name": "Iris", "brand": "Async Export", "concentration": "EDP", "season": "ALL"})
+    response = async_client.get("/perfumes/export?format=csv")
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines[0] == "id,name,brand,concentration,season,available"
+    assert any("Async Export" in line for line in lines[1:])
+
+def test_async_dashboard_waits_off_the_event_loop(async_client):
+    db = TestingAsyncSyncSessionLocal()
+    db.add(User(username="async_admin", email="async_admin@example.com",
+                hashed_password=get_password_hash("secret123"), role=Role.ADMIN, is_active=True))
+    db.commit()
+    db.close()
+    headers = login_headers(async_client, "async_admin")
+    assert async_client.get("/admin/stats/top-users", headers=headers).status_code == 200
+
+    # a refresh stuck behind the snapshot lock must not hold up other requests
+    responses = {}
+    def get(name, url, **kwargs):
+        responses[name] = async_client.get(url, **kwargs)
+    with dashboard_snapshot._lock:
+        dashboard = threading.Thread(target=get, args=("dashboard", "/admin/stats/dashboard?fresh=true"),
+                                     kwargs={"headers": headers})
+        dashboard.start()
+        root = threading.Thread(target=get, args=("root", "/"))
+        root.start()
+        root.join(timeout=5)
+        assert "root" in responses
+    dashboard.join()
+    assert responses["dashboard"].status_code == 200
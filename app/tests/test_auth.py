@@ -0,0 +1,221 @@
+import threading
+from datetime import timedelta
+
+import ecdsa
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app import auth
+from app.auth import create_access_token, decode_access_token, load_keys, token_cache, user_cache
+from app.revocation import TokenDenylist, token_denylist
+from app.config import settings
+from app.cache import LRUCache
+from app.hashing import HashingPool, HashingPoolSaturated, hash_password
+from app.models import User
+from app.tests.conftest import TestingSessionLocal, login_headers
+
+def test_login_rehashes_outdated_password(client):
+    db = TestingSessionLocal()
+    db.add(User(
+        username="legacy",
+        email="legacy@example.com",
+        hashed_password=hash_password("secret123", 5),
+        is_active=True
+    ))
+    db.commit()
+
+    response = client.post("/auth/login", data={"username": "legacy", "password": "secret123"})
+    assert response.status_code == 200
+
+    db.expire_all()
+    user = db.query(User).filter(User.username == "legacy").one()
+    assert user.hashed_password.startswith("$2b$04$")
+    db.close()
+
+def test_hashing_pool_rejects_when_saturated():
+    pool = HashingPool(kind="thread", workers=1, max_pending=1)
+    release = threading.Event()
+
+    blocked = pool.submit(release.wait)
+    with pytest.raises(HashingPoolSaturated):
+        pool.submit(release.wait)
+
+    release.set()
+    blocked.result()
+    pool.shutdown()
+    assert pool.pending == 0
+
+def test_deactivation_invalidates_cached_user(client, admin_headers):
+    client.post(
+        "/auth/register",
+        json={"username": "cached", "email": "cached@example.com", "password": "secret123"}
+    )
+    headers = login_headers(client, "cached")
+
+    assert client.get("/perfumes", headers=headers).status_code == 200
+    before = client.get("/admin/stats/cache", headers=admin_headers).json()["users"]
+    assert client.get("/perfumes", headers=headers).status_code == 200
+    after = client.get("/admin/stats/cache", headers=admin_headers).json()["users"]
+    assert after["hits"] > before["hits"]
+
+    db = TestingSessionLocal()
+    db.query(User).filter(User.username == "cached").one().is_active = False
+    db.commit()
+    db.close()
+
+    assert user_cache.get("cached") is None
+    # the token itself is refused through the denylist, before any user lookup
+    response = client.get("/perfumes", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Could not validate credentials"
+
+def test_trusted_claims_skip_user_lookup(client, captured_sql, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_TRUST_CLAIMS", True)
+    user_cache.clear()
+
+    assert client.get("/perfumes?limit=1").status_code == 200
+    assert not any("FROM users" in statement for statement, _ in captured_sql)
+
+def test_lru_cache_expires_and_evicts():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    cache.set("d", 4, ttl=-1)
+    assert cache.get("d") is None
+    assert cache.stats()["evictions"] == 2
+
+@pytest.fixture
+def restore_keys(monkeypatch):
+    yield monkeypatch
+    monkeypatch.undo()
+    load_keys()
+
+def es256_pair():
+    key = ecdsa.SigningKey.generate(curve=ecdsa.NIST256p)
+    return key.to_pem().decode(), key.get_verifying_key().to_pem().decode()
+
+def use_keys(monkeypatch, signing, keys):
+    monkeypatch.setattr(settings, "ALGORITHM", "ES256")
+    monkeypatch.setattr(settings, "JWT_KEYS", {kid: public for kid, (_, public) in keys.items()})
+    monkeypatch.setattr(settings, "JWT_SIGNING_KID", signing)
+    monkeypatch.setattr(settings, "JWT_SIGNING_KEY", keys[signing][0])
+    load_keys()
+
+def test_token_cache_drops_expired_tokens(monkeypatch):
+    token = create_access_token({"sub": "tester"}, timedelta(seconds=30))
+    payload = decode_access_token(token)
+    hits = token_cache.stats()["hits"]
+    assert decode_access_token(token) is payload
+    assert token_cache.stats()["hits"] == hits + 1
+
+    expired_at = payload["exp"] + 1
+    monkeypatch.setattr(auth.time, "time", lambda: expired_at)
+    with pytest.raises(HTTPException) as exc:
+        decode_access_token(token)
+    assert exc.value.status_code == 401
+    assert token_cache.get(auth.hashlib.sha256(token.encode()).digest()) is None
+
+def test_key_rotation_and_retirement(client, restore_keys):
+    old, new = es256_pair(), es256_pair()
+    use_keys(restore_keys, "2025", {"2025": old})
+    old_token = create_access_token({"sub": "tester"})
+    assert jwt.get_unverified_header(old_token)["kid"] == "2025"
+
+    # tokens signed before the rotation keep working while their kid is listed
+    use_keys(restore_keys, "2026", {"2025": old, "2026": new})
+    new_token = create_access_token({"sub": "tester"})
+    assert jwt.get_unverified_header(new_token)["kid"] == "2026"
+    for token in (old_token, new_token):
+        assert client.get("/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+    # once retired, a cached verification of the old token is not reused
+    use_keys(restore_keys, "2026", {"2026": new})
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {old_token}"}).status_code == 401
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {new_token}"}).status_code == 200
+
+    forged = jwt.encode({"sub": "tester"}, es256_pair()[0], algorithm="ES256", headers={"kid": "2026"})
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {forged}"}).status_code == 401
+    with pytest.raises(ValueError):
+        auth.KeySet("ES256", new[0], "2027", {"2026": new[1]})
+
+def login_tokens(client, username):
+    response = client.post("/auth/login", data={"username": username, "password": "secret123"})
+    return response.json()
+
+def bearer(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def test_refresh_renews_access_without_password_check(client, monkeypatch):
+    tokens = login_tokens(client, "tester")
+
+    def no_hashing(*args):
+        raise AssertionError("refresh must not hash")
+    monkeypatch.setattr(auth.hash_pool, "run", no_hashing)
+
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    renewed = response.json()
+    assert client.get("/auth/me", headers=bearer(renewed["access_token"])).json()["username"] == "tester"
+
+    # every refresh rotates the refresh token and retires the one presented, within the same session
+    assert renewed["refresh_token"] != tokens["refresh_token"]
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    assert client.get("/auth/me", headers=bearer(tokens["access_token"])).status_code == 200
+    claims = auth.jwt.get_unverified_claims
+    assert claims(renewed["refresh_token"])["sid"] == claims(tokens["refresh_token"])["sid"]
+    again = client.post("/auth/refresh", json={"refresh_token": renewed["refresh_token"]})
+    assert again.status_code == 200
+    # a worker whose denylist has not caught up still can't redeem a token twice
+    monkeypatch.setattr(token_denylist, "sessions", {})
+    assert client.post("/auth/refresh", json={"refresh_token": renewed["refresh_token"]}).status_code == 401
+
+    # each kind of token only works where it belongs
+    assert client.get("/auth/me", headers=bearer(tokens["refresh_token"])).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["access_token"]}).status_code == 401
+
+def test_logout_revokes_the_session_only(client, captured_sql):
+    client.post("/auth/register", json={"username": "leaving", "email": "leaving@example.com", "password": "secret123"})
+    phone, laptop = login_tokens(client, "leaving"), login_tokens(client, "leaving")
+    assert client.get("/auth/me", headers=bearer(phone["access_token"])).status_code == 200
+
+    assert client.post("/auth/logout", headers=bearer(phone["access_token"])).status_code == 204
+    start = len(captured_sql)
+    # the access token is cached from the request above; the revocation still applies
+    assert client.get("/auth/me", headers=bearer(phone["access_token"])).status_code == 401
+    assert len(captured_sql) == start
+    assert client.post("/auth/refresh", json={"refresh_token": phone["refresh_token"]}).status_code == 401
+    assert client.get("/auth/me", headers=bearer(laptop["access_token"])).status_code == 200
+
+    # a restarted worker gets the revocation from the table
+    db = TestingSessionLocal()
+    restarted = TokenDenylist()
+    restarted.load(db)
+    db.close()
+    assert restarted.session_revoked(auth.jwt.get_unverified_claims(phone["access_token"])["sid"])
+
+def test_deactivation_revokes_trusted_claims_and_refresh(client, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_TRUST_CLAIMS", True)
+    client.post("/auth/register", json={"username": "suspended", "email": "suspended@example.com", "password": "secret123"})
+    tokens = login_tokens(client, "suspended")
+    assert client.get("/perfumes", headers=bearer(tokens["access_token"])).status_code == 200
+
+    def set_active(active):
+        db = TestingSessionLocal()
+        db.query(User).filter(User.username == "suspended").one().is_active = active
+        db.commit()
+        db.close()
+
+    set_active(False)
+    # the token still says active; the denylist knows better without asking the database
+    assert client.get("/perfumes", headers=bearer(tokens["access_token"])).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+
+    set_active(True)
+    assert client.get("/perfumes", headers=bearer(tokens["access_token"])).status_code == 200
+    assert not token_denylist.user_revoked(auth.jwt.get_unverified_claims(tokens["access_token"])["uid"])
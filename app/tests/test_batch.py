@@ -0,0 +1,136 @@
+import pytest
+from sqlalchemy import text
+
+from app.tests.conftest import engine, login_headers
+
+def register(client, username):
+    client.post(
+        "/auth/register",
+        json={"username": username, "email": f"{username}@example.com", "password": "secret123"}
+    )
+    return login_headers(client, username)
+
+def perfume(name, **extra):
+    return {"name": name, "brand": "Batch House", "concentration": "EDP", "season": "ALL", **extra}
+
+# a batch touches each table once per run of operations, so it gets more than one request's budget
+@pytest.mark.max_queries(16)
+def test_batch_applies_operations_in_order(client, captured_sql):
+    headers = register(client, "batcher")
+    existing = client.post("/perfumes", json=perfume("Old Stock"), headers=headers).json()["id"]
+    old_purchase = client.post(
+        "/purchases",
+        json={"perfume_id": existing, "date": "2025-05-01", "price": 40, "store": "Store"},
+        headers=headers
+    ).json()["id"]
+
+    operations = [
+        {"op": "create", "type": "perfume", "ref": "new", "data": perfume("Fresh")},
+        {"op": "create", "type": "purchase", "perfume_ref": "new",
+         "data": {"date": "2025-06-01", "price": 120, "store": "Boutique", "ml": 50}},
+        {"op": "create", "type": "purchase",
+         "data": {"perfume_id": existing, "date": "2025-06-02", "price": 30, "store": "Online"}},
+        {"op": "update", "type": "perfume", "id": existing, "data": {"available": False, "name": None}},
+        {"op": "update", "type": "purchase", "id": old_purchase, "data": {"price": 45}},
+        {"op": "delete", "type": "purchase", "id": old_purchase},
+    ]
+    start = len(captured_sql)
+    response = client.post("/batch", json={"operations": operations}, headers=headers)
+    assert response.status_code == 200
+    statements = [statement for statement, _ in captured_sql[start:]]
+
+    results = response.json()["results"]
+    assert [(r["index"], r["op"], r["type"]) for r in results] == [
+        (i, op["op"], op["type"]) for i, op in enumerate(operations)
+    ]
+    new_id = results[0]["id"]
+    assert results[1]["item"]["perfume_id"] == new_id
+    assert results[3]["item"] == {**perfume("Old Stock", available=False), "id": existing, "user_id": results[0]["item"]["user_id"]}
+    assert results[4]["item"]["price"] == 45
+    assert results[5]["item"] is None
+    # one INSERT ... RETURNING per run of creates (per row on SQLite), and the batch commits once
+    assert sum(s.startswith("INSERT INTO purchases") for s in statements) <= 2
+    assert sum(s == "COMMIT" for s in statements) <= 1
+
+    assert client.get(f"/purchases/{old_purchase}", headers=headers).status_code == 404
+    assert client.get("/stats/spending", headers=headers).json()["total_spent"] == 150
+    assert client.get(f"/perfumes/{existing}", headers=headers).json()["available"] is False
+
+def test_batch_is_all_or_nothing(client):
+    headers = register(client, "batch_rejected")
+    other = client.post("/perfumes", json=perfume("Not Mine")).json()["id"]
+    operations = [
+        {"op": "create", "type": "perfume", "data": perfume("Would Be Created")},
+        {"op": "create", "type": "purchase", "data": {"perfume_id": other, "date": "2025-01-01", "price": 1, "store": "x"}},
+        {"op": "update", "type": "purchase", "id": 999999, "data": {"price": 2}},
+        {"op": "create", "type": "purchase", "perfume_ref": "missing", "data": {"date": "2025-01-01", "price": 1, "store": "x"}},
+        {"op": "create", "type": "perfume", "data": {"name": "No Brand"}},
+        {"op": "update", "type": "perfume", "id": other, "data": {}},
+    ]
+    response = client.post("/batch", json={"operations": operations}, headers=headers)
+    assert response.status_code == 422
+    assert [(e["index"], e["status"]) for e in response.json()["detail"]] == [
+        (1, 403), (2, 404), (3, 422), (4, 422), (5, 422)
+    ]
+    assert client.get("/perfumes", headers=headers).json()["total"] == 0
+
+def test_batch_perfume_delete_takes_purchases(client):
+    headers = register(client, "batch_cascade")
+    created = client.post("/batch", json={"operations": [
+        {"op": "create", "type": "perfume", "ref": "p", "data": perfume("Short Lived")},
+        {"op": "create", "type": "purchase", "perfume_ref": "p", "data": {"date": "2025-02-01", "price": 80, "store": "x"}},
+    ]}, headers=headers).json()["results"]
+    perfume_id, purchase_id = created[0]["id"], created[1]["id"]
+
+    response = client.post("/batch", json={"operations": [
+        {"op": "delete", "type": "perfume", "id": perfume_id},
+        {"op": "delete", "type": "purchase", "id": purchase_id},
+    ]}, headers=headers)
+    assert response.json()["detail"] == [{"index": 1, "status": 404, "error": f"Purchase {purchase_id} not found"}]
+
+    response = client.post("/batch", json={"operations": [{"op": "delete", "type": "perfume", "id": perfume_id}]},
+                           headers=headers)
+    assert response.status_code == 200
+    assert client.get(f"/purchases/{purchase_id}", headers=headers).status_code == 404
+    assert client.get("/stats/spending", headers=headers).json()["total_spent"] == 0
+
+@pytest.mark.max_queries(10)
+def test_batch_identical_creates_keep_their_refs(client):
+    headers = register(client, "batch_twins")
+    response = client.post("/batch", json={"operations": [
+        {"op": "create", "type": "perfume", "ref": "first", "data": perfume("Twin")},
+        {"op": "create", "type": "perfume", "ref": "second", "data": perfume("Twin")},
+        {"op": "create", "type": "purchase", "perfume_ref": "second", "data": {"date": "2025-03-01", "price": 2, "store": "x"}},
+        {"op": "create", "type": "purchase", "perfume_ref": "first", "data": {"date": "2025-03-01", "price": 1, "store": "x"}},
+    ]}, headers=headers)
+    first, second, to_second, to_first = response.json()["results"]
+    assert first["id"] < second["id"]
+    assert (to_first["item"]["perfume_id"], to_second["item"]["perfume_id"]) == (first["id"], second["id"])
+
+@pytest.fixture
+def rejected_name():
+    # a constraint the batch planner cannot see, standing in for one only the database enforces
+    if engine.dialect.name != "sqlite":
+        pytest.skip("uses a SQLite trigger")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TRIGGER reject_perfume BEFORE INSERT ON perfumes WHEN NEW.name = 'Rejected' "
+            "BEGIN SELECT RAISE(ABORT, 'perfume name rejected'); END"
+        ))
+    yield "Rejected"
+    with engine.begin() as conn:
+        conn.execute(text("DROP TRIGGER IF EXISTS reject_perfume"))
+
+@pytest.mark.max_queries(16)
+def test_batch_constraint_violation_names_the_operation(client, rejected_name):
+    headers = register(client, "batch_constraint")
+    response = client.post("/batch", json={"operations": [
+        {"op": "create", "type": "perfume", "data": perfume("Accepted")},
+        {"op": "create", "type": "perfume", "data": perfume(rejected_name)},
+        {"op": "create", "type": "perfume", "data": perfume("Never Reached")},
+    ]}, headers=headers)
+    assert response.status_code == 409
+    assert response.json()["detail"] == [
+        {"index": 1, "status": 409, "error": "Rejected by the database: perfume name rejected"}
+    ]
+    assert client.get("/perfumes", headers=headers).json()["total"] == 0
@@ -0,0 +1,102 @@
+import asyncio
+import shutil
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+from app.config import settings
+from app.database import Base, create_async_db_engine, create_db_engine
+from app.main import create_app
+
+def test_production_profile_applies_sqlite_tuning(tmp_path):
+    config = settings.model_copy(update={"DB_PROFILE": "production"})
+    url = f"sqlite:///{tmp_path / 'tuned.db'}"
+    engine = create_db_engine(url, config)
+
+    with engine.begin() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == config.SQLITE_BUSY_TIMEOUT_MS
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+    assert engine.echo is False
+
+    read_engine = create_db_engine(url, config, read_only=True)
+    with read_engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM t")).scalar() == 0
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+
+    engine.dispose()
+    read_engine.dispose()
+
+async def _write_through(
+        engine
+        ) -> None:
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT count(*) FROM t"))).scalar() == 0
+            await conn.execute(text("INSERT INTO t VALUES (1)"))
+    finally:
+        await engine.dispose()
+
+def test_async_read_engine_is_query_only(tmp_path):
+    path = tmp_path / "async_replica.db"
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+    engine.dispose()
+
+    read_engine = create_async_db_engine(f"sqlite+aiosqlite:///{path}", read_only=True)
+    with pytest.raises(OperationalError):
+        asyncio.run(_write_through(read_engine))
+
+def test_reads_stick_to_primary_after_a_write(tmp_path, monkeypatch):
+    primary_url = f"sqlite:///{tmp_path / 'primary.db'}"
+    replica_path = tmp_path / "replica.db"
+    primary = create_engine(primary_url, connect_args={"check_same_thread": False})
+    replica = create_engine(f"sqlite:///{replica_path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=primary)
+    PrimarySession = sessionmaker(bind=primary, autoflush=False)
+    monkeypatch.setattr(database, "SessionLocal", PrimarySession)
+    monkeypatch.setattr(database, "ReadSessionLocal", sessionmaker(bind=replica, autoflush=False))
+    monkeypatch.setattr(settings, "READ_REPLICA_URL", str(replica_path))
+
+    replicated_app = create_app("sync")
+
+    with TestClient(replicated_app) as c:
+        c.post(
+            "/auth/register",
+            json={"username": "lagged", "email": "lagged@example.com", "password": "secret123"}
+        )
+        # the replica has caught up with the new user but not with anything after it
+        shutil.copy(tmp_path / "primary.db", replica_path)
+        token = c.post("/auth/login", data={"username": "lagged", "password": "secret123"}).json()["access_token"]
+        c.headers.update({"Authorization": f"Bearer {token}"})
+
+        response = c.post("/perfumes", json={
+            "name": "Sticky", "brand": "Replica", "concentration": "EDP", "season": "ALL"
+        })
+        assert response.status_code == 201
+        assert database.PRIMARY_READ_COOKIE in response.cookies
+        assert [p["name"] for p in c.get("/perfumes").json()["items"]] == ["Sticky"]
+
+        c.cookies.clear()
+        assert c.get("/perfumes").json()["items"] == []
+
+    primary.dispose()
+    replica.dispose()
+
+def test_warm_up_opens_connections_and_compiles_hot_queries(tmp_path):
+    from app.warmup import warm_engine
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'warm.db'}")
+    Base.metadata.create_all(bind=engine)
+    assert len(engine._compiled_cache) == 0
+
+    warm_engine(engine, 3)
+    assert engine.pool.checkedin() == 3
+    assert len(engine._compiled_cache) > 5
@@ -0,0 +1,56 @@
+import pytest
+
+from app.config import settings
+from app.main import app
+
+URLS = [
+    "/perfumes?limit=100",
+    "/perfumes?sort_by=brand&order=desc&limit=3",
+    "/perfumes?q=fast&pagination=cursor&limit=1&sort_by=name",
+    "/purchases?limit=100",
+    "/purchases?pagination=cursor&limit=2",
+]
+
+@pytest.fixture
+def seeded(client):
+    perfume_id = client.post(
+        "/perfumes",
+        json={"name": "Fast Lane", "brand": "Orjson", "concentration": "PARFUM", "season": "WINTER"}
+    ).json()["id"]
+    for day, price in ((1, 120), (2, 99.5), (3, 10)):
+        client.post(
+            "/purchases",
+            json={"perfume_id": perfume_id, "date": f"2026-02-0{day}", "price": price, "store": "Fast", "ml": 10}
+        )
+    return client
+
+def fetch(client, url, fast, monkeypatch):
+    monkeypatch.setattr(settings, "FAST_JSON_LISTS", fast)
+    # bypass the response cache so each path really renders
+    app.state.response_cache.clear()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    return response.json()
+
+@pytest.mark.parametrize("url", URLS)
+def test_fast_path_matches_response_model(seeded, monkeypatch, url):
+    assert fetch(seeded, url, True, monkeypatch) == fetch(seeded, url, False, monkeypatch)
+
+def test_fast_path_keeps_openapi(client, monkeypatch):
+    monkeypatch.setattr(settings, "FAST_JSON_LISTS", True)
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"]["/perfumes"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert response["$ref"].endswith("PaginatedResponse_PerfumeRead_")
+
+def test_async_fast_path(async_client, monkeypatch):
+    async_client.post(
+        "/perfumes",
+        json={"name": "Async Fast", "brand": "Orjson", "concentration": "EDT", "season": "ALL"}
+    )
+    monkeypatch.setattr(settings, "FAST_JSON_LISTS", True)
+    fast = async_client.get("/perfumes?q=orjson&pagination=cursor").json()
+    monkeypatch.setattr(settings, "FAST_JSON_LISTS", False)
+    async_client.app.state.response_cache.clear()
+    slow = async_client.get("/perfumes?q=orjson&pagination=cursor").json()
+    assert fast == slow
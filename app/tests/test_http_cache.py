@@ -0,0 +1,72 @@
+from app.cache import LRUCache
+from app.main import app
+
+def new_perfume(client, name):
+    response = client.post(
+        "/perfumes",
+        json={"name": name, "brand": "Etag House", "concentration": "EDT", "season": "ALL"}
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+def test_conditional_get_skips_the_database(client, captured_sql):
+    new_perfume(client, "Etag One")
+    first = client.get("/perfumes?brand=Etag House")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    captured_sql.clear()
+    not_modified = client.get("/perfumes?brand=Etag House", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert captured_sql == []
+
+    hits = app.state.response_cache.hits
+    repeat = client.get("/perfumes?brand=Etag House")
+    assert repeat.content == first.content
+    assert repeat.headers["etag"] == etag
+    assert app.state.response_cache.hits == hits + 1
+    assert captured_sql == []
+
+    assert client.get("/perfumes?brand=Etag House&limit=5").headers["etag"] != etag
+    assert client.get("/perfumes?limit=10&brand=Etag House").headers["etag"] == \
+        client.get("/perfumes?brand=Etag House&limit=10").headers["etag"]
+
+def test_writes_change_the_etag(client):
+    perfume_id = new_perfume(client, "Etag Two")
+    before = client.get("/purchases?limit=100").headers["etag"]
+
+    response = client.post(
+        "/purchases",
+        json={"perfume_id": perfume_id, "date": "2026-03-01", "price": 80, "store": "Etag", "ml": 30}
+    )
+    purchase_id = response.json()["id"]
+    after_create = client.get("/purchases?limit=100", headers={"If-None-Match": before})
+    assert after_create.status_code == 200
+    assert purchase_id in [p["id"] for p in after_create.json()["items"]]
+
+    spending = client.get("/stats/spending").headers["etag"]
+    assert client.delete(f"/purchases/{purchase_id}").status_code == 204
+    assert client.get("/stats/spending", headers={"If-None-Match": spending}).status_code == 200
+    listed = client.get("/purchases?limit=100", headers={"If-None-Match": after_create.headers["etag"]})
+    assert listed.status_code == 200
+    assert purchase_id not in [p["id"] for p in listed.json()["items"]]
+
+    etag = client.get("/perfumes").headers["etag"]
+    body = '{"name": "Etag Bulk", "brand": "Etag House", "concentration": "EDP", "season": "ALL"}'
+    client.post("/perfumes/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert client.get("/perfumes", headers={"If-None-Match": etag}).status_code == 200
+
+def test_lru_cache_memory_cap():
+    cache = LRUCache(maxsize=100, maxbytes=10, weigh=len)
+    cache.set("a", b"xxxx")
+    cache.set("b", b"xxxx")
+    cache.set("c", b"xxxx")
+    assert cache.get("a") is None
+    assert cache.get("c") == b"xxxx"
+    assert cache.bytes == 8
+    cache.set("c", b"x")
+    assert cache.bytes == 5
+    cache.invalidate("b")
+    assert cache.stats()["bytes"] == 1
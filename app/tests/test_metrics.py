@@ -0,0 +1,80 @@
+import re
+import threading
+import time
+
+from app.config import settings
+from app.main import app
+from app.metrics import SamplingProfiler
+
+def test_server_timing_and_metrics(client, monkeypatch):
+    app.state.response_cache.clear()
+    response = client.get("/perfumes?limit=13")
+    assert response.status_code == 200
+
+    timing = response.headers["server-timing"]
+    match = re.fullmatch(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="(\d+) queries, (\d+) rows"', timing)
+    assert match, timing
+    # the COUNT and the page, plus the principal lookup unless the user cache already had it
+    assert int(match.group(1)) >= 2
+    assert int(match.group(2)) >= min(len(response.json()["items"]) + 1, 2)
+
+    assert client.get("/metrics").status_code == 404
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scraper")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    metrics = client.get("/metrics", headers={"Authorization": "Bearer scraper"})
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    labels = 'method="GET",route="/perfumes",status="200"'
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}' in metrics.text
+    assert f"http_request_db_seconds_count{{{labels}}}" in metrics.text
+    assert f"http_request_sql_statements_sum{{{labels}}}" in metrics.text
+    assert f"http_request_rows_fetched_total{{{labels}}}" in metrics.text
+    assert "/openapi.json" not in client.get("/openapi.json").json()["paths"]
+    assert "/metrics" not in client.get("/openapi.json").json()["paths"]
+
+def test_cached_responses_keep_their_route_label(client, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scraper")
+    app.state.response_cache.clear()
+    first = client.get("/perfumes?limit=7")
+    client.get("/perfumes?limit=7")
+    assert client.get("/perfumes?limit=7", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+
+    metrics = client.get("/metrics", headers={"Authorization": "Bearer scraper"}).text
+    assert 'http_request_duration_seconds_count{method="GET",route="/perfumes",status="304"}' in metrics
+    assert 'route="unmatched",status="200"' not in metrics
+    assert 'route="unmatched",status="304"' not in metrics
+
+def test_profile_header_is_admin_only(client, admin_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+
+    assert "x-profile-file" not in client.get("/perfumes/export", headers={"X-Profile": "1"}).headers
+
+    response = client.get("/admin/perfumes?limit=50", headers={**admin_headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    path = response.headers["x-profile-file"]
+    assert path.startswith(str(tmp_path))
+    with open(path) as f:
+        dump = f.read()
+    assert re.search(r"^\S.* \d+$", dump, re.MULTILINE)
+
+def test_profiler_samples_only_the_requests_threads():
+    stop = threading.Event()
+    def unrelated_work():
+        while not stop.is_set():
+            sum(range(1000))
+    other = threading.Thread(target=unrelated_work)
+    other.start()
+
+    profiler = SamplingProfiler()
+    profiler.track()
+    profiler.start()
+    deadline = time.monotonic() + 0.05
+    while time.monotonic() < deadline:
+        sum(range(1000))
+    profiler.stop()
+    stop.set()
+    other.join()
+
+    dump = profiler.collapsed()
+    assert "test_profiler_samples_only_the_requests_threads" in dump
+    assert "unrelated_work" not in dump
@@ -1,6 +1,71 @@
+from app.tests.conftest import login_headers
+
 def test_pagination_limit(client):
     response = client.get("/perfumes?limit=1")
     assert response.status_code == 200
 
     data = response.json()
     assert len(data["items"]) <= 1
+
+def test_cursor_pagination_walks_all_pages(client):
+    for name in ["Aventus", "Sauvage", "Oud Wood", "Santal 33"]:
+        client.post(
+            "/perfumes",
+            json={"name": name, "brand": "Cursor Co", "concentration": "EDP", "season": "ALL"}
+        )
+
+    expected = client.get("/perfumes?brand=Cursor Co&sort_by=name&order=desc&limit=100").json()
+    seen = []
+    response = client.get("/perfumes?brand=Cursor Co&sort_by=name&order=desc&limit=1&pagination=cursor")
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total"] == expected["total"]
+        seen.extend(p["name"] for p in data["items"])
+        if data["next_cursor"] is None:
+            break
+        response = client.get(
+            "/perfumes",
+            params={"brand": "Cursor Co", "sort_by": "name", "order": "desc", "limit": 1, "cursor": data["next_cursor"]}
+        )
+
+    assert seen == [p["name"] for p in expected["items"]]
+
+def test_cursor_rejects_tampered_token(client):
+    data = client.get("/purchases?limit=1&pagination=cursor&include_total=false").json()
+    assert data["total"] is None
+
+    response = client.get("/perfumes?limit=1&pagination=cursor").json()
+    token = response["next_cursor"]
+    assert token is not None
+
+    assert client.get("/perfumes", params={"cursor": token[:-2] + "xx"}).status_code == 400
+    assert client.get("/perfumes", params={"cursor": token, "sort_by": "brand"}).status_code == 400
+
+def test_cursor_is_bound_to_its_filters(client):
+    for name in ["Bound One", "Bound Two"]:
+        client.post("/perfumes", json={"name": name, "brand": "Bound Co", "concentration": "EDT", "season": "ALL"})
+    token = client.get("/perfumes?brand=Bound Co&limit=1&pagination=cursor").json()["next_cursor"]
+
+    assert client.get("/perfumes", params={"brand": "Bound Co", "cursor": token}).status_code == 200
+    for filters in ({}, {"brand": "Other Co"}, {"brand": "Bound Co", "season": "WINTER"}):
+        response = client.get("/perfumes", params={**filters, "cursor": token})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Cursor does not match the requested filters"
+
+    perfume_id = client.get("/perfumes?brand=Bound Co").json()["items"][0]["id"]
+    for price in (5, 6):
+        client.post("/purchases", json={"perfume_id": perfume_id, "date": "2025-07-01", "price": price, "store": "x"})
+    token = client.get("/purchases?min_price=1&limit=1&pagination=cursor").json()["next_cursor"]
+    assert client.get("/purchases", params={"min_price": 1, "cursor": token}).status_code == 200
+    assert client.get("/purchases", params={"min_price": 2, "cursor": token}).status_code == 400
+
+def test_cursor_is_bound_to_its_user(client):
+    for name in ["Mine One", "Mine Two"]:
+        client.post("/perfumes", json={"name": name, "brand": "Mine Co", "concentration": "EDT", "season": "ALL"})
+    token = client.get("/perfumes?brand=Mine Co&limit=1&pagination=cursor").json()["next_cursor"]
+
+    client.post("/auth/register", json={"username": "cursor_thief", "email": "thief@example.com", "password": "secret123"})
+    response = client.get("/perfumes", params={"brand": "Mine Co", "cursor": token}, headers=login_headers(client, "cursor_thief"))
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cursor was issued for another user"
@@ -1,3 +1,10 @@
+import json
+
+import pytest
+
+from app import search
+from app.tests.conftest import TestingSessionLocal, login_headers
+
 def test_create_perfume(client):
     response = client.post(
         "/perfumes",
@@ -22,3 +29,69 @@ def test_list_perfumes(client):
     data = response.json()
     assert "items" in data
     assert isinstance(data["items"], list)
+
+def test_bulk_import_perfumes_ndjson(client):
+    body = "\n".join([
+        json.dumps({"name": "Bulk One", "brand": "Bulk Co", "concentration": "EDT", "season": "SUMMER"}),
+        json.dumps({"name": "Bulk Two", "brand": "Bulk Co", "concentration": "NOPE", "season": "SUMMER"}),
+        "{not json",
+        json.dumps({"name": "Bulk Three", "brand": "Bulk Co", "concentration": "EDP", "season": "ALL"}),
+    ])
+    response = client.post("/perfumes/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["inserted"] == 2
+    assert data["failed"] == 2
+    assert [error["row"] for error in data["errors"]] == [2, 3]
+    assert "concentration" in data["errors"][0]["error"]
+
+    listed = client.get("/perfumes?brand=Bulk Co").json()
+    assert listed["total"] == 2
+
+# a misspelt query costs a prefix check, a correction lookup and a second search on top of the usual budget
+@pytest.mark.max_queries(10)
+def test_search_perfumes(client):
+    for name, brand, season in [
+        ("Zephyrine", "Maison Vellum", "ALL"),
+        ("Zephyrine Cologne", "Maison Vellum", "SUMMER"),
+        ("Ombré Élixir", "Vellum", "WINTER"),
+        ("Vellum Noir", "Atelier Rose", "ALL"),
+    ]:
+        client.post("/perfumes", json={"name": name, "brand": brand, "concentration": "EDP", "season": season})
+
+    def names(url):
+        response = client.get(url)
+        assert response.status_code == 200
+        return [p["name"] for p in response.json()["items"]]
+
+    assert names("/perfumes?q=zephyrine") == ["Zephyrine", "Zephyrine Cologne"]
+    assert names("/perfumes?q=zeph col") == ["Zephyrine Cologne"]
+    assert names("/perfumes?q=zephyirne maison") == ["Zephyrine", "Zephyrine Cologne"]
+    assert names("/perfumes?q=elixir") == ["Ombré Élixir"]
+    # a name hit ranks above brand-only hits
+    assert names("/perfumes?q=vellum")[0] == "Vellum Noir"
+    assert names("/perfumes?q=vellum&season=SUMMER") == ["Zephyrine Cologne"]
+    assert names("/perfumes?q=vellum&sort_by=name&order=desc") == [
+        "Zephyrine Cologne", "Zephyrine", "Vellum Noir", "Ombré Élixir"
+    ]
+    # keyset pages can't resume a relevance order, only an explicit sort
+    assert client.get("/perfumes?q=vellum&pagination=cursor&limit=1").status_code == 400
+    assert names("/perfumes?q=vellum&pagination=cursor&limit=1&sort_by=name") == ["Ombré Élixir"]
+    assert names("/perfumes?q=nothing+like+this") == []
+    assert client.get("/perfumes?q=vellum").json()["total"] == 4
+
+def test_search_corrections_only_read_the_users_perfumes(client, monkeypatch):
+    client.post("/perfumes", json={"name": "Quillonaire", "brand": "Quill", "concentration": "EDP", "season": "ALL"})
+    client.post("/auth/register", json={"username": "speller", "email": "speller@example.com", "password": "secret123"})
+    owner_id = client.get("/auth/me").json()["id"]
+    other_id = client.get("/auth/me", headers=login_headers(client, "speller")).json()["id"]
+
+    db = TestingSessionLocal()
+    try:
+        assert search._corrections(db, owner_id, "quilonaire") == ["quillonaire"]
+        assert search._corrections(db, other_id, "quilonaire") == []
+        monkeypatch.setattr(search, "FUZZY_CANDIDATE_ROWS", 0)
+        assert search._corrections(db, owner_id, "quilonaire") == []
+    finally:
+        db.close()
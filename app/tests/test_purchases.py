@@ -1,3 +1,30 @@
+import io
+import json
+import threading
+from datetime import date
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app import group_commit
+from app.config import settings
+from app.export import ParquetEncoder, purchase_export_query
+from app.group_commit import GroupCommitWriter
+from app.tests.conftest import TestingSessionLocal, login_headers
+
+def collector(client, username):
+    client.post(
+        "/auth/register",
+        json={"username": username, "email": f"{username}@example.com", "password": "secret123"}
+    )
+    headers = login_headers(client, username)
+    perfume_id = client.post(
+        "/perfumes",
+        json={"name": "Bois", "brand": "Queue House", "concentration": "EDT", "season": "ALL"},
+        headers=headers
+    ).json()["id"]
+    return headers, perfume_id
+
 def test_create_purchase(client):
     response = client.post(
         "/purchases",
@@ -25,3 +52,138 @@ def test_purchase_invalid_perfume(client):
     )
 
     assert response.status_code == 404
+
+def test_bulk_import_purchases_csv(client):
+    client.post(
+        "/auth/register",
+        json={"username": "importer", "email": "importer@example.com", "password": "secret123"}
+    )
+    headers = login_headers(client, "importer")
+    perfume_id = client.post(
+        "/perfumes",
+        json={"name": "Grand Soir", "brand": "MFK", "concentration": "EDP", "season": "WINTER"},
+        headers=headers
+    ).json()["id"]
+
+    body = "\n".join([
+        "perfume_id,date,price,store,ml",
+        f"{perfume_id},2026-03-01,120.5,Store A,70",
+        f"{perfume_id},2026-03-05,80,Store B,",
+        "1,2026-03-06,10,Not mine,50",
+        f"{perfume_id},not-a-date,10,Store C,50",
+    ])
+    response = client.post(
+        "/purchases/bulk",
+        content=body,
+        headers={**headers, "Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["inserted"] == 2
+    assert sorted(error["row"] for error in data["errors"]) == [3, 4]
+    assert data["rows_per_second"] > 0
+
+    listed = client.get("/purchases", headers=headers).json()
+    assert sorted(p["ml"] for p in listed["items"]) == [70, 100]
+    stats = client.get("/stats/spending", headers=headers).json()
+    assert stats == {"total_spent": 200.5, "total_purchases": 2, "average_price": 100.25}
+
+def test_bulk_import_requires_format(client):
+    response = client.post("/purchases/bulk", content="x", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 415
+
+def exporter(client, username):
+    client.post(
+        "/auth/register",
+        json={"username": username, "email": f"{username}@example.com", "password": "secret123"}
+    )
+    headers = login_headers(client, username)
+    perfume_id = client.post(
+        "/perfumes",
+        json={"name": "Grand Soir", "brand": "MFK", "concentration": "EDP", "season": "WINTER"},
+        headers=headers
+    ).json()["id"]
+    for day, price, store, ml in (("2026-03-01", 120.5, "Store A", 70), ("2026-03-05", 80, "Store B", None)):
+        purchase = {"perfume_id": perfume_id, "date": day, "price": price, "store": store}
+        client.post("/purchases", json={**purchase, "ml": ml} if ml else purchase, headers=headers)
+    return headers
+
+def test_export_purchases_streams_all_rows(client):
+    headers = exporter(client, "exporter")
+
+    response = client.get("/purchases/export?with_perfume=true", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["price"] for row in rows] == [120.5, 80.0]
+    assert rows[0]["perfume_name"] == "Grand Soir"
+    assert rows[0]["concentration"] == "EDP"
+    assert rows[0]["date"] == "2026-03-01"
+
+    response = client.get("/purchases/export?format=csv", headers=headers)
+    lines = response.text.splitlines()
+    assert lines[0] == "id,perfume_id,date,price,store,ml"
+    assert len(lines) == 3
+
+def test_export_purchases_parquet(client):
+    pq = pytest.importorskip("pyarrow.parquet")
+    headers = exporter(client, "parquet_exporter")
+
+    response = client.get("/purchases/export?format=parquet", headers=headers)
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.column("price").to_pylist() == [120.5, 80.0]
+
+def test_parquet_schema_does_not_depend_on_the_first_batch():
+    pq = pytest.importorskip("pyarrow.parquet")
+    encoder = ParquetEncoder(purchase_export_query(1).selected_columns)
+    # all None in the first row group, which inference would type as null
+    data = encoder.encode([(1, 1, date(2026, 1, 1), 10.0, None, None)])
+    data += encoder.encode([(2, 1, date(2026, 1, 2), 12.5, "Shop", 50)])
+    data += encoder.finish()
+
+    table = pq.read_table(io.BytesIO(data))
+    assert table.column("store").to_pylist() == [None, "Shop"]
+    assert table.column("ml").to_pylist() == [None, 50]
+    assert pq.read_table(io.BytesIO(ParquetEncoder(purchase_export_query(1).selected_columns).finish())).num_rows == 0
+
+def test_group_commit_batches_and_isolates_failures(client):
+    headers, perfume_id = collector(client, "grouped")
+    user_id = client.get("/auth/me", headers=headers).json()["id"]
+    row = {"perfume_id": perfume_id, "user_id": user_id, "date": date(2026, 4, 1), "price": 10.0, "store": "x", "ml": 50}
+
+    # the first commit waits until everything is queued, so the rest has to share one transaction
+    gate = threading.Event()
+    def session_factory():
+        gate.wait()
+        return TestingSessionLocal()
+
+    writer = GroupCommitWriter(session_factory, max_delay=0, max_rows=10)
+    futures = [writer.submit(row) for _ in range(4)]
+    gate.set()
+    assert [f.result().price for f in futures] == [10.0] * 4
+    assert len({f.result().id for f in futures}) == 4
+    assert writer.stats()["batches"] <= 2
+
+    futures = [writer.submit(row), writer.submit({**row, "price": None}), writer.submit(row)]
+    writer.stop()
+    assert futures[0].result().price == futures[2].result().price == 10.0
+    with pytest.raises(IntegrityError):
+        futures[1].result()
+
+def test_create_purchase_with_group_commit(client, monkeypatch):
+    headers, perfume_id = collector(client, "queued")
+    writer = GroupCommitWriter(TestingSessionLocal, max_delay=0.001, max_rows=100)
+    monkeypatch.setattr(group_commit, "purchase_writer", writer)
+    monkeypatch.setattr(settings, "GROUP_COMMIT_ENABLED", True)
+
+    response = client.post(
+        "/purchases",
+        json={"perfume_id": perfume_id, "date": "2026-04-02", "price": 25, "store": "Queue"},
+        headers=headers
+    )
+    writer.stop()
+    assert response.status_code == 201
+    assert response.json()["store"] == "Queue"
+    assert client.get(f"/purchases/{response.json()['id']}", headers=headers).status_code == 200
+    assert client.get("/stats/spending", headers=headers).json()["total_spent"] == 25
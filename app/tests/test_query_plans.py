@@ -0,0 +1,41 @@
+import re
+
+import pytest
+
+from app.tests.conftest import engine
+
+pytestmark = pytest.mark.skipif(engine.dialect.name != "sqlite", reason="reads SQLite query plans")
+
+HOT_ENDPOINTS = [
+    "/perfumes?limit=5",
+    "/perfumes?sort_by=name&limit=5",
+    "/perfumes?sort_by=brand&order=desc&limit=5",
+    "/perfumes?sort_by=name&pagination=cursor&limit=5",
+    "/perfumes?q=chanel&limit=5",
+    "/purchases?start_date=2025-01-01&end_date=2026-12-31",
+    "/purchases?min_price=10&max_price=500",
+    "/stats/spending",
+    "/stats/spending?start_date=2025-01-15&end_date=2026-06-30",
+    "/stats/most_expensive",
+]
+
+TABLES = ("perfumes", "purchases", "user_spending", "user_monthly_spending")
+FULL_SCAN = re.compile(rf"^SCAN ({'|'.join(TABLES)})$")
+
+def query_plan(statement, parameters):
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [row[-1] for row in rows]
+
+@pytest.mark.parametrize("url", HOT_ENDPOINTS)
+def test_hot_endpoints_use_indexes(client, captured_sql, url):
+    assert client.get(url).status_code == 200
+
+    statements = [(s, p) for s, p in captured_sql if any(table in s for table in TABLES)]
+    assert statements
+
+    for statement, parameters in statements:
+        plan = query_plan(statement, parameters)
+        assert not any(FULL_SCAN.match(step) for step in plan), (statement, plan)
+        if "ORDER BY" in statement and "sort_by" in url:
+            assert not any("TEMP B-TREE FOR ORDER BY" in step for step in plan), (statement, plan)
@@ -0,0 +1,50 @@
+import pytest
+
+from app import rate_limit
+from app.config import settings
+from app.rate_limit import MemoryRateStore, parse_rate
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "rate_store", MemoryRateStore())
+    return monkeypatch
+
+def test_token_bucket_allows_bursts_then_refills():
+    store = MemoryRateStore(maxsize=2)
+    rate = parse_rate("3/second")
+    assert [store.take("a", rate, 100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert store.take("a", rate, 100.0) == pytest.approx(1 / 3)
+    assert store.take("a", rate, 100.0 + 1 / 3) == 0.0
+    assert store.take("b", rate, 100.0) == 0.0
+
+    store.take("c", rate, 100.0)
+    assert "a" not in store._tats
+
+    with pytest.raises(ValueError):
+        parse_rate("3/fortnight")
+
+def test_rate_limit_per_ip_and_per_user(client, limits):
+    limits.setitem(settings.RATE_LIMITS, "auth", "2/minute")
+    anonymous = {"Authorization": ""}
+    form = {"username": "nobody", "password": "wrong"}
+    assert client.post("/auth/login", data=form, headers=anonymous).status_code == 401
+    assert client.post("/auth/login", data=form, headers=anonymous).status_code == 401
+    limited = client.post("/auth/login", data=form, headers=anonymous)
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+
+    # the signed-in user has a bucket of their own
+    assert client.get("/auth/me").status_code == 200
+
+def test_concurrency_limit_rejects_instead_of_queueing(client, limits):
+    limits.setitem(settings.CONCURRENCY_LIMITS, "stats", 1)
+    assert rate_limit.concurrency.acquire("stats", 1)
+    try:
+        busy = client.get("/stats/most_expensive?num=17")
+        assert busy.status_code == 503
+        assert busy.headers["retry-after"] == str(settings.CONCURRENCY_RETRY_AFTER_SECONDS)
+    finally:
+        rate_limit.concurrency.release("stats")
+    assert client.get("/stats/most_expensive?num=17").status_code == 200
+    assert rate_limit.concurrency.in_flight["stats"] == 0
@@ -0,0 +1,154 @@
+import threading
+import time
+
+from app import auth, main
+from app.http_cache import DataVersions, data_versions
+from app.leaderboards import Leaderboards
+from app.models import User
+from app.shared_cache import MemoryBackend, RedisBackend, SharedVersions
+from app.snapshots import Snapshot
+from app.tests.conftest import TestingSessionLocal
+
+class LocalRedis:
+    # the slice of redis-py's client the backend uses, kept in a dict
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def incr(self, key, amount=1):
+        value = int(self.data.get(key, b"0")) + amount
+        self.data[key] = str(value).encode()
+        return value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+class DownRedis(LocalRedis):
+    def mget(self, *args):
+        raise ConnectionError("connection refused")
+
+    incr = mget
+
+def test_workers_share_versions_through_the_backend():
+    server = LocalRedis()
+    first, second = DataVersions(RedisBackend(server)), DataVersions(RedisBackend(server))
+    assert first.epoch == second.epoch
+
+    first.bump([7])
+    assert second.get(7)[0] == 1
+    assert second.get(7)[1] > 0
+    assert second.get(8) == (0, 0.0)
+
+    separate = DataVersions(MemoryBackend())
+    assert separate.epoch != first.epoch
+    assert separate.get(7) == (0, 0.0)
+
+def test_unreachable_backend_skips_the_cache(client, monkeypatch):
+    monkeypatch.setattr(data_versions, "backend", RedisBackend(DownRedis()))
+    listed = client.get("/perfumes?brand=Backend Down")
+    assert listed.status_code == 200
+    assert "etag" not in listed.headers
+
+    created = client.post(
+        "/perfumes",
+        json={"name": "Still Saved", "brand": "Backend Down", "concentration": "EDT", "season": "ALL"}
+    )
+    assert created.status_code == 201
+    assert client.get("/perfumes?brand=Backend Down").json()["total"] == 1
+
+def test_response_cache_needs_shared_versions_for_several_workers(monkeypatch):
+    monkeypatch.setattr(main.settings, "WEB_CONCURRENCY", 2)
+    assert not hasattr(main.create_app().state, "response_cache")
+
+    monkeypatch.setattr(data_versions, "backend", RedisBackend(LocalRedis()))
+    assert hasattr(main.create_app().state, "response_cache")
+
+def test_leaderboards_reseed_after_another_workers_write(client, monkeypatch):
+    server = LocalRedis()
+    first = Leaderboards(SharedVersions("leaderboards", RedisBackend(server)))
+    second = Leaderboards(SharedVersions("leaderboards", RedisBackend(server)))
+    db = TestingSessionLocal()
+    try:
+        first.seed(db)
+        second.seed(db)
+        first.apply([("perfume", 1, 1)])
+        # the writer applied its own commit and is still current; the other worker reseeds
+        assert first._current() and first.version == 1
+        assert not second._current()
+        second.ensure_seeded(db)
+        assert second._current() and second.version == 1
+
+        alone = Leaderboards(SharedVersions("leaderboards", MemoryBackend()))
+        alone.seed(db)
+        assert alone._current()
+        monkeypatch.setattr(main.settings, "WEB_CONCURRENCY", 2)
+        monkeypatch.setattr(main.settings, "LEADERBOARD_MAX_AGE_SECONDS", 0)
+        assert not alone._current()
+    finally:
+        db.close()
+
+def test_user_cache_drops_users_changed_by_another_worker(client, monkeypatch):
+    server = LocalRedis()
+    monkeypatch.setattr(auth, "user_versions", SharedVersions("principal", RedisBackend(server)))
+    auth.user_cache.invalidate("tester")
+    assert client.get("/auth/me").status_code == 200
+    assert auth._cached_user("tester")[1] is not None
+
+    SharedVersions("principal", RedisBackend(server)).bump("tester")
+    assert auth._cached_user("tester") == (1, None)
+
+    client.post("/auth/register", json={"username": "relocated", "email": "relocated@example.com", "password": "secret123"})
+    db = TestingSessionLocal()
+    try:
+        user = db.query(User).filter(User.username == "relocated").one()
+        user.email = "moved@example.com"
+        db.commit()
+    finally:
+        db.close()
+    assert auth.user_versions.get("relocated") == 1
+
+def test_dashboard_counts_writes_from_every_worker():
+    server = LocalRedis()
+    first = Snapshot(lambda db, now: now, write_threshold=3,
+                     shared_writes=SharedVersions("dashboard_writes", RedisBackend(server)))
+    second = Snapshot(lambda db, now: now, write_threshold=3,
+                      shared_writes=SharedVersions("dashboard_writes", RedisBackend(server)))
+    first.refresh(None)
+    second.refresh(None)
+    first.record_write(3)
+    assert second.is_stale()
+    second.refresh(None)
+    assert not second.is_stale()
+
+class SlowRedis(LocalRedis):
+    # a round trip long enough for other threads to bump in between
+    def incr(self, key, amount=1):
+        value = super().incr(key, amount)
+        time.sleep(0.002)
+        return value
+
+def test_concurrent_commits_in_one_worker_keep_its_leaderboards(client):
+    server = SlowRedis()
+    worker = Leaderboards(SharedVersions("leaderboards", RedisBackend(server)))
+    db = TestingSessionLocal()
+    try:
+        worker.seed(db)
+    finally:
+        db.close()
+    commits = [threading.Thread(target=worker.apply, args=([("perfume", 1, 1)],)) for _ in range(20)]
+    for commit in commits:
+        commit.start()
+    for commit in commits:
+        commit.join()
+    assert worker.seeded and worker.version == 20
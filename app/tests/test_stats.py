@@ -1,3 +1,7 @@
+from app.models import UserMonthlySpending
+from app.rollups import rebuild_rollups
+from app.tests.conftest import TestingSessionLocal, login_headers
+
 def test_spending_stats(client):
     response = client.get("/stats/spending")
     assert response.status_code == 200
@@ -5,3 +9,110 @@ def test_spending_stats(client):
     data = response.json()
     assert "total_spent" in data
     assert "total_purchases" in data
+
+def test_spending_rollups_match_raw_purchases(client):
+    client.post(
+        "/auth/register",
+        json={"username": "spender", "email": "spender@example.com", "password": "secret123"}
+    )
+    headers = login_headers(client, "spender")
+    perfume_id = client.post(
+        "/perfumes",
+        json={"name": "Tobacco Vanille", "brand": "Tom Ford", "concentration": "EDP", "season": "WINTER"},
+        headers=headers
+    ).json()["id"]
+
+    purchases = [("2025-01-10", 100), ("2025-01-31", 50), ("2025-02-14", 75), ("2025-03-01", 20), ("2025-03-20", 5)]
+    ids = [
+        client.post(
+            "/purchases",
+            json={"perfume_id": perfume_id, "date": day, "price": price, "store": "Store"},
+            headers=headers
+        ).json()["id"]
+        for day, price in purchases
+    ]
+    client.delete(f"/purchases/{ids[-1]}", headers=headers)
+    purchases.pop()
+
+    ranges = [(None, None), ("2025-01-15", None), (None, "2025-02-28"), ("2025-01-11", "2025-03-01"),
+              ("2025-02-01", "2025-02-28"), ("2025-03-02", "2025-03-31")]
+    for start, end in ranges:
+        expected = [price for day, price in purchases if (not start or day >= start) and (not end or day <= end)]
+        params = {k: v for k, v in {"start_date": start, "end_date": end}.items() if v}
+        data = client.get("/stats/spending", params=params, headers=headers).json()
+        assert data["total_spent"] == sum(expected), (start, end)
+        assert data["total_purchases"] == len(expected), (start, end)
+
+    db = TestingSessionLocal()
+    before = db.query(UserMonthlySpending).order_by(UserMonthlySpending.user_id, UserMonthlySpending.month).all()
+    before = [(r.user_id, r.month, r.total_spent, r.purchase_count) for r in before if r.purchase_count]
+    rebuild_rollups(db)
+    after = db.query(UserMonthlySpending).order_by(UserMonthlySpending.user_id, UserMonthlySpending.month).all()
+    assert before == [(r.user_id, r.month, r.total_spent, r.purchase_count) for r in after]
+    db.rollback()
+    db.close()
+
+def test_spending_timeseries_and_breakdowns(client):
+    client.post(
+        "/auth/register",
+        json={"username": "analyst", "email": "analyst@example.com", "password": "secret123"}
+    )
+    headers = login_headers(client, "analyst")
+    perfumes = [
+        {"name": "Aventus", "brand": "Creed", "concentration": "EDP", "season": "SUMMER"},
+        {"name": "Sauvage", "brand": "Dior", "concentration": "EDT", "season": "ALL"},
+    ]
+    aventus, sauvage = [client.post("/perfumes", json=p, headers=headers).json()["id"] for p in perfumes]
+    purchases = [
+        (aventus, "2025-01-06", 300, 100, "Boutique"),
+        (aventus, "2025-01-12", 150, 50, "Online"),
+        (sauvage, "2025-03-03", 90, 100, "Online"),
+    ]
+    for perfume_id, day, price, ml, store in purchases:
+        client.post(
+            "/purchases",
+            json={"perfume_id": perfume_id, "date": day, "price": price, "store": store, "ml": ml},
+            headers=headers
+        )
+
+    monthly = client.get("/stats/timeseries", headers=headers).json()
+    assert monthly["bucket"] == "month"
+    assert monthly["points"] == [
+        {"period": "2025-01-01", "purchases": 2, "total_spent": 450.0},
+        {"period": "2025-02-01", "purchases": 0, "total_spent": 0.0},
+        {"period": "2025-03-01", "purchases": 1, "total_spent": 90.0},
+    ]
+    weekly = client.get("/stats/timeseries", params={"bucket": "week", "end_date": "2025-01-31"}, headers=headers)
+    assert weekly.json()["points"] == [{"period": "2025-01-06", "purchases": 2, "total_spent": 450.0}]
+    assert client.get("/stats/timeseries", params={"bucket": "year"}, headers=headers).status_code == 422
+
+    data = client.get("/stats/breakdowns", headers=headers).json()
+    assert [(row["key"], row["total_spent"]) for row in data["brand"]] == [("Creed", 450.0), ("Dior", 90.0)]
+    assert [(row["key"], row["purchases"]) for row in data["store"]] == [("Boutique", 1), ("Online", 2)]
+    assert [row["key"] for row in data["season"]] == ["SUMMER", "ALL"]
+    assert data["brand"][0]["price_per_ml"] == 3.0
+    assert [(row["key"], row["purchases"]) for row in data["price_per_ml"]] == [("0.5-1", 1), ("3-5", 2)]
+
+    filtered = client.get("/stats/breakdowns", params={"start_date": "2025-02-01"}, headers=headers).json()
+    assert [row["key"] for row in filtered["brand"]] == ["Dior"]
+
+    # a new purchase bumps the data version, so the cached frame is not reused
+    client.post(
+        "/purchases",
+        json={"perfume_id": sauvage, "date": "2025-02-10", "price": 10, "store": "Online"},
+        headers=headers
+    )
+    points = client.get("/stats/timeseries", headers=headers).json()["points"]
+    assert points[1] == {"period": "2025-02-01", "purchases": 1, "total_spent": 10.0}
+
+    # a far-off date would otherwise mean millions of empty day buckets
+    client.post(
+        "/purchases",
+        json={"perfume_id": sauvage, "date": "9999-12-31", "price": 1, "store": "Typo"},
+        headers=headers
+    )
+    too_wide = client.get("/stats/timeseries", params={"bucket": "day"}, headers=headers)
+    assert too_wide.status_code == 422
+    assert "buckets requested" in too_wide.json()["detail"]
+    bounded = client.get("/stats/timeseries", params={"bucket": "day", "end_date": "2025-12-31"}, headers=headers)
+    assert bounded.status_code == 200
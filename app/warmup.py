@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from datetime import date
+from typing import List
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+from app.auth import hash_pool
+from app.config import settings
+from app.database import async_engine, async_read_engine, engine, read_engine
+from app.hashing import load_crypt_context
+from app.models import User
+from app.pagination import count_statement
+from app.routers.perfumes import perfumes_query
+from app.routers.purchases import purchases_query
+from app.routers.stats import most_expensive_query, spending_query
+
+logger = logging.getLogger(__name__)
+
+# matches no rows, so the statements compile and run without reading data
+NO_USER = 0
+
+def hot_statements() -> List:
+    # SQLAlchemy caches compiled SQL per engine keyed on statement shape, not values,
+    # so running each shape once spares the first real requests the compile step
+    perfumes = perfumes_query(NO_USER)
+    purchases = purchases_query(NO_USER)
+    today = date.today()
+    return [
+        select(User).where(User.username == "").limit(1),
+        count_statement(perfumes),
+        perfumes.offset(0).limit(10),
+        count_statement(purchases),
+        purchases.offset(0).limit(10),
+        most_expensive_query(NO_USER, 5),
+        *spending_query(NO_USER),
+        *spending_query(NO_USER, today.replace(day=1), today),
+    ]
+
+def warm_engine(
+        engine: Engine,
+        connections: int
+        ) -> None:
+    # connections are held until all are open, otherwise the pool would hand back the same one
+    held = [engine.connect() for _ in range(connections)]
+    try:
+        for conn in held:
+            conn.execute(text("SELECT 1"))
+        with Session(bind=held[0]) as db:
+            for stmt in hot_statements():
+                db.execute(stmt).all()
+    finally:
+        for conn in held:
+            conn.close()
+
+async def warm_async_engine(
+        engine: AsyncEngine,
+        connections: int
+        ) -> None:
+    held = [await engine.connect() for _ in range(connections)]
+    try:
+        for conn in held:
+            await conn.execute(text("SELECT 1"))
+        async with AsyncSession(bind=held[0]) as db:
+            for stmt in hot_statements():
+                (await db.execute(stmt)).all()
+    finally:
+        for conn in held:
+            await conn.close()
+
+def warm_hashing() -> None:
+    load_crypt_context(settings.BCRYPT_ROUNDS)
+    hash_pool.warm(load_crypt_context, settings.BCRYPT_ROUNDS)
+
+async def warm_up(
+        db_stack: str
+        ) -> None:
+    # a failed warm-up only costs the first requests their latency, so it never blocks startup
+    connections = settings.WARMUP_CONNECTIONS
+    try:
+        if db_stack == "async":
+            for target in dict.fromkeys([async_engine, async_read_engine]):
+                await warm_async_engine(target, connections)
+        else:
+            for target in dict.fromkeys([engine, read_engine]):
+                await asyncio.to_thread(warm_engine, target, connections)
+    except Exception:
+        logger.exception("Database warm-up failed")
+    try:
+        await asyncio.to_thread(warm_hashing)
+    except Exception:
+        logger.exception("Hashing pool warm-up failed")
@@ -0,0 +1,132 @@
+"""Spending time-series and breakdowns: SQL GROUP BY against the NumPy frame.
+
+Generates one collector with a large purchase history, then times every
+/stats/timeseries bucket and the full /stats/breakdowns payload three ways:
+one GROUP BY query per answer, the NumPy path from a cold cache (one columnar
+fetch plus the group-bys), and the NumPy path on a cached frame, which is what
+repeat requests between two writes cost. Totals from both engines are checked
+against each other before anything is printed.
+
+    python -m benchmarks.analytics --purchases 1000000 --perfumes 500
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("DB_PROFILE", "production")
+os.environ["DB_ECHO"] = "false"
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.analytics import PRICE_PER_ML_EDGES, breakdowns, fetch_frame, price_per_ml_labels, timeseries
+from app.database import create_db_engine
+from benchmarks.datagen import generate
+
+# the only collector datagen creates when asked for one user
+USER_ID = 2
+
+BUCKETS = {
+    "day": "date",
+    # sqlite's 'weekday 0' moves forward to Sunday, six days back is that week's Monday
+    "week": "date(date, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01', date)",
+}
+
+def band_case() -> str:
+    labels = price_per_ml_labels()
+    whens = " ".join(f"WHEN price / ml < {edge} THEN '{label}'" for edge, label in zip(PRICE_PER_ML_EDGES, labels))
+    return f"CASE {whens} ELSE '{labels[-1]}' END"
+
+def sql_timeseries(db: Session, bucket: str) -> dict:
+    rows = db.execute(text(
+        f"SELECT {BUCKETS[bucket]} AS period, count(*), sum(price) FROM purchases "
+        "WHERE user_id = :uid GROUP BY period ORDER BY period"
+    ), {"uid": USER_ID}).all()
+    return {period: (count, round(total, 2)) for period, count, total in rows}
+
+def sql_breakdowns(db: Session) -> dict:
+    result = {}
+    for name in ("brand", "concentration", "season"):
+        result[name] = db.execute(text(
+            f"SELECT perfumes.{name}, count(*), sum(purchases.price) FROM purchases "
+            "JOIN perfumes ON perfumes.id = purchases.perfume_id "
+            f"WHERE purchases.user_id = :uid GROUP BY perfumes.{name}"
+        ), {"uid": USER_ID}).all()
+    result["store"] = db.execute(text(
+        "SELECT store, count(*), sum(price) FROM purchases WHERE user_id = :uid GROUP BY store"
+    ), {"uid": USER_ID}).all()
+    result["price_per_ml"] = db.execute(text(
+        f"SELECT {band_case()} AS band, count(*), sum(price) FROM purchases "
+        "WHERE user_id = :uid AND ml > 0 GROUP BY band"
+    ), {"uid": USER_ID}).all()
+    return {name: {key: (count, round(total, 2)) for key, count, total in rows} for name, rows in result.items()}
+
+def numpy_timeseries(frame, bucket: str) -> dict:
+    return {point["period"].isoformat(): (point["purchases"], point["total_spent"])
+            for point in timeseries(frame, bucket) if point["purchases"]}
+
+def numpy_breakdowns(frame) -> dict:
+    return {name: {row["key"]: (row["purchases"], row["total_spent"]) for row in rows}
+            for name, rows in breakdowns(frame).items()}
+
+def check(label: str, expected: dict, actual: dict) -> None:
+    assert expected.keys() == actual.keys(), label
+    for key, (count, total) in expected.items():
+        assert actual[key][0] == count and abs(actual[key][1] - total) < 0.05, (label, key)
+
+def best_of(repeat: int, fn) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="analytics.db")
+    parser.add_argument("--purchases", type=int, default=1_000_000)
+    parser.add_argument("--perfumes", type=float, default=500)
+    parser.add_argument("--reuse", action="store_true", help="keep an existing database instead of regenerating")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if not args.reuse:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+    engine = create_db_engine(f"sqlite:///{args.db}")
+    if not args.reuse:
+        started = time.perf_counter()
+        generate(engine, 1, args.perfumes, args.purchases)
+        print(f"generated {args.purchases} purchases in {time.perf_counter() - started:.1f}s")
+
+    with Session(engine) as db:
+        started = time.perf_counter()
+        frame = fetch_frame(db, USER_ID)
+        print(f"columnar fetch: {(time.perf_counter() - started) * 1000:.0f}ms, frame {frame.nbytes / 2**20:.1f} MiB")
+
+        for bucket in BUCKETS:
+            check(bucket, sql_timeseries(db, bucket), numpy_timeseries(frame, bucket))
+        expected = sql_breakdowns(db)
+        actual = numpy_breakdowns(frame)
+        for name in expected:
+            check(name, expected[name], actual[name])
+
+        cases = {f"timeseries {bucket}": (lambda b=bucket: sql_timeseries(db, b), lambda f, b=bucket: timeseries(f, b))
+                 for bucket in BUCKETS}
+        cases["breakdowns"] = (lambda: sql_breakdowns(db), breakdowns)
+
+        print(f"\n{'':18} {'SQL ms':>9} {'numpy cold ms':>14} {'numpy warm ms':>14}")
+        for label, (sql, vectorized) in cases.items():
+            sql_ms = best_of(args.repeat, sql)
+            # cold: the first request after a write pays for the fetch; warm: the frame is cached
+            cold_ms = best_of(args.repeat, lambda: vectorized(fetch_frame(db, USER_ID)))
+            warm_ms = best_of(args.repeat, lambda: vectorized(frame))
+            print(f"{label:18} {sql_ms:>9.1f} {cold_ms:>14.1f} {warm_ms:>14.1f}")
+
+if __name__ == "__main__":
+    main()
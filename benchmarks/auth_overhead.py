@@ -0,0 +1,75 @@
+"""Per-request cost of authenticating a bearer token.
+
+For each signing algorithm times a plain jwt.decode with the key as
+configured (what every request used to pay, once per middleware and once
+more in the route), verification with the pre-parsed key set, the cached
+decode_access_token, and the whole get_current_user dependency with the
+user already cached.
+
+    python -m benchmarks.auth_overhead --repeat 2000
+    python -m benchmarks.auth_overhead --algorithms HS256 ES256
+
+RS256 and ES256 keys are generated for the run; python-jose verifies them
+with its pure-Python backends unless cryptography is installed.
+"""
+import argparse
+import os
+import timeit
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import ecdsa
+import rsa
+from jose import jwt
+
+from app import auth
+from app.config import settings
+from app.models import User
+
+def key_pair(algorithm: str) -> tuple:
+    if algorithm == "RS256":
+        public, private = rsa.newkeys(2048)
+        return private.save_pkcs1().decode(), public.save_pkcs1().decode()
+    if algorithm == "ES256":
+        private = ecdsa.SigningKey.generate(curve=ecdsa.NIST256p)
+        return private.to_pem().decode(), private.get_verifying_key().to_pem().decode()
+    return settings.SECRET_KEY, settings.SECRET_KEY
+
+def measure(algorithm: str, repeat: int) -> dict:
+    private, public = key_pair(algorithm)
+    auth.load_keys(settings.model_copy(update={
+        "ALGORITHM": algorithm, "JWT_KEYS": {"bench": public}, "JWT_SIGNING_KID": "bench", "JWT_SIGNING_KEY": private,
+    }))
+    token = auth.create_access_token({"sub": "bench", "uid": 1, "role": "user"})
+    auth.user_cache.set("bench", (None, {"id": 1, "username": "bench", "email": "bench@example.com",
+                                         "is_active": True, "created_at": None}))
+    cases = {
+        "jwt.decode": lambda: jwt.decode(token, public, algorithms=[algorithm]),
+        "key set verify": lambda: auth.key_set.verify(token),
+        "decode_access_token (cached)": lambda: auth.decode_access_token(token),
+        "get_current_user (cached)": lambda: auth.get_current_user(token, None),
+    }
+    assert isinstance(cases["get_current_user (cached)"](), User)
+    results = {}
+    for label, case in cases.items():
+        # signature checks are slow enough that fewer rounds give the same precision
+        number = repeat if "cached" in label else max(repeat // 20, 10)
+        results[label] = min(timeit.repeat(case, number=number, repeat=3)) / number
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--algorithms", nargs="+", default=["HS256", "RS256", "ES256"])
+    args = parser.parse_args()
+
+    for algorithm in args.algorithms:
+        results = measure(algorithm, args.repeat)
+        for label, seconds in results.items():
+            print(f"{algorithm:6} {label:30} {seconds * 1e6:10.2f} us")
+        speedup = results["jwt.decode"] / results["decode_access_token (cached)"]
+        print(f"{algorithm:6} {'cached vs jwt.decode':30} {speedup:9.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""POST /batch against the same edits sent as individual requests.
+
+Replays one offline queue of purchase creates and deletes for a single user,
+first as one request per edit and then as one POST /batch, and reports wall
+time and the number of committed transactions for each. A commit is the unit
+SQLite makes durable: with the development profile (rollback journal,
+synchronous=FULL) every commit waits on fsync, with the production profile
+(WAL, synchronous=NORMAL) commits are appended to the WAL and synced at
+checkpoints.
+
+    python -m benchmarks.batch_writes --operations 200 --profile development
+    python -m benchmarks.batch_writes --operations 200 --profile production
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+def configure_environment(args: argparse.Namespace) -> str:
+    url = f"sqlite:///{args.db}"
+    os.environ.update({
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark"),
+        "ALGORITHM": os.environ.get("ALGORITHM", "HS256"),
+        "DATABASE_URL": url,
+        "DB_PROFILE": args.profile,
+        "DB_ECHO": "false",
+        "RATE_LIMIT_ENABLED": "false",
+        "WARMUP_ON_STARTUP": "false",
+        "DASHBOARD_BACKGROUND_REFRESH": "false",
+        "SEED_LEADERBOARDS_ON_STARTUP": "false",
+    })
+    return url
+
+def edit_queue(
+        rng: random.Random,
+        operations: int,
+        perfume_ids: list,
+        purchase_ids: list
+        ) -> list:
+    # three creates for every delete, deletes hitting purchases that already exist
+    queue = []
+    deletable = list(purchase_ids)
+    rng.shuffle(deletable)
+    for _ in range(operations):
+        if deletable and rng.random() < 0.25:
+            queue.append({"op": "delete", "type": "purchase", "id": deletable.pop()})
+        else:
+            queue.append({"op": "create", "type": "purchase", "data": {
+                "perfume_id": rng.choice(perfume_ids),
+                "date": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "price": round(rng.uniform(20, 300), 2),
+                "store": "Offline queue",
+            }})
+    return queue
+
+async def replay_individually(client, queue: list) -> None:
+    for operation in queue:
+        if operation["op"] == "create":
+            response = await client.post("/purchases", json=operation["data"])
+        else:
+            response = await client.delete(f"/purchases/{operation['id']}")
+        response.raise_for_status()
+
+async def replay_batch(client, queue: list) -> None:
+    response = await client.post("/batch", json={"operations": queue})
+    response.raise_for_status()
+
+async def measure(args: argparse.Namespace) -> dict:
+    import httpx
+    from sqlalchemy import event, select
+
+    from app.database import engine
+    from app.main import create_app
+    from app.models import Perfume, Purchase
+    from benchmarks.datagen import PASSWORD, generate
+
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+
+    results = {}
+    for mode, replay in (("individual", replay_individually), ("batch", replay_batch)):
+        # both modes start from the same data
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+        generate(engine, 1, args.perfumes, args.purchases, seed=args.seed)
+        with engine.connect() as conn:
+            perfume_ids = list(conn.execute(select(Perfume.id)).scalars())
+            purchase_ids = list(conn.execute(select(Purchase.id)).scalars())
+        queue = edit_queue(random.Random(args.seed), args.operations, perfume_ids, purchase_ids)
+
+        app = create_app("sync")
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://batch", timeout=60) as client:
+                token = (await client.post("/auth/login", data={"username": "user2", "password": PASSWORD})).json()
+                client.headers["Authorization"] = f"Bearer {token['access_token']}"
+                commits.clear()
+                started = time.perf_counter()
+                await replay(client, queue)
+                elapsed = time.perf_counter() - started
+        results[mode] = {"ms": round(elapsed * 1000, 1), "commits": len(commits)}
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="batch.db")
+    parser.add_argument("--profile", choices=["development", "production"], default="development")
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--perfumes", type=float, default=50)
+    parser.add_argument("--purchases", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    configure_environment(args)
+    results = asyncio.run(measure(args))
+    print(f"{args.operations} edits, DB_PROFILE={args.profile}")
+    for mode, result in results.items():
+        print(f"{mode:>10}: {result['ms']:>9.1f} ms {result['commits']:>5} commits")
+    print(f"speedup: {results['individual']['ms'] / results['batch']['ms']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Synthetic perfume-tracker data with realistic skew.
+
+Collection sizes and purchase counts follow a Pareto distribution, so a few
+collectors own most of the rows. Purchases concentrate on popular perfumes.
+
+    python -m benchmarks.datagen --url sqlite:///loadtest.db --users 1000 --perfumes 40 --purchases 100000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, timedelta
+from typing import List
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+
+from app.database import Base, create_db_engine
+from app.hashing import hash_password
+from app.migrations import run_migrations
+from app.models import Concentration, Perfume, Purchase, Role, Season, User
+from app.rollups import rebuild_rollups
+
+PASSWORD = "password123"
+ADMIN_USERNAME = "admin"
+BATCH_SIZE = 10_000
+
+BRANDS = [
+    "Chanel", "Dior", "Creed", "Guerlain", "Hermes", "Tom Ford", "Le Labo", "Byredo", "Amouage", "Diptyque",
+    "Maison Francis Kurkdjian", "Penhaligons", "Serge Lutens", "Xerjoff", "Parfums de Marly", "Jo Malone",
+    "Frederic Malle", "Kilian", "Acqua di Parma", "Yves Saint Laurent", "Prada", "Armani", "Givenchy",
+]
+WORDS = [
+    "bleu", "noir", "oud", "santal", "vetiver", "ambre", "rose", "iris", "musc", "cuir", "tabac", "neroli",
+    "jasmin", "vanille", "encens", "cedre", "bergamote", "patchouli", "fougere", "absolu", "intense",
+    "elixir", "nuit", "soleil", "velours", "sauvage", "lumiere", "mystere", "ombre", "poivre", "figue",
+    "mandarine", "tubereuse", "lavande", "oranger", "cardamome", "safran", "ambrette", "benjoin", "myrrhe",
+]
+STORES = ["Sephora", "Douglas", "Nordstrom", "Brand boutique", "Duty free", "Online", "Decant shop"]
+
+def skewed_counts(rng: random.Random, n: int, mean: float, alpha: float = 1.5) -> List[int]:
+    # pareto weights rescaled to the requested mean, at least one each
+    weights = [rng.paretovariate(alpha) for _ in range(n)]
+    scale = mean * n / sum(weights)
+    return [max(1, round(w * scale)) for w in weights]
+
+def generate(
+        engine: Engine,
+        users: int,
+        perfumes_per_user: float,
+        purchases: int,
+        bcrypt_rounds: int = 4,
+        seed: int = 42
+        ) -> dict:
+    rng = random.Random(seed)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    # one hash for everyone keeps generation fast; the cost still applies at login
+    hashed = hash_password(PASSWORD, bcrypt_rounds)
+    start_day = date.today() - timedelta(days=730)
+
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": 1, "username": ADMIN_USERNAME, "email": "admin@example.com",
+             "hashed_password": hashed, "role": Role.ADMIN},
+            *(
+                {"id": i, "username": f"user{i}", "email": f"user{i}@example.com",
+                 "hashed_password": hashed, "role": Role.USER,
+                 "created_at": start_day + timedelta(days=rng.randrange(730))}
+                for i in range(2, users + 2)
+            ),
+        ])
+
+        perfume_owner: List[int] = []
+        rows = []
+        for user_id, count in zip(range(2, users + 2), skewed_counts(rng, users, perfumes_per_user)):
+            for _ in range(count):
+                rows.append({
+                    "name": " ".join(rng.sample(WORDS, rng.randint(1, 3))).title(),
+                    "brand": rng.choice(BRANDS),
+                    "concentration": rng.choice(list(Concentration)),
+                    "season": rng.choice(list(Season)),
+                    "available": rng.random() < 0.9,
+                    "user_id": user_id,
+                })
+                perfume_owner.append(user_id)
+        for offset in range(0, len(rows), BATCH_SIZE):
+            conn.execute(insert(Perfume), rows[offset:offset + BATCH_SIZE])
+
+        # ids are assigned in insert order on a fresh database; popular perfumes get most purchases
+        popularity = [rng.paretovariate(1.2) for _ in perfume_owner]
+        perfume_ids = rng.choices(range(1, len(perfume_owner) + 1), weights=popularity, k=purchases)
+        batch = []
+        for perfume_id in perfume_ids:
+            batch.append({
+                "perfume_id": perfume_id,
+                "user_id": perfume_owner[perfume_id - 1],
+                "date": start_day + timedelta(days=rng.randrange(730)),
+                "price": round(min(rng.lognormvariate(4.6, 0.6), 2000), 2),
+                "store": rng.choice(STORES),
+                "ml": rng.choice([10, 30, 50, 75, 100, 125, 200]),
+            })
+            if len(batch) == BATCH_SIZE:
+                conn.execute(insert(Purchase), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(Purchase), batch)
+
+        # bulk Core inserts skip the write-path bookkeeping
+        rebuild_rollups(conn)
+
+    return {"users": users + 1, "perfumes": len(perfume_owner), "purchases": purchases}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite:///loadtest.db")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--perfumes", type=float, default=40, help="mean perfumes per user")
+    parser.add_argument("--purchases", type=int, default=100_000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.url.startswith("sqlite:///") and os.path.exists(args.url[len("sqlite:///"):]):
+        os.remove(args.url[len("sqlite:///"):])
+    engine = create_db_engine(args.url)
+    started = time.perf_counter()
+    counts = generate(engine, args.users, args.perfumes, args.purchases, args.bcrypt_rounds, args.seed)
+    engine.dispose()
+    print(f"generated {counts} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
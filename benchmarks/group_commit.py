@@ -0,0 +1,127 @@
+"""POST /purchases throughput with and without group commit.
+
+Each virtual user logs in as its own collector and posts purchases back to
+back. For every concurrency level the run is repeated with
+GROUP_COMMIT_ENABLED off and on, reporting purchases/s, latency percentiles
+and, with group commit, the average number of rows per commit.
+
+    python -m benchmarks.group_commit --concurrency 1 4 16 32 --purchases 2000
+    python -m benchmarks.group_commit --profile development --purchases 500
+
+Under the development profile (rollback journal, synchronous=FULL) every
+commit is an fsync and writers block each other on the database lock, which
+is the case group commit is for. The production profile (WAL,
+synchronous=NORMAL) makes commits cheap to begin with. Keep the concurrency
+below the threadpool size (40) plus the connection pool: past that, requests
+time out waiting for a connection in either mode.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+def configure_environment(args: argparse.Namespace) -> None:
+    os.environ.update({
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark"),
+        "ALGORITHM": os.environ.get("ALGORITHM", "HS256"),
+        "DATABASE_URL": f"sqlite:///{args.db}",
+        "DB_PROFILE": args.profile,
+        "DB_ECHO": "false",
+        "RATE_LIMIT_ENABLED": "false",
+        "WARMUP_ON_STARTUP": "false",
+        "DASHBOARD_BACKGROUND_REFRESH": "false",
+        "SEED_LEADERBOARDS_ON_STARTUP": "false",
+        "GROUP_COMMIT_MAX_DELAY_MS": str(args.max_delay_ms),
+    })
+
+async def post_purchases(client, headers: dict, perfume_id: int, count: int, latencies: list, errors: list) -> None:
+    for i in range(count):
+        started = time.perf_counter()
+        response = await client.post("/purchases", headers=headers, json={
+            "perfume_id": perfume_id, "date": f"2025-{i % 12 + 1:02d}-15", "price": 50 + i % 7, "store": "Bench",
+        })
+        if response.status_code == 201:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(response.status_code)
+
+async def measure(args: argparse.Namespace) -> dict:
+    import httpx
+    from sqlalchemy import select
+
+    from app import group_commit
+    from app.config import settings
+    from app.database import engine
+    from app.main import create_app
+    from app.models import Perfume
+    from benchmarks.datagen import PASSWORD, generate
+
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    users = max(args.concurrency)
+    generate(engine, users, 2, 0, seed=args.seed)
+    with engine.connect() as conn:
+        perfumes = dict(conn.execute(select(Perfume.user_id, Perfume.id)).all())
+
+    app = create_app("sync")
+    results = {}
+    async with app.router.lifespan_context(app):
+        # a request that times out waiting for a pooled connection counts as an error, not a crash
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            sessions = []
+            for user_id in range(2, users + 2):
+                token = (await client.post("/auth/login", data={"username": f"user{user_id}", "password": PASSWORD})).json()
+                sessions.append(({"Authorization": f"Bearer {token['access_token']}"}, perfumes[user_id]))
+
+            for concurrency in args.concurrency:
+                # group commit first: a level that overwhelms the per-request path can leave
+                # connections checked out until their requests finally give up
+                for enabled in (True, False):
+                    settings.GROUP_COMMIT_ENABLED = enabled
+                    before = group_commit.purchase_writer.stats()
+                    latencies: list = []
+                    errors: list = []
+                    per_user = args.purchases // concurrency
+                    started = time.perf_counter()
+                    await asyncio.gather(*(
+                        post_purchases(client, headers, perfume_id, per_user, latencies, errors)
+                        for headers, perfume_id in sessions[:concurrency]
+                    ))
+                    elapsed = time.perf_counter() - started
+                    after = group_commit.purchase_writer.stats()
+                    batches = after["batches"] - before["batches"]
+                    quantiles = statistics.quantiles(latencies, n=100)
+                    results[(concurrency, enabled)] = {
+                        "per_s": round(len(latencies) / elapsed, 1),
+                        "errors": len(errors),
+                        "p50_ms": round(quantiles[49] * 1000, 2),
+                        "p99_ms": round(quantiles[98] * 1000, 2),
+                        "rows_per_commit": round((after["rows"] - before["rows"]) / batches, 1) if batches else 1.0,
+                    }
+                    print(f"concurrency={concurrency} group_commit={enabled}: {results[(concurrency, enabled)]}", flush=True)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="group_commit.db")
+    parser.add_argument("--profile", choices=["development", "production"], default="development")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--purchases", type=int, default=2000, help="per concurrency level and mode")
+    parser.add_argument("--max-delay-ms", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    configure_environment(args)
+    results = asyncio.run(measure(args))
+    print(f"DB_PROFILE={args.profile} GROUP_COMMIT_MAX_DELAY_MS={args.max_delay_ms}")
+    print(f"{'concurrency':>11} {'group commit':>12} {'purchases/s':>12} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'rows/commit':>12}")
+    for (concurrency, enabled), result in results.items():
+        print(f"{concurrency:>11} {'on' if enabled else 'off':>12} {result['per_s']:>12} {result['errors']:>7} {result['p50_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['rows_per_commit']:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Cost of rendering one 100-item page: the response_model path vs the fast row path.
+
+    python -m benchmarks.json_serialization --rows 100 --repeat 2000
+"""
+import argparse
+import json
+import os
+import timeit
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from pydantic import TypeAdapter
+from pydantic_core import to_json
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.fast_json import orjson, page_response, read_columns
+from app.models import Concentration, Perfume, Season, User
+from app.schemas import PaginatedResponse, PerfumeRead
+
+def load(rows: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=1, username="bench", email="bench@example.com", hashed_password="x"))
+        conn.execute(insert(Perfume), [
+            {"name": f"Perfume {i}", "brand": f"Brand {i % 7}", "concentration": Concentration.EDP,
+             "season": Season.ALL, "user_id": 1}
+            for i in range(rows)
+        ])
+    with Session(engine) as db:
+        objects = db.execute(select(Perfume)).scalars().all()
+        tuples = db.execute(select(*read_columns(Perfume, PerfumeRead))).all()
+        db.expunge_all()
+    return objects, tuples
+
+def page(items) -> dict:
+    return {"total": len(items), "limit": len(items), "offset": 0, "items": items}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    objects, tuples = load(args.rows)
+    page_adapter = TypeAdapter(PaginatedResponse[PerfumeRead])
+    items_adapter = TypeAdapter(list[PerfumeRead])
+
+    def response_model():
+        # what FastAPI does for response_model: validate, dump to JSON-able python, json.dumps
+        value = page_adapter.validate_python(page(objects), from_attributes=True)
+        return json.dumps(page_adapter.dump_python(value, mode="json")).encode()
+
+    def type_adapter_rows():
+        return items_adapter.dump_json(items_adapter.validate_python(tuples, from_attributes=True))
+
+    def pydantic_core_rows():
+        keys = tuples[0]._fields
+        return to_json([dict(zip(keys, row)) for row in tuples])
+
+    def fast_path():
+        return page_response(page(tuples)).body
+
+    cases = {
+        "response_model (ORM objects)": response_model,
+        "TypeAdapter over rows": type_adapter_rows,
+        "pydantic_core.to_json rows": pydantic_core_rows,
+        f"page_response ({'orjson' if orjson else 'pydantic_core'})": fast_path,
+    }
+    assert json.loads(response_model())["items"] == json.loads(fast_path())["items"]
+
+    for label, case in cases.items():
+        seconds = min(timeit.repeat(case, number=args.repeat, repeat=3)) / args.repeat
+        print(f"{label:32} {seconds * 1e6:8.1f} us per {args.rows} rows")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Scripted load scenarios against the API, in-process or through `python -m app.serve` workers.
+
+Generates a fresh skewed dataset (see benchmarks.datagen), then drives each
+scenario with concurrent virtual users and reports req/s, p50/p95/p99 latency
+and SQL statements per request (read from the Server-Timing header).
+
+    python -m benchmarks.loadtest --target inprocess --out run.json --compare benchmarks/baseline.json
+    python -m benchmarks.loadtest --target uvicorn --workers 4 --scenarios login_storm stats_dashboard
+
+Every virtual user has its own seeded RNG, so the request mix is the same
+from run to run; only timings move. Regenerate the baseline with the
+baseline.json "config" values when the data shape or scenarios change.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+import httpx
+from sqlalchemy import create_engine, func, select
+
+SCENARIOS: Dict[str, Callable[..., Awaitable[None]]] = {}
+SQL_COUNT = re.compile(r'desc="(\d+) queries')
+
+def scenario(fn):
+    SCENARIOS[fn.__name__] = fn
+    return fn
+
+@dataclass
+class Samples:
+    latencies: List[float] = field(default_factory=list)
+    statements: List[int] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> dict:
+        count = len(self.latencies)
+        cuts = statistics.quantiles(self.latencies, n=100, method="inclusive") if count > 1 else self.latencies * 99
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "req_per_s": round(count / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(cuts[49] * 1000, 2) if count else None,
+            "p95_ms": round(cuts[94] * 1000, 2) if count else None,
+            "p99_ms": round(cuts[98] * 1000, 2) if count else None,
+            "sql_per_request": round(statistics.fmean(self.statements), 2) if self.statements else None,
+        }
+
+@dataclass
+class World:
+    # what the scenarios need to know about the generated data
+    usernames: List[str]
+    tokens: Dict[str, str]
+    admin_token: str
+    total_perfumes: int
+    total_purchases: int
+    password: str
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, samples: Samples, world: World, rng: random.Random):
+        self.client = client
+        self.samples = samples
+        self.world = world
+        self.rng = rng
+
+    def auth(self, token: str) -> dict:
+        return {"Authorization": f"Bearer {token}"}
+
+    def any_token(self) -> str:
+        return self.world.tokens[self.rng.choice(list(self.world.tokens))]
+
+    async def request(self, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.samples.errors += 1
+            return None
+        self.samples.latencies.append(time.perf_counter() - start)
+        match = SQL_COUNT.search(response.headers.get("server-timing", ""))
+        if match:
+            self.samples.statements.append(int(match.group(1)))
+        if response.status_code >= 400:
+            self.samples.errors += 1
+        return response
+
+@scenario
+async def login_storm(vu: VirtualUser) -> None:
+    # many distinct users logging in at once, the shape of a morning rush or a token expiry wave
+    username = vu.rng.choice(vu.world.usernames)
+    await vu.request("POST", "/auth/login", data={"username": username, "password": vu.world.password})
+
+@scenario
+async def deep_pagination(vu: VirtualUser) -> None:
+    if vu.rng.random() < 0.5:
+        # admin browsing far into the global lists with offsets
+        path, total = vu.rng.choice([
+            ("/admin/perfumes", vu.world.total_perfumes),
+            ("/admin/purchases", vu.world.total_purchases),
+        ])
+        offset = vu.rng.randrange(max(total - 100, 1))
+        await vu.request("GET", f"{path}?limit=100&offset={offset}", headers=vu.auth(vu.world.admin_token))
+        return
+    # a collector paging through their own history with cursors
+    headers = vu.auth(vu.any_token())
+    path = vu.rng.choice(["/perfumes", "/purchases"])
+    url = f"{path}?limit=100&pagination=cursor&include_total=false"
+    for _ in range(vu.rng.randint(1, 5)):
+        response = await vu.request("GET", url, headers=headers)
+        if response is None or response.status_code != 200 or not response.json().get("next_cursor"):
+            return
+        url = f"{path}?limit=100&cursor={response.json()['next_cursor']}"
+
+@scenario
+async def stats_dashboard(vu: VirtualUser) -> None:
+    roll = vu.rng.random()
+    if roll < 0.2:
+        headers = vu.auth(vu.world.admin_token)
+        await vu.request("GET", "/admin/stats/dashboard", headers=headers)
+        await vu.request("GET", "/admin/stats/top-users?limit=10", headers=headers)
+        return
+    headers = vu.auth(vu.any_token())
+    end = date.today() - timedelta(days=vu.rng.randrange(365))
+    start = end - timedelta(days=vu.rng.choice([30, 90, 365]))
+    await vu.request("GET", "/stats/spending", headers=headers)
+    await vu.request("GET", f"/stats/spending?start_date={start}&end_date={end}", headers=headers)
+    await vu.request("GET", "/stats/most_expensive?num=10", headers=headers)
+
+@scenario
+async def bulk_writes(vu: VirtualUser) -> None:
+    headers = vu.auth(vu.any_token())
+    tag = vu.rng.getrandbits(32)
+    rows = "\n".join(
+        json.dumps({"name": f"Load {tag} {i}", "brand": "Loadtest", "concentration": "EDP", "season": "ALL"})
+        for i in range(50)
+    )
+    response = await vu.request(
+        "POST", "/perfumes/bulk", content=rows, headers={**headers, "Content-Type": "application/x-ndjson"})
+    if response is None or response.status_code != 200:
+        return
+    listed = await vu.request("GET", "/perfumes?brand=Loadtest&limit=5", headers=headers)
+    if listed is None or listed.status_code != 200:
+        return
+    for item in listed.json()["items"]:
+        await vu.request("POST", "/purchases", headers=headers, json={
+            "perfume_id": item["id"], "date": str(date.today()), "price": round(vu.rng.uniform(20, 300), 2),
+            "store": "Loadtest", "ml": 50,
+        })
+
+async def run_scenario(
+        client: httpx.AsyncClient,
+        name: str,
+        world: World,
+        iterations: int,
+        concurrency: int,
+        seed: int
+        ) -> Samples:
+    samples = Samples()
+
+    async def worker(index: int) -> None:
+        # a fixed share per virtual user keeps the request mix independent of scheduling
+        vu = VirtualUser(client, samples, world, random.Random(f"{seed}-{name}-{index}"))
+        for _ in range(iterations // concurrency + (index < iterations % concurrency)):
+            await SCENARIOS[name](vu)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    samples.elapsed = time.perf_counter() - start
+    return samples
+
+async def login(
+        client: httpx.AsyncClient,
+        username: str,
+        password: str
+        ) -> str:
+    response = await client.post("/auth/login", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def describe_data(url: str, sessions: int, seed: int) -> dict:
+    from app.models import Perfume, Purchase, Role, User
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        usernames = conn.execute(select(User.username).where(User.role == Role.USER).order_by(User.id)).scalars().all()
+        perfumes = conn.execute(select(func.count()).select_from(Perfume)).scalar_one()
+        purchases = conn.execute(select(func.count()).select_from(Purchase)).scalar_one()
+    engine.dispose()
+    return {
+        "usernames": usernames,
+        "sessions": random.Random(seed).sample(usernames, min(sessions, len(usernames))),
+        "total_perfumes": perfumes,
+        "total_purchases": purchases,
+    }
+
+async def run_all(
+        client: httpx.AsyncClient,
+        args: argparse.Namespace,
+        data: dict
+        ) -> Dict[str, dict]:
+    from benchmarks.datagen import ADMIN_USERNAME, PASSWORD
+
+    tokens = {name: await login(client, name, PASSWORD) for name in data["sessions"]}
+    world = World(
+        usernames=data["usernames"],
+        tokens=tokens,
+        admin_token=await login(client, ADMIN_USERNAME, PASSWORD),
+        total_perfumes=data["total_perfumes"],
+        total_purchases=data["total_purchases"],
+        password=PASSWORD,
+    )
+    results = {}
+    for name in args.scenarios:
+        samples = await run_scenario(client, name, world, args.iterations, args.concurrency, args.seed)
+        results[name] = samples.summary()
+        print(f"  {name:16} {format_row(results[name])}", flush=True)
+    return results
+
+async def run_inprocess(args: argparse.Namespace, data: dict) -> Dict[str, dict]:
+    from app.main import create_app
+
+    app = create_app(args.stack)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            return await run_all(client, args, data)
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("uvicorn did not become ready")
+
+@contextmanager
+def serve(
+        port: int,
+        workers: int
+        ) -> Iterator[str]:
+    # the documented multi-worker entry point, so the run sees what production sees
+    base_url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning", "--no-access-log"],
+        env=os.environ.copy(),
+    )
+    try:
+        wait_until_ready(base_url, process)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+async def run_uvicorn(args: argparse.Namespace, data: dict) -> Dict[str, dict]:
+    with serve(args.port, args.workers) as base_url:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            return await run_all(client, args, data)
+
+def generate_data(args: argparse.Namespace, url: str) -> None:
+    from app.database import create_db_engine
+    from benchmarks.datagen import generate
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    engine = create_db_engine(url)
+    counts = generate(engine, args.users, args.perfumes, args.purchases, args.bcrypt_rounds, args.seed)
+    engine.dispose()
+    print(f"generated {counts}")
+
+def configure_environment(args: argparse.Namespace) -> str:
+    # the app reads its settings at import time, here and in the server processes
+    url = f"sqlite:///{args.db}"
+    os.environ.update({
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark"),
+        "ALGORITHM": os.environ.get("ALGORITHM", "HS256"),
+        "DATABASE_URL": url,
+        "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{args.db}",
+        "DB_PROFILE": "production",
+        "DB_ECHO": "false",
+        "DB_STACK": args.stack,
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        # every virtual user shares one IP; the limiter would otherwise be what gets measured
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    return url
+
+def format_row(summary: dict) -> str:
+    return (f"{summary['requests']:6} req {summary['errors']:4} err {summary['req_per_s']:8.1f} req/s  "
+            f"p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms  p99 {summary['p99_ms']}ms  "
+            f"sql/req {summary['sql_per_request']}")
+
+def compare(current: dict, baseline: dict) -> None:
+    if current["config"] != baseline.get("config"):
+        print("warning: baseline was recorded with a different config, deltas are not like for like")
+    print("\nchange against baseline (req/s up and latency down is better)")
+    for target, scenarios in current["results"].items():
+        for name, summary in scenarios.items():
+            before = baseline.get("results", {}).get(target, {}).get(name)
+            if not before:
+                continue
+            deltas = []
+            for key in ("req_per_s", "p50_ms", "p95_ms", "p99_ms", "sql_per_request"):
+                old, new = before.get(key), summary.get(key)
+                if old and new is not None:
+                    deltas.append(f"{key} {(new - old) / old * 100:+.1f}%")
+            print(f"  {target:9} {name:16} " + "  ".join(deltas))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="loadtest.db", help="SQLite file the data is generated into")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--perfumes", type=float, default=40, help="mean perfumes per user")
+    parser.add_argument("--purchases", type=int, default=20_000)
+    parser.add_argument("--reuse", action="store_true", help="keep an existing --db instead of regenerating")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4,
+                        help="used for the generated hashes and by the app; 12 matches production login cost")
+    parser.add_argument("--target", choices=["inprocess", "uvicorn", "both"], default="inprocess")
+    parser.add_argument("--stack", choices=["sync", "async"], default="sync")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=200, help="scenario iterations per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=50, help="users logged in before the run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to diff against")
+    args = parser.parse_args()
+
+    url = configure_environment(args)
+
+    if args.reuse and os.path.exists(args.db):
+        data = describe_data(url, args.sessions, args.seed)
+
+    config = {key: getattr(args, key) for key in (
+        "users", "perfumes", "purchases", "bcrypt_rounds", "stack", "workers", "iterations", "concurrency",
+        "sessions", "seed")}
+    report = {"config": config, "results": {}}
+    targets = ["inprocess", "uvicorn"] if args.target == "both" else [args.target]
+    for target in targets:
+        if not args.reuse or not os.path.exists(args.db):
+            # bulk_writes grows the data, so each target starts from the same fresh copy
+            generate_data(args, url)
+            data = describe_data(url, args.sessions, args.seed)
+        print(f"{target}:")
+        runner = run_inprocess if target == "inprocess" else run_uvicorn
+        report["results"][target] = asyncio.run(runner(args, data))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Latency of perfume search: the brand ilike filter vs the FTS5-backed q= search.
+
+    python -m benchmarks.perfume_search --rows 1000000 --users 100
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from sqlalchemy import insert, or_
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base, create_db_engine
+from app.migrations import run_migrations
+from app.models import Concentration, Perfume, Season, User
+from app.pagination import count_statement
+from app.routers.perfumes import perfumes_query
+from app.search import search_perfumes
+
+SYLLABLES = ["ba", "ce", "di", "lo", "mu", "ra", "ne", "vi", "to", "sa", "qu", "el", "or", "an", "is", "ur"]
+
+def vocabulary(rng: random.Random, size: int) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def seed(engine, rows: int, users: int, words: list, brands: list) -> None:
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"}
+            for i in range(1, users + 1)
+        ])
+        for start in range(0, rows, 50_000):
+            conn.execute(insert(Perfume), [
+                {"name": " ".join(rng.sample(words, rng.randint(1, 3))).title(), "brand": rng.choice(brands),
+                 "concentration": Concentration.EDP, "season": Season.ALL, "user_id": rng.randint(1, users)}
+                for _ in range(start, min(rows, start + 50_000))
+            ])
+
+def queries(rng: random.Random, words: list, brands: list) -> dict:
+    word = rng.choice([w for w in words if len(w) >= 6])
+    typo = word[:2] + word[3] + word[2] + word[4:]
+    return {
+        "exact": word,
+        "prefix": word[:4],
+        "two terms": f"{rng.choice(words)} {rng.choice(words)[:3]}",
+        "typo": typo,
+        "brand": rng.choice(brands).split()[-1],
+    }
+
+def timed(run, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = run()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "matches": count,
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 2),
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    words = vocabulary(rng, args.vocabulary)
+    brands = [f"Maison {w.title()}" for w in vocabulary(rng, 300)]
+
+    config = settings.model_copy(update={"DB_PROFILE": "production", "DB_ECHO": False})
+    engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}", config)
+    start = time.perf_counter()
+    seed(engine, args.rows, args.users, words, brands)
+    print(f"seeded {args.rows} perfumes for {args.users} users in {time.perf_counter() - start:.1f}s")
+
+    Session = sessionmaker(bind=engine)
+    user_id = 1
+    with Session() as db:
+        # both sides do what list_perfumes does by default: a total plus the first page
+        for label, q in queries(rng, words, brands).items():
+            def ilike():
+                stmt = perfumes_query(user_id)
+                for term in q.split():
+                    stmt = stmt.where(or_(Perfume.name.ilike(f"%{term}%"), Perfume.brand.ilike(f"%{term}%")))
+                db.execute(count_statement(stmt)).scalar_one()
+                return len(db.execute(stmt.limit(20)).all())
+
+            def fts():
+                stmt, rank = search_perfumes(db, perfumes_query(user_id), user_id, q)
+                db.execute(count_statement(stmt)).scalar_one()
+                return len(db.execute(stmt.order_by(rank).limit(20)).all())
+
+            print(f"{label:10} {q!r}")
+            print(f"{'':10} ilike {timed(ilike, args.repeat)}")
+            print(f"{'':10} fts   {timed(fts, args.repeat)}")
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Per-request cost of the rate and concurrency limiters.
+
+Times the pieces on their own: the token bucket for one hot key and for a
+rotating set of keys, the in-flight counter, and working out who the caller
+is. Then it times the whole router dependency for an anonymous and a
+signed-in request.
+
+    python -m benchmarks.rate_limit_overhead --repeat 100000
+"""
+import argparse
+import asyncio
+import os
+import time
+import timeit
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["RATE_LIMIT_ENABLED"] = "true"
+
+from starlette.requests import Request
+
+from app.auth import create_access_token
+from app.config import settings
+from app.rate_limit import MemoryRateStore, client_key, concurrency, limit, parse_rate
+
+def make_request(authorization: str = "") -> Request:
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return Request({"type": "http", "method": "GET", "path": "/stats/spending", "headers": headers,
+                    "client": ("203.0.113.7", 40000), "query_string": b""})
+
+async def dependency_loop(dependency, request: Request, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        gen = dependency(request)
+        await gen.__anext__()
+        await gen.aclose()
+    return (time.perf_counter() - start) / repeat
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100_000)
+    parser.add_argument("--keys", type=int, default=10_000, help="distinct callers for the rotating-key case")
+    args = parser.parse_args()
+
+    # generous enough that nothing is rejected, so every call takes the admit path
+    rate = parse_rate(f"{args.repeat * 10}/second")
+    settings.RATE_LIMITS["stats"] = f"{args.repeat * 10}/second"
+    store = MemoryRateStore()
+    keys = [f"stats:ip:10.0.{i // 256}.{i % 256}" for i in range(args.keys)]
+    rotation = iter(range(10 ** 12))
+    now = time.time()
+    signed_in = make_request("Bearer " + create_access_token({"sub": "bench", "uid": 1}))
+    anonymous = make_request()
+
+    def acquire_release():
+        concurrency.acquire("stats", 32)
+        concurrency.release("stats")
+
+    cases = {
+        "parse_rate (cached)": lambda: parse_rate("300/minute"),
+        "take, one hot key": lambda: store.take("stats:user:1", rate, now),
+        f"take, {args.keys} rotating keys": lambda: store.take(keys[next(rotation) % args.keys], rate, now),
+        "concurrency acquire+release": acquire_release,
+        "client_key, anonymous": lambda: client_key(anonymous),
+        "client_key, bearer token": lambda: client_key(signed_in),
+    }
+    for label, case in cases.items():
+        seconds = min(timeit.repeat(case, number=args.repeat, repeat=3)) / args.repeat
+        print(f"{label:34} {seconds * 1e6:8.2f} us")
+
+    dependency = limit("stats")
+    for label, request in (("dependency, anonymous", anonymous), ("dependency, bearer token", signed_in)):
+        seconds = min(asyncio.run(dependency_loop(dependency, request, args.repeat // 10)) for _ in range(3))
+        print(f"{label:34} {seconds * 1e6:8.2f} us")
+
+if __name__ == "__main__":
+    main()
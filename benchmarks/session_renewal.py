@@ -0,0 +1,111 @@
+"""CPU spent keeping sessions alive: re-running /auth/login against /auth/refresh.
+
+Every virtual user logs in once, then renews its access token over and over,
+first by logging in again (a bcrypt verify per renewal, what clients did
+when access tokens expired) and then by trading its refresh token. Reports
+renewals/s, latency percentiles and process CPU per renewal. The hashing
+pool runs as threads here so bcrypt's CPU is counted in this process.
+
+    python -m benchmarks.session_renewal --users 16 --renewals 400
+    python -m benchmarks.session_renewal --bcrypt-rounds 10 --renewals 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+def configure_environment(args: argparse.Namespace) -> None:
+    os.environ.update({
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "benchmark"),
+        "ALGORITHM": os.environ.get("ALGORITHM", "HS256"),
+        "DATABASE_URL": f"sqlite:///{args.db}",
+        "DB_PROFILE": "production",
+        "DB_ECHO": "false",
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "HASH_POOL_KIND": "thread",
+        # every virtual user shares one IP; the limiter would otherwise be what gets measured
+        "RATE_LIMIT_ENABLED": "false",
+        "WARMUP_ON_STARTUP": "false",
+        "DASHBOARD_BACKGROUND_REFRESH": "false",
+        "SEED_LEADERBOARDS_ON_STARTUP": "false",
+    })
+
+async def renew(client, mode: str, username: str, password: str, tokens: dict, count: int, latencies: list,
+                errors: list) -> None:
+    for _ in range(count):
+        started = time.perf_counter()
+        if mode == "login":
+            response = await client.post("/auth/login", data={"username": username, "password": password})
+        else:
+            response = await client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - started)
+            # refresh tokens rotate, each renewal has to present the latest one
+            tokens.update(response.json())
+        else:
+            errors.append(response.status_code)
+
+async def measure(args: argparse.Namespace) -> dict:
+    import httpx
+
+    from app.database import engine
+    from app.main import create_app
+    from benchmarks.datagen import PASSWORD, generate
+
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    generate(engine, args.users, 1, 0, bcrypt_rounds=args.bcrypt_rounds, seed=args.seed)
+
+    app = create_app("sync")
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            # the session every renewal starts from, outside the measured window
+            sessions = {}
+            for user_id in range(2, args.users + 2):
+                form = {"username": f"user{user_id}", "password": PASSWORD}
+                sessions[form["username"]] = (await client.post("/auth/login", data=form)).json()
+            for mode in ("login", "refresh"):
+                latencies: list = []
+                errors: list = []
+                per_user = args.renewals // args.users
+                cpu, started = time.process_time(), time.perf_counter()
+                await asyncio.gather(*(
+                    renew(client, mode, username, PASSWORD, tokens, per_user, latencies, errors)
+                    for username, tokens in sessions.items()
+                ))
+                elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu
+                quantiles = statistics.quantiles(latencies, n=100)
+                results[mode] = {
+                    "per_s": round(len(latencies) / elapsed, 1),
+                    "errors": len(errors),
+                    "p50_ms": round(quantiles[49] * 1000, 2),
+                    "p99_ms": round(quantiles[98] * 1000, 2),
+                    "cpu_ms": round(cpu * 1000 / max(len(latencies), 1), 2),
+                }
+                print(f"{mode}: {results[mode]}", flush=True)
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="session_renewal.db")
+    parser.add_argument("--users", type=int, default=16, help="concurrent virtual users")
+    parser.add_argument("--renewals", type=int, default=400, help="per mode, spread over the users")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12, help="12 matches production login cost")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    configure_environment(args)
+    results = asyncio.run(measure(args))
+    print(f"{args.users} users, {args.renewals} renewals per mode, BCRYPT_ROUNDS={args.bcrypt_rounds}")
+    print(f"{'renewal':>8} {'per s':>8} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9} {'cpu ms/renewal':>15}")
+    for mode, result in results.items():
+        print(f"{mode:>8} {result['per_s']:>8} {result['errors']:>7} {result['p50_ms']:>9} {result['p99_ms']:>9} "
+              f"{result['cpu_ms']:>15}")
+    print(f"CPU per renewal: {results['login']['cpu_ms'] / results['refresh']['cpu_ms']:.0f}x less with refresh tokens")
+
+if __name__ == "__main__":
+    main()
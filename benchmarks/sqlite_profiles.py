@@ -0,0 +1,100 @@
+"""Mixed read/write throughput of the development vs production SQLite profiles.
+
+    python -m benchmarks.sqlite_profiles --threads 8 --seconds 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date
+
+os.environ.setdefault("SECRET_KEY", "benchmark")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.database import Base, create_db_engine
+from app.models import Concentration, Perfume, Purchase, Season, User
+
+def seed(engine, users: int, perfumes_per_user: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "hashed_password": "x"}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(Perfume), [
+            {"name": f"P{u}-{p}", "brand": f"B{p % 20}", "concentration": Concentration.EDP,
+             "season": Season.ALL, "user_id": u}
+            for u in range(1, users + 1) for p in range(perfumes_per_user)
+        ])
+
+def run(profile: str, threads: int, seconds: float, write_ratio: float, users: int) -> dict:
+    config = settings.model_copy(update={"DB_PROFILE": profile, "DB_ECHO": False})
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    url = f"sqlite:///{path}"
+    engine = create_db_engine(url, config)
+    read_engine = create_db_engine(url, config, read_only=True) if profile == "production" else engine
+    seed(engine, users, 50)
+
+    Write = sessionmaker(bind=engine)
+    Read = sessionmaker(bind=read_engine)
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(seed_value: int) -> None:
+        rng = random.Random(seed_value)
+        reads = writes = errors = 0
+        while time.perf_counter() < deadline:
+            user_id = rng.randint(1, users)
+            try:
+                if rng.random() < write_ratio:
+                    with Write() as db:
+                        db.execute(insert(Purchase).values(
+                            perfume_id=user_id * 50, user_id=user_id, date=date(2026, 1, 1),
+                            price=rng.uniform(10, 500), store="bench", ml=100
+                        ))
+                        db.commit()
+                    writes += 1
+                else:
+                    with Read() as db:
+                        db.execute(select(Perfume).where(Perfume.user_id == user_id).limit(20)).all()
+                        db.execute(select(func.count(Purchase.id)).where(Purchase.user_id == user_id)).scalar()
+                    reads += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["reads"] += reads
+            counts["writes"] += writes
+            counts["errors"] += errors
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    engine.dispose()
+    read_engine.dispose()
+
+    total = counts["reads"] + counts["writes"]
+    return {**counts, "ops_per_second": round(total / seconds, 1)}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+
+    for profile in ("development", "production"):
+        result = run(profile, args.threads, args.seconds, args.write_ratio, args.users)
+        print(f"{profile:12} {result}")
+
+if __name__ == "__main__":
+    main()
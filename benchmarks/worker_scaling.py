@@ -0,0 +1,91 @@
+"""Throughput of `python -m app.serve` as the worker count grows.
+
+Starts the server once per worker count against the same generated data and
+replays the read-heavy load scenarios. For each count it reports req/s per
+scenario and the cold-start cost: seconds until the server answers, and the
+latency of the first login, which is the request the startup warm-up exists for.
+
+    python -m benchmarks.worker_scaling --workers 1 2 4 --concurrency 32
+    python -m benchmarks.worker_scaling --workers 1 2 4 --no-warmup --bcrypt-rounds 12
+
+Throughput only scales up to the number of cores the host has (os.cpu_count()
+is printed with the results). With SQLite, concurrent writers still serialize
+on the database lock, which is why bulk_writes is left out by default.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+
+from benchmarks.loadtest import SCENARIOS, configure_environment, describe_data, generate_data, run_all, serve
+
+async def measure(
+        args: argparse.Namespace,
+        workers: int,
+        data: dict
+        ) -> dict:
+    from benchmarks.datagen import PASSWORD
+
+    started = time.perf_counter()
+    with serve(args.port, workers) as base_url:
+        ready = time.perf_counter() - started
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            first = time.perf_counter()
+            response = await client.post("/auth/login", data={"username": data["usernames"][0], "password": PASSWORD})
+            response.raise_for_status()
+            first_login = time.perf_counter() - first
+            print(f"workers={workers}: ready in {ready:.2f}s, first login {first_login * 1000:.1f}ms", flush=True)
+            results = await run_all(client, args, data)
+    return {
+        "startup_s": round(ready, 2),
+        "first_login_ms": round(first_login * 1000, 1),
+        "req_per_s": {name: summary["req_per_s"] for name, summary in results.items()},
+        "scenarios": results,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="loadtest.db")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--perfumes", type=float, default=40)
+    parser.add_argument("--purchases", type=int, default=20_000)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    parser.add_argument("--stack", choices=["sync", "async"], default="sync")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS),
+                        default=["login_storm", "stats_dashboard", "deep_pagination"])
+    parser.add_argument("--iterations", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--warmup", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    url = configure_environment(args)
+    os.environ["WARMUP_ON_STARTUP"] = str(args.warmup).lower()
+    report = {"cpu_count": os.cpu_count(), "warmup": args.warmup, "workers": {}}
+    for workers in args.workers:
+        # every count starts from the same data so writes from an earlier run can't skew a later one
+        generate_data(args, url)
+        data = describe_data(url, args.sessions, args.seed)
+        report["workers"][workers] = asyncio.run(measure(args, workers, data))
+
+    print(f"\ncpu_count={report['cpu_count']} warmup={args.warmup}")
+    print(f"{'workers':>8} {'startup s':>10} {'1st login ms':>13} " + " ".join(f"{name:>16}" for name in args.scenarios))
+    for workers, result in report["workers"].items():
+        print(f"{workers:>8} {result['startup_s']:>10} {result['first_login_ms']:>13} "
+              + " ".join(f"{result['req_per_s'][name]:>12} r/s" for name in args.scenarios))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+if __name__ == "__main__":
+    main()
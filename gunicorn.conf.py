@@ -0,0 +1,13 @@
+# gunicorn -c gunicorn.conf.py app.main:app
+# needs `pip install gunicorn`; python -m app.serve does the same with uvicorn alone
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.setdefault("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+graceful_timeout = 30
+keepalive = 5
+# no preload_app: engines, the hashing pool and the lifespan warm-up must belong to each
+# worker, not be inherited half-open across fork
+preload_app = False